@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Compare JSON backends on payloads of each adapter's hot path.
+
+    python benchmarks/json_codec.py [number]
+
+Install orjson or ujson to compare them with stdlib json.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sarah import json_codec  # noqa
+from sarah.bot.slack import SlackMessage, MessageAttachment, \
+    AttachmentField  # noqa
+
+SLACK_EVENT = json_codec.dumps({'type': "message",
+                                'channel': "C06TXXXX",
+                                'user': "U06TXXXXX",
+                                'text': ".echo hello, world",
+                                'ts': "1438477080.000004",
+                                'team': "T06TXXXXX"})
+
+SLACK_SEND = {'type': "message",
+              'channel': "C06TXXXX",
+              'text': "hello, world",
+              'id': 1}
+
+SLACK_RICH = SlackMessage(
+    text="Weather",
+    attachments=[MessageAttachment(fallback="Weather of %s" % city,
+                                   title=city,
+                                   fields=[AttachmentField("Temperature",
+                                                           "%d C" % i,
+                                                           True)])
+                 for i, city in enumerate(("Tokyo", "Osaka", "Nagoya"))])
+
+GITTER_MESSAGE = json_codec.dumps(
+    {'id': "5330521e20d939a3be000018",
+     'text': "Happy Hacking!",
+     'html': "Happy Hacking!",
+     'sent': "2014-03-24T15:41:18.991Z",
+     'fromUser': {'id': "5315ef029517002db7dde53b",
+                  'username': "malditogeek",
+                  'displayName': "Mauro Pompilio",
+                  'url': "/malditogeek",
+                  'avatarUrlSmall': "https://localhost/u/14751?",
+                  'avatarUrlMedium': "https://localhost/u/14751?"},
+     'unread': False,
+     'readBy': 0,
+     'urls': [],
+     'mentions': [],
+     'issues': [],
+     'meta': {}}).encode('utf-8')
+
+GITTER_ROOMS = json_codec.dumps(
+    [{'id': "AAAAAc216b6c7089XXXXX%02d" % i,
+      'name': "spam/ham/egg%d" % i,
+      'topic': "",
+      'oneToOne': False,
+      'unreadItems': 0,
+      'mentions': 0,
+      'lurk': False,
+      'url': "/spam/ham/egg%d" % i,
+      'githubType': "REPO_CHANNEL"} for i in range(50)]).encode('utf-8')
+
+CASES = (
+    ('Slack.handle_event', lambda: json_codec.loads(SLACK_EVENT)),
+    ('Slack.send_message', lambda: json_codec.dumps(SLACK_SEND)),
+    # to_request_params() is memoized, so serialize attachments directly
+    ('SlackMessage.request_params',
+     lambda: json_codec.dumps([a.to_dict()
+                               for a in SLACK_RICH['attachments']])),
+    ('Gitter.try_connect_room', lambda: json_codec.loads(GITTER_MESSAGE)),
+    ('GitterClient.request', lambda: json_codec.loads(GITTER_ROOMS)),
+)
+
+
+def main(number: int) -> None:
+    backends = json_codec.available_backends()
+    print('%-32s' % 'usec per call' +
+          ''.join('%12s' % b for b in backends))
+
+    for name, function in CASES:
+        results = []
+        for backend in backends:
+            json_codec.use(backend)
+            results.append(min(timeit.repeat(function,
+                                             number=number,
+                                             repeat=3)) / number * 1e6)
+
+        print('%-32s' % name + ''.join('%12.2f' % r for r in results))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
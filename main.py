@@ -4,18 +4,24 @@
 Give a path to a configuration yaml file or place a file named sarah.yaml in
 the same directory.
 """
-import inspect
+import gc
+import importlib
 import logging
+import multiprocessing  # type: ignore
 import os
-from multiprocessing import Process  # type: ignore
+from collections import OrderedDict
 
+import signal
 import sys
+import time
+from collections import deque
 import yaml  # type: ignore
-from typing import Dict, Iterable
-from sarah.bot.hipchat import HipChat
-from sarah.bot.slack import Slack
-from sarah.bot.gitter import Gitter
+from typing import Dict, Iterable, List, Tuple, Callable, Optional
+from sarah.backoff import ExponentialBackoff
+from sarah.bot import Base
+from sarah.bot.host import Host, load_plugins
 from sarah.exceptions import SarahException
+from sarah.process import memory_usage
 
 try:
     from typing import Any
@@ -29,24 +35,109 @@ except AssertionError:
     pass
 
 
+# Configuration key and import path of each bot implementation.
+# Adapters are imported only when their keys are found in configuration, so
+# dependencies of unused adapters such as sleekxmpp are never loaded.
+ADAPTERS = OrderedDict([('hipchat', 'sarah.bot.hipchat.HipChat'),
+                        ('slack', 'sarah.bot.slack.Slack'),
+                        ('gitter', 'sarah.bot.gitter.Gitter')])
+
+
 class Sarah(object):
     def __init__(self,
                  config_paths: Iterable[str]) -> None:
 
         self.config = self.load_config(config_paths)
+        self.supervisor = None  # type: Supervisor
 
     def start(self) -> None:
-        processes = []
+        if 'host' in self.config:
+            # Run all bots in this process sharing plugins and workers.
+            bots = self.create_bots()
+            logging.info('Start %s in one process',
+                         ', '.join(name for name, _ in bots))
+            Host(bots, **(self.config['host'] or {})).run()
+            return
+
+        bots = self.create_bots()
+        if 'fork' in multiprocessing.get_all_start_methods():
+            # Fork explicitly so the plugin modules and registries built
+            # here are shared with children as copy-on-write pages.
+            self.preload_plugins(bots)
+            context = multiprocessing.get_context('fork')
+            if hasattr(gc, 'freeze'):
+                # Keep garbage collector from touching, thus copying, the
+                # pages of objects created so far.
+                gc.freeze()
+        else:
+            logging.warning('fork is not available on this platform. Each '
+                            'process loads plugins on its own.')
+            context = multiprocessing.get_context()
+
+        self.supervisor = Supervisor(context,
+                                     bots,
+                                     **(self.config.get('supervisor', None)
+                                        or {}))
+        self.supervisor.run()
+
+    def create_bots(self) -> List[Tuple[str, Base]]:
+        """Create bot instances from configuration.
+
+        Each adapter's configuration may be a list to run multiple instances
+        of the same adapter, e.g. to integrate with multiple Slack teams.
+
+        :return: Pairs of unique name and bot instance.
+        """
+        bots = []
+        for key, path in ADAPTERS.items():
+            if key not in self.config:
+                continue
+
+            adapter = self.load_adapter(path)
+            configs = self.config[key]
+            if isinstance(configs, list):
+                bots.extend(('%s.%d' % (key, i), adapter(**c))
+                            for i, c in enumerate(configs))
+            else:
+                bots.append((key, adapter(**configs)))
+
+        return bots
+
+    @staticmethod
+    def preload_plugins(bots: Iterable[Tuple[str, Base]]) -> None:
+        """Load all configured plugins to given bots before forking.
+
+        Plugin modules and their dependencies are imported once, and each
+        bot's registries are built in the parent process. Forked children
+        share them and skip loading plugins in run(), so plugin modules are
+        not re-executed to make private copies in every child.
+
+        :param bots: Pairs of unique name and bot instance.
+        :return: None
+        """
+        started = time.time()
+        loaded = load_plugins(OrderedDict(bots))
+        logging.info('Preloaded %d plugin modules in %.3f sec. %s',
+                     len(set(m for names in loaded.values() for m in names)),
+                     time.time() - started,
+                     memory_usage())
+
+    @staticmethod
+    def load_adapter(path: str) -> Callable[..., Base]:
+        """Import and return bot implementation at given path.
 
-        for module in [HipChat, Slack, Gitter]:
-            key = inspect.getmodule(module).__name__.rsplit('.', 1)[1]
-            if key in self.config:
-                logging.info('Start %s integration', module.__name__)
-                bot = module(**self.config[key])
-                processes.append(Process(target=bot.run))
+        :param path: Dotted path to the class. e.g. sarah.bot.slack.Slack
+        :return: Bot implementation class.
+        """
+        module_name, class_name = path.rsplit('.', 1)
+        started = time.time()
+        try:
+            adapter = getattr(importlib.import_module(module_name), class_name)
+        except (ImportError, AttributeError) as e:
+            raise SarahException('Can\'t load %s. %s' % (path, e))
 
-        for process in processes:
-            process.start()
+        logging.info('Imported %s in %.3f sec', path, time.time() - started)
+        return adapter
 
     @staticmethod
     def load_config(paths: Iterable[str]) -> Dict:
@@ -69,6 +160,160 @@ class Sarah(object):
 
         return config
 
+
+class ChildProcess(object):
+    """Hold the state of a supervised bot process."""
+
+    def __init__(self, name: str, bot: Base, backoff: ExponentialBackoff):
+        self.name = name
+        self.bot = bot
+        self.backoff = backoff
+        self.process = None  # type: multiprocessing.Process
+        self.started_at = None  # type: float
+        self.restart_at = None  # type: float
+        self.restart_count = 0
+        # Recent exit reasons
+        self.exit_reasons = deque(maxlen=10)  # type: deque
+
+
+class Supervisor(object):
+    """Start bot processes and restart them when they exit."""
+
+    def __init__(self,
+                 context,
+                 bots: Iterable[Tuple[str, Base]],
+                 initial_delay: float = 1.0,
+                 max_delay: float = 300.0,
+                 stable_period: float = 60.0,
+                 check_interval: float = 1.0) -> None:
+        """Initializer.
+
+        :param context: Multiprocessing context to create processes with.
+        :param bots: Pairs of unique name and bot instance.
+        :param initial_delay: Delay in seconds before the first restart.
+        :param max_delay: Upper limit of restart delay in seconds. Delay
+            doubles on every consecutive crash.
+        :param stable_period: Seconds a process must keep running to reset
+            its restart delay.
+        :param check_interval: Interval in seconds to check processes.
+        :return: None
+        """
+        self.context = context
+        self.stable_period = stable_period
+        self.check_interval = check_interval
+        self.children = OrderedDict(
+            (name, ChildProcess(name,
+                                bot,
+                                ExponentialBackoff(initial=initial_delay,
+                                                   maximum=max_delay,
+                                                   jitter=0.1)))
+            for name, bot in bots)  # type: Dict[str, ChildProcess]
+        self.__stopping = False
+
+    @property
+    def restart_counts(self) -> Dict[str, int]:
+        """Return the number of restarts for each bot."""
+        return {name: child.restart_count
+                for name, child in self.children.items()}
+
+    @staticmethod
+    def exit_reason(exit_code: Optional[int]) -> str:
+        """Return human readable exit reason.
+
+        :param exit_code: Exit code of multiprocessing.Process.
+        :return: Exit reason.
+        """
+        if exit_code is None:
+            return 'unknown'
+        elif exit_code < 0:
+            try:
+                return 'killed by %s' % signal.Signals(-exit_code).name
+            except (AttributeError, ValueError):
+                return 'killed by signal %d' % -exit_code
+        elif exit_code == 0:
+            return 'exited normally'
+        else:
+            return 'exited with code %d' % exit_code
+
+    def spawn(self, child: ChildProcess) -> None:
+        """Start a new process for given child."""
+        logging.info('Start %s integration', child.name)
+        child.started_at = time.time()
+        child.restart_at = None
+        child.process = self.context.Process(target=run_bot,
+                                             args=(child.name,
+                                                   child.bot,
+                                                   child.started_at))
+        child.process.start()
+
+    def check(self) -> None:
+        """Check processes once. Schedule restart of exited ones."""
+        now = time.time()
+        for child in self.children.values():
+            if child.process and not child.process.is_alive():
+                child.process.join()
+                reason = self.exit_reason(child.process.exitcode)
+                child.exit_reasons.append(reason)
+                child.process = None
+
+                uptime = now - child.started_at
+                if uptime >= self.stable_period:
+                    child.backoff.reset()
+                delay = child.backoff.next_delay()
+                child.restart_at = now + delay
+                logging.warning('%s %s after %.1f sec. Restarting in %.1f '
+                                'sec. Restarted %d times so far.',
+                                child.name,
+                                reason,
+                                uptime,
+                                delay,
+                                child.restart_count)
+
+            elif child.process is None and child.restart_at is not None \
+                    and now >= child.restart_at:
+                child.restart_count += 1
+                self.spawn(child)
+
+    def run(self) -> None:
+        """Start all processes and supervise them until interrupted."""
+        for child in self.children.values():
+            self.spawn(child)
+
+        try:
+            while not self.__stopping:
+                time.sleep(self.check_interval)
+                self.check()
+        except KeyboardInterrupt:
+            logging.info('Interrupted.')
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """Stop supervising and terminate running processes."""
+        self.__stopping = True
+        for child in self.children.values():
+            if child.process and child.process.is_alive():
+                child.process.terminate()
+                child.process.join()
+
+
+def run_bot(name: str, bot: Base, forked_at: float) -> None:
+    """Run given bot. This is the entry point of each child process.
+
+    :param name: Name of the bot.
+    :param bot: Bot instance.
+    :param forked_at: Time when the parent process started forking.
+    :return: None
+    """
+    logging.info('%s started in %.3f sec after fork. %s',
+                 name,
+                 time.time() - forked_at,
+                 memory_usage())
+    # Same name as in host mode, so stored schedules are told apart
+    bot.name = name
+    bot.run()
+
+
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO,
                         format='%(levelname)-8s %(message)s')
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Provide retry interval calculation."""
+import random
+
+
+class ExponentialBackoff(object):
+    """Calculate exponentially growing, capped and optionally jittered delay.
+
+    When many clients retry after the same incident, fixed or linear
+    intervals make them retry in lockstep. Jitter spreads their retries.
+    """
+
+    def __init__(self,
+                 initial: float = 1.0,
+                 maximum: float = 300.0,
+                 multiplier: float = 2.0,
+                 jitter: float = 0.0) -> None:
+        """Initializer.
+
+        :param initial: Delay in seconds for the first retry.
+        :param maximum: Upper limit of delay in seconds.
+        :param multiplier: Multiplier applied on every retry.
+        :param jitter: Ratio of delay to be randomized, from 0.0 to 1.0.
+            With 0.5, a delay of 10 seconds becomes 5 to 10 seconds. With 1.0,
+            the delay is anywhere from 0 to 10 seconds.
+        :return: None
+        """
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        self.__attempts = 0
+
+    @property
+    def attempts(self) -> int:
+        """Return the number of delays calculated since last reset."""
+        return self.__attempts
+
+    def next_delay(self) -> float:
+        """Return delay in seconds for next retry.
+
+        :return: Delay in seconds.
+        """
+        # Exponent is capped to avoid overflow on endless retry
+        delay = min(self.maximum,
+                    self.initial * self.multiplier ** min(self.__attempts, 64))
+        self.__attempts += 1
+
+        if self.jitter:
+            delay -= random.uniform(0, delay * self.jitter)
+
+        return delay
+
+    def reset(self) -> None:
+        """Reset delay to the initial one. Call this on success."""
+        self.__attempts = 0
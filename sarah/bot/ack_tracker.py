@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""Provide tracking of messages that wait for acknowledgement from server.
+
+Messages sent over a real time connection are acknowledged asynchronously by
+the server with the ID given on sending. Each message is kept with its send
+time until the acknowledgement arrives, so latency of acknowledgement can be
+measured, and messages that are never acknowledged can be handed to a timeout
+callback to be sent again by other means.
+
+The number of pending messages is bounded. When the limit is reached, the
+oldest message is no longer tracked.
+"""
+import bisect
+import logging
+import threading  # type: ignore
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+try:
+    from typing import Dict, List
+
+    # Work-around to avoid pyflakes warning "imported but unused" regarding
+    # mypy's comment-styled type hinting
+    # http://www.laurivan.com/make-pyflakespylint-ignore-unused-imports/
+    # http://stackoverflow.com/questions/5033727/how-do-i-get-pyflakes-to-ignore-a-statement/12121404#12121404
+    assert Dict
+    assert List
+except AssertionError:
+    pass
+
+
+class LatencyHistogram(object):
+    """Count latencies in fixed buckets."""
+
+    # Upper bounds of buckets in seconds. The last bucket is unbounded.
+    BOUNDS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Return upper bound of the bucket given percentile falls in.
+
+        :param percent: Percentile between 0 and 100.
+        :return: Upper bound in seconds. Maximum latency is returned for the
+            unbounded bucket, and None when nothing is observed yet.
+        """
+        if not self.count:
+            return None
+
+        threshold = self.count * percent / 100
+        cumulative = 0
+        for bound, count in zip(self.BOUNDS, self.counts):
+            cumulative += count
+            if cumulative >= threshold:
+                return bound
+
+        return self.max
+
+    def as_dict(self) -> Dict[str, Any]:
+        buckets = OrderedDict()  # type: OrderedDict
+        for bound, count in zip(self.BOUNDS + ('inf',), self.counts):
+            buckets['le_%s' % bound] = count
+
+        return {'count': self.count,
+                'mean': self.total / self.count if self.count else None,
+                'max': self.max,
+                'p50': self.percentile(50),
+                'p99': self.percentile(99),
+                'buckets': buckets}
+
+
+class AckTracker(object):
+    """Keep sent messages until they are acknowledged or timed out."""
+
+    def __init__(self,
+                 timeout: float = 10.0,
+                 max_pending: int = 1000,
+                 on_timeout: Callable[[int, Dict], None] = None) -> None:
+        """Initializer.
+
+        :param timeout: Seconds to wait for acknowledgement.
+        :param max_pending: Maximum number of messages kept at a time.
+        :param on_timeout: Optional function to be called with ID and content
+            of each message that is not acknowledged in time.
+        :return: None
+        """
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.on_timeout = on_timeout
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.timeouts = 0
+        self.evictions = 0
+        self.unknown = 0
+
+        # {message_id: (sent time, content), ...} in the order of sending
+        self.__pending = OrderedDict()  # type: OrderedDict
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__thread = None  # type: threading.Thread
+
+    def __len__(self) -> int:
+        return len(self.__pending)
+
+    def add(self, message_id: int, content: Dict) -> None:
+        """Start waiting for acknowledgement of given message.
+
+        :param message_id: ID the message is sent with.
+        :param content: Content of the message to be passed to timeout
+            callback.
+        :return: None
+        """
+        with self.__lock:
+            self.__pending[message_id] = (time.time(), content)
+            if len(self.__pending) <= self.max_pending:
+                return
+
+            evicted_id, _ = self.__pending.popitem(last=False)
+            self.evictions += 1
+
+        logging.warning('Too many messages wait for acknowledgement. '
+                        'Stop tracking message_id: %s.', evicted_id)
+
+    def discard(self, message_id: int) -> None:
+        """Stop waiting for acknowledgement of given message.
+
+        :param message_id: ID of the message.
+        :return: None
+        """
+        with self.__lock:
+            self.__pending.pop(message_id, None)
+
+    def ack(self, message_id: int, ok: bool = True) -> Optional[Dict]:
+        """Record acknowledgement of given message.
+
+        :param message_id: ID the acknowledgement replies to.
+        :param ok: Whether the server accepted the message.
+        :return: Content of the message, or None if it is not tracked.
+        """
+        with self.__lock:
+            entry = self.__pending.pop(message_id, None)
+            if entry is None:
+                # Already timed out or evicted
+                self.unknown += 1
+                return None
+
+            self.latency.observe(time.time() - entry[0])
+            if not ok:
+                self.errors += 1
+
+        return entry[1]
+
+    def expire(self) -> List[Tuple[int, Dict]]:
+        """Remove messages waiting longer than the timeout and return them.
+
+        :return: List of ID and content of timed out messages.
+        """
+        deadline = time.time() - self.timeout
+        expired = []  # type: List[Tuple[int, Dict]]
+        with self.__lock:
+            # Oldest first since entries are kept in the order of sending
+            while self.__pending:
+                message_id, (sent, content) = next(
+                    iter(self.__pending.items()))
+                if sent > deadline:
+                    break
+
+                del self.__pending[message_id]
+                expired.append((message_id, content))
+
+            self.timeouts += len(expired)
+
+        return expired
+
+    def sweep(self) -> None:
+        """Pass timed out messages to timeout callback."""
+        for message_id, content in self.expire():
+            logging.warning('Acknowledgement timed out. message_id: %s.',
+                            message_id)
+            if self.on_timeout is None:
+                continue
+
+            try:
+                self.on_timeout(message_id, content)
+            except Exception as e:
+                logging.error('Failed to handle timed out message %s. %s',
+                              message_id,
+                              e)
+
+    def start(self) -> None:
+        """Start checking timeouts in a thread."""
+        if self.__thread:
+            return
+
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self.keep_sweeping,
+                                         daemon=True)
+        self.__thread.start()
+
+    def keep_sweeping(self) -> None:
+        while not self.__stopped.wait(self.timeout / 2):
+            self.sweep()
+
+    def stop(self) -> None:
+        """Stop checking timeouts."""
+        self.__stopped.set()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'pending': len(self.__pending),
+                'errors': self.errors,
+                'timeouts': self.timeouts,
+                'evictions': self.evictions,
+                'unknown': self.unknown,
+                'latency': self.latency.as_dict()}
@@ -5,16 +5,23 @@ import imp
 import importlib
 import inspect
 import logging
+import random
 import re
 import sys
+import threading  # type: ignore
+import time
+import weakref
 from collections import OrderedDict
+from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, Future  # type: ignore
-from functools import wraps
+from functools import wraps, partial
+from apscheduler.jobstores.base import JobLookupError  # type: ignore
 from apscheduler.schedulers import background  # type: ignore
 from typing import Optional, Callable, Union, Iterable, List, Any
 
 try:
     from typing import Dict, Tuple
+    from sarah.leader import LeaderElection
 
     # Work-around to avoid pyflakes warning "imported but unused" regarding
     # mypy's comment-styled type hinting
@@ -22,25 +29,43 @@ try:
     # http://stackoverflow.com/questions/5033727/how-do-i-get-pyflakes-to-ignore-a-statement/12121404#12121404
     assert Dict
     assert Tuple
+    assert LeaderElection
 except AssertionError:
     pass
 
+from sarah.bot.ingest import IngestServer
+from sarah.bot.registry import Registry, CommandRegistry
+from sarah.bot.schedule_runner import ScheduleRunner
+from sarah.bot.shard import ShardRouter
 from sarah.bot.values import Command, CommandMessage, UserContext, \
     ScheduledCommand, RichMessage, PluginConfig, CommandFunction, \
     ScheduledFunction
-from sarah.thread import ThreadExecutor
+from sarah.leader import create_election
+from sarah.process import memory_usage
+from sarah.schedule_store import ScheduleStore
+from sarah.thread import ThreadExecutor, PRIORITY_LOW
+from sarah.watcher import ModuleWatcher
 
 
 class Base(object, metaclass=abc.ABCMeta):
     """Base class of all bot implementation."""
 
-    __commands = {}  # type: Dict[str, List[Command]]
-    __schedules = {}  # type: Dict[str, List[ScheduledCommand]]
-    __instances = {}  # type: Dict[str, Base] # Should be its subclass
+    # Live instances to register commands to. Keyed by class name.
+    __instances = {}  # type: Dict[str, weakref.WeakSet]
 
     def __init__(self,
                  plugins: Iterable[PluginConfig] = None,
-                 max_workers: Optional[int] = None) -> None:
+                 max_workers: Optional[int] = None,
+                 plugin_watch_interval: Optional[float] = None,
+                 help_page_size: Optional[int] = None,
+                 shards: Optional[int] = None,
+                 ingest_socket: Optional[str] = None,
+                 schedule_leader: Optional[Dict] = None,
+                 broadcast_workers: int = 10,
+                 schedule_jitter: float = 0.0,
+                 schedule_spread: bool = True,
+                 schedule_store: Optional[Dict] = None,
+                 schedule_workers: Optional[int] = None) -> None:
         """Initializer.
 
         This may be extended by each bot implementation to do some extra setup,
@@ -51,6 +76,39 @@ class Base(object, metaclass=abc.ABCMeta):
         :param max_workers: Optional number of worker threads.
             Methods with @concurrent decorator will be submitted to this thread
             pool.
+        :param plugin_watch_interval: Optional interval in seconds to check
+            modification of plugin modules. When given, modified modules are
+            reloaded while running. Shard processes reload their own copies.
+        :param help_page_size: Optional number of commands to show per .help
+            page. When omitted, all commands are shown at once.
+        :param shards: Optional number of worker processes to handle user
+            inputs. When more than one, this process keeps the connection and
+            routes each input to a worker process by its channel, so inputs
+            in one channel are handled in the received order. UserContext is
+            kept by this process and sent to workers along with inputs.
+        :param ingest_socket: Optional path of Unix domain socket. When given,
+            bot reads events from this socket instead of connecting to server.
+        :param schedule_leader: Optional leader election setting such as
+            {'type': "sqlite", 'path': "/tmp/sarah.db"}. When given, only the
+            replica that holds the leadership runs scheduled jobs. Lease
+            name of "sqlite" defaults to the bot name or the lowercased
+            class name.
+        :param broadcast_workers: Number of threads to send one scheduled
+            message to multiple destinations concurrently. With 0, messages
+            are sent one after another.
+        :param schedule_jitter: Maximum seconds to randomly delay each run of
+            scheduled jobs. Each job may override this with "jitter" in its
+            schedule configuration.
+        :param schedule_spread: Whether to stagger the first runs of interval
+            jobs that share the same interval.
+        :param schedule_store: Optional setting of persistent schedule store
+            such as {'path': "/tmp/schedule.db", 'misfire': "skip"}. When
+            given, next run times of scheduled jobs survive restart. Bots
+            sharing one database must have different 'owner' values, which
+            default to the bot name or the lowercased class name.
+        :param schedule_workers: Optional number of threads dedicated to run
+            scheduled jobs. When omitted, jobs run in the worker pool for
+            @concurrent methods, if any.
         """
         if not plugins:
             plugins = ()
@@ -63,22 +121,55 @@ class Base(object, metaclass=abc.ABCMeta):
             [(p[0], p[1] if len(p) > 1 else {}) for p in plugins])
 
         self.max_workers = max_workers
+        self.plugin_watch_interval = plugin_watch_interval
+        self.help_page_size = help_page_size
+        self.shards = shards
+        self.ingest_socket = ingest_socket
+        self.schedule_leader_config = schedule_leader
+        self.broadcast_workers = broadcast_workers
+        self.schedule_jitter = schedule_jitter
+        self.schedule_spread = schedule_spread
+        self.schedule_store_config = schedule_store
+        self.schedule_workers = schedule_workers
+        self.schedule_runner = ScheduleRunner()
         self.scheduler = background.BackgroundScheduler()
         self.user_context_map = {}  # type: Dict[str, UserContext]
 
         # To be set on run()
         self.worker = None  # type: ThreadPoolExecutor
         self.message_worker = None  # type: ThreadExecutor
-
-        cls = self.__class__
-        cls_name = cls.__name__
-
-        # Reset to ease tests in one file
-        cls.__commands[cls_name] = []
-        cls.__schedules[cls_name] = []
+        self.broadcast_worker = None  # type: ThreadPoolExecutor
+        self.schedule_leader = None  # type: LeaderElection
+        self.schedule_store = None  # type: ScheduleStore
+        self.schedule_worker = None  # type: ThreadPoolExecutor
+        self.plugin_watcher = None  # type: ModuleWatcher
+        self.shard_router = None  # type: ShardRouter
+        self.ingest_server = None  # type: IngestServer
+
+        # Set by share_resources() when hosted with other bots, or by the
+        # launcher to tell bots sharing external resources apart
+        self.name = None  # type: str
+        self.shared = False
+
+        # Set once registries are built, e.g. by the parent process before
+        # fork, so they are not rebuilt by reloading plugin modules.
+        self.plugins_loaded = False
+
+        # Registries are replaced, not modified, on every change.
+        self.__commands = CommandRegistry()
+        self.__schedules = Registry()
+
+        # Module names, commands and schedules collected while loading plugins
+        self.__staging = None  # type: Tuple[OrderedDict, ...]
+
+        # Help messages built from the registry at the first element.
+        # {(prefix, page): message, ...}
+        self.__help_cache = (None, {})  # type: Tuple[CommandRegistry, Dict]
 
         # To refer to this instance from class method decorator
-        cls.__instances[cls_name] = self
+        self.__class__.__instances \
+            .setdefault(self.__class__.__name__, weakref.WeakSet()) \
+            .add(self)
 
     @abc.abstractmethod
     def generate_schedule_job(self,
@@ -105,31 +196,103 @@ class Base(object, metaclass=abc.ABCMeta):
         """
         pass
 
+    def share_resources(self,
+                        name: str,
+                        scheduler: background.BackgroundScheduler,
+                        worker: Optional[ThreadPoolExecutor]) -> None:
+        """Use scheduler and worker pool shared with other bots.
+
+        This is called by Host before run(). Shared scheduler and worker are
+        started and stopped by Host, and plugin modules are loaded by Host, so
+        run() and stop() only handle resources owned by this bot.
+
+        :param name: Unique name of this bot in the host. This is used to
+            distinguish scheduled jobs in the shared scheduler.
+        :param scheduler: Shared scheduler.
+        :param worker: Shared worker thread pool, if any.
+        :return: None
+        """
+        self.name = name
+        self.scheduler = scheduler
+        self.worker = worker
+        self.shared = True
+
     def run(self) -> None:
         """Start integration with server.
 
         Based on the settings done in initialization, this will...
+            - start shard processes if required
             - start workers
             - load plugin modules
+            - start watching plugin modules if required
             - add scheduled jobs and start scheduler
-            - connect to server
+            - connect to server, or serve ingest socket if configured
             - stop workers and scheduler when connection is gone
+
+        When resources are shared with other bots, only the message worker is
+        started and scheduled jobs are added to the shared scheduler.
         """
+        started = time.time()
+
+        if self.shards and self.shards > 1 and not self.shared:
+            # Fork before any thread is started. Since inputs must be routed in
+            # the received order, @concurrent methods are not run in the
+            # worker pool in this mode.
+            self.shard_router = ShardRouter(self, self.shards)
+            self.shard_router.start()
 
         # Setup required workers
-        self.worker = ThreadPoolExecutor(max_workers=self.max_workers) \
-            if self.max_workers else None
+        if not self.shared and not self.shard_router:
+            self.worker = ThreadPoolExecutor(max_workers=self.max_workers) \
+                if self.max_workers else None
         self.message_worker = ThreadExecutor()
-
-        # Load plugins
-        self.load_plugins()
+        if self.broadcast_workers:
+            self.broadcast_worker = ThreadPoolExecutor(
+                max_workers=self.broadcast_workers)
+        if self.schedule_workers:
+            self.schedule_worker = ThreadPoolExecutor(
+                max_workers=self.schedule_workers)
+        self.schedule_runner.executor = self.schedule_worker or self.worker
+
+        if not self.shared:
+            # Load plugins unless already registered before fork
+            if not self.plugins_loaded:
+                self.load_plugins()
+
+            if self.plugin_watch_interval:
+                self.plugin_watcher = ModuleWatcher(
+                    self.plugin_config.keys(),
+                    self.reload_plugins,
+                    self.plugin_watch_interval)
+                self.plugin_watcher.start()
 
         # Set scheduled job
+        if self.schedule_leader_config:
+            config = dict(self.schedule_leader_config)
+            if config.get('type', 'file') == 'sqlite':
+                config.setdefault('name', self.resource_owner)
+            self.schedule_leader = create_election(**config)
+            self.schedule_leader.start()
+        if self.schedule_store_config:
+            config = dict(self.schedule_store_config)
+            config.setdefault('owner', self.resource_owner)
+            self.schedule_store = ScheduleStore(**config)
+            self.schedule_store.listen(self.scheduler)
+        self.schedule_runner.listen(self.scheduler)
         self.add_schedule_jobs(self.schedules)
-        self.scheduler.start()
-
+        if self.schedule_store:
+            self.schedule_store.prune()
+        if not self.scheduler.running:
+            self.scheduler.start()
+
+        logging.info('Ready to connect in %.3f sec. %s',
+                     time.time() - started,
+                     memory_usage())
         try:
-            self.connect()
+            if self.ingest_socket:
+                self.ingest()
+            else:
+                self.connect()
         except Exception as e:
             logging.error("Error occurred while bot interaction", e)
         finally:
@@ -138,21 +301,66 @@ class Base(object, metaclass=abc.ABCMeta):
     def stop(self) -> None:
         """Stop. Cleanup scheduler and workers. Consider this as finalizer."""
 
-        logging.info('STOP SCHEDULER')
-        if self.scheduler.running:
-            try:
-                self.scheduler.shutdown()
-                logging.info('CANCELLED SCHEDULED WORK')
-            except Exception as e:
-                logging.error(e)
+        if self.plugin_watcher:
+            logging.info('STOP PLUGIN WATCHER')
+            self.plugin_watcher.stop()
+
+        if self.shared:
+            # Shared scheduler and worker are stopped by Host.
+            logging.info('REMOVE SCHEDULED JOBS')
+            self.remove_schedule_jobs(self.schedules)
+        else:
+            logging.info('STOP SCHEDULER')
+            if self.scheduler.running:
+                try:
+                    self.scheduler.shutdown()
+                    logging.info('CANCELLED SCHEDULED WORK')
+                except Exception as e:
+                    logging.error(e)
+
+            logging.info('STOP CONCURRENT WORKER')
+            if self.worker:
+                self.worker.shutdown(wait=False)
+
+        if self.schedule_store:
+            self.schedule_store.stop()
+
+        logging.info('STOP SCHEDULE WORKER')
+        self.schedule_runner.stop()
+        if self.schedule_worker:
+            self.schedule_worker.shutdown(wait=False)
+
+        if self.schedule_leader:
+            logging.info('RELEASE SCHEDULE LEADERSHIP')
+            self.schedule_leader.stop()
+
+        if self.shard_router:
+            logging.info('STOP SHARD PROCESSES')
+            self.shard_router.stop()
 
-        logging.info('STOP CONCURRENT WORKER')
-        if self.worker:
-            self.worker.shutdown(wait=False)
+        if self.broadcast_worker:
+            logging.info('STOP BROADCAST WORKER')
+            self.broadcast_worker.shutdown(wait=False)
 
         logging.info('STOP MESSAGE WORKER')
         self.message_worker.shutdown(wait=False)
 
+    def ingest(self) -> None:
+        """Dispatch events written to ingest socket until interrupted.
+
+        This replaces connect() in ingestion mode, so command processing can
+        run and restart separately from the process that owns the connection
+        to chat service.
+        """
+        self.ingest_server = IngestServer(self, self.ingest_socket)
+        logging.info('Waiting for events on %s', self.ingest_socket)
+        try:
+            self.ingest_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.ingest_server.server_close()
+
     @classmethod
     def concurrent(cls, callback_function):
         """A decorator to provide concurrent job mechanism.
@@ -194,16 +402,111 @@ class Base(object, metaclass=abc.ABCMeta):
         """
         return self.message_worker.submit(function, *args, **kwargs)
 
+    def enqueue_scheduled_message(self, function, *args, **kwargs) -> Future:
+        """Submit given callback function to message worker with low priority.
+
+        Scheduled messages are sent after replies to users that are waiting
+        in the same queue.
+
+        :param function: Callable to be executed in worker thread.
+        :param args: Arguments to be fed to function.
+        :param kwargs: Keyword arguments to be fed to function.
+        :return: Future object that represent the result of given job.
+        """
+        return self.message_worker.submit_with_priority(PRIORITY_LOW,
+                                                        function,
+                                                        *args,
+                                                        **kwargs)
+
+    def fan_out(self,
+                name: str,
+                destinations: Iterable[str],
+                function: Callable[[str], Any]) -> Future:
+        """Call function for each destination concurrently.
+
+        Calls are submitted to broadcast worker, so the caller such as a
+        scheduled job does not wait for each round-trip in series. When
+        function returns Future, e.g. from enqueue_sending_message(), its
+        result is collected instead. Failures are logged once all calls
+        complete.
+
+        :param name: Name to identify this fan-out in the log.
+        :param destinations: Channel or room IDs to be passed to function.
+        :param function: Function that sends message to given destination.
+        :return: Future that represents results or exceptions keyed by
+            destination.
+        """
+        results = OrderedDict((d, None) for d in destinations)
+        remaining = [len(results)]
+        lock = threading.Lock()
+        done = Future()
+
+        def complete(destination: str, future: Future) -> None:
+            try:
+                result = future.result()
+            except Exception as e:
+                result = e
+
+            if isinstance(result, Future):
+                result.add_done_callback(partial(complete, destination))
+                return
+
+            with lock:
+                results[destination] = result
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+
+            if finished:
+                self.report_fan_out(name, results)
+                done.set_result(results)
+
+        if not results:
+            done.set_result(results)
+
+        for destination in list(results.keys()):
+            if self.broadcast_worker:
+                future = self.broadcast_worker.submit(function, destination)
+            else:
+                future = Future()
+                try:
+                    future.set_result(function(destination))
+                except Exception as e:
+                    future.set_exception(e)
+            future.add_done_callback(partial(complete, destination))
+
+        return done
+
+    @staticmethod
+    def report_fan_out(name: str, results: Dict[str, Any]) -> None:
+        """Log results of fan_out().
+
+        :param name: Name to identify the fan-out.
+        :param results: Results or exceptions keyed by destination.
+        :return: None
+        """
+        failed = [(d, r) for d, r in results.items()
+                  if isinstance(r, Exception)]
+        if not failed:
+            logging.info('Sent %s to %d destinations.', name, len(results))
+            return
+
+        logging.error('Failed to send %s to %d of %d destinations. %s',
+                      name,
+                      len(failed),
+                      len(results),
+                      ', '.join('%s: %s' % (d, e) for d, e in failed))
+
     def load_plugins(self) -> None:
         """Load given plugin modules."""
-        for module_name in self.plugin_config.keys():
-            self.load_plugin(module_name)
+        self.update_registries(self.plugin_config.keys())
 
     @staticmethod
-    def load_plugin(module_name: str) -> None:
+    def load_plugin(module_name: str) -> bool:
         """Load given plugin module.
 
         If the module is already loaded, it reloads to reflect any change.
+
+        :return: True if the module is successfully loaded.
         """
         try:
             if module_name in sys.modules.keys():
@@ -213,8 +516,144 @@ class Base(object, metaclass=abc.ABCMeta):
         except Exception as e:
             logging.warning('Failed to load %s. %s. Skipping.' % (module_name,
                                                                   e))
+            return False
         else:
             logging.info('Loaded plugin. %s' % module_name)
+            return True
+        finally:
+            ModuleWatcher.mark_loaded(module_name)
+
+    def stage_registries(self, module_names: Iterable[str]) -> None:
+        """Start collecting commands and schedules provided by given modules.
+
+        Until commit_registries() is called, commands and schedules
+        registered by given modules are collected on the side, and current
+        registries stay untouched. Ones provided by other modules are
+        ignored, so bots sharing one import only get their own plugins.
+
+        :param module_names: Names of plugin modules to be loaded.
+        :return: None
+        """
+        # Ordered for loading, and also used for membership check
+        module_names = OrderedDict.fromkeys(module_names)
+        self.__staging = (
+            module_names,
+            OrderedDict((c.name, c) for c in self.commands
+                        if c.module_name not in module_names),
+            OrderedDict((s.name, s) for s in self.schedules
+                        if s.module_name not in module_names))
+
+    def commit_registries(self, failed: Iterable[str] = ()) -> List[str]:
+        """Replace registries with collected commands and schedules at once.
+
+        Since the replacement is a simple assignment, message handling
+        threads see either old or new registry, but never a half-updated one.
+        Commands and schedules provided by modules that failed to load are
+        kept as they are.
+
+        :param failed: Names of modules that failed to load.
+        :return: Names of successfully loaded modules.
+        """
+        module_names, commands, schedules = self.__staging
+        self.__staging = None
+
+        failed = {m for m in failed if m in module_names}
+        if failed:
+            # Discard ones registered during failed load and restore old ones
+            for registered, old in ((commands, self.commands),
+                                    (schedules, self.schedules)):
+                for item in list(registered.values()):
+                    if item.module_name in failed:
+                        registered.pop(item.name)
+                for item in old:
+                    if item.module_name in failed:
+                        registered[item.name] = item
+
+        self.__commands = CommandRegistry(commands.values())
+        self.__schedules = Registry(schedules.values())
+        self.plugins_loaded = True
+
+        return [m for m in module_names if m not in failed]
+
+    def update_registries(self, module_names: Iterable[str]) -> List[str]:
+        """(Re)load given plugin modules and swap registries at once.
+
+        :param module_names: Names of plugin modules to load.
+        :return: Names of successfully loaded modules.
+        """
+        # Modules are loaded in the given order without duplicates, so the
+        # order of registered commands does not depend on string hashing.
+        module_names = list(OrderedDict.fromkeys(module_names))
+        self.stage_registries(module_names)
+        failed = []  # type: List[str]
+        try:
+            failed = [m for m in module_names if not self.load_plugin(m)]
+        finally:
+            reloaded = self.commit_registries(failed)
+
+        return reloaded
+
+    def reload_plugins(self, module_names: Iterable[str]) -> None:
+        """Reload given plugin modules and replace their scheduled jobs.
+
+        :param module_names: Names of modified plugin modules.
+        :return: None
+        """
+        old_schedules = self.schedules
+        reloaded = self.update_registries(module_names)
+        self.replace_schedule_jobs(old_schedules, reloaded)
+
+    def replace_schedule_jobs(self,
+                              old_schedules: Iterable[ScheduledCommand],
+                              module_names: Iterable[str]) -> None:
+        """Replace scheduled jobs provided by given modules.
+
+        :param old_schedules: Schedules registered before reload.
+        :param module_names: Names of reloaded modules.
+        :return: None
+        """
+        module_names = set(module_names)
+        self.remove_schedule_jobs([s for s in old_schedules
+                                   if s.module_name in module_names])
+
+        if self.scheduler.running:
+            self.add_schedule_jobs([s for s in self.schedules
+                                    if s.module_name in module_names])
+
+    def dispatch(self,
+                 channel: str,
+                 user_key: str,
+                 user_input: str,
+                 callback: Callable[[Any], Any]) -> Optional[Any]:
+        """Pass user input to respond() and its result to callback.
+
+        When shard processes are running, user input is routed to the process
+        responsible for given channel and the callback is called when the
+        result is returned. Otherwise respond() is called right away.
+
+        :param channel: Channel or room ID the input came from.
+        :param user_key: Stringified unique user key.
+        :param user_input: User input text.
+        :param callback: Function that receives the result of respond().
+        :return: The value callback returned, or None when routed to shard.
+        """
+        if not self.shard_router:
+            return callback(self.respond(user_key, user_input))
+
+        def complete(future: Future) -> None:
+            if future.cancelled():
+                return
+            try:
+                callback(future.result())
+            except Exception as e:
+                logging.error('Error on handling input from %s. %s',
+                              channel,
+                              e)
+
+        self.shard_router.submit(channel,
+                                 user_key,
+                                 user_input).add_done_callback(complete)
+        return None
 
     def respond(self,
                 user_key: str,
@@ -241,8 +680,11 @@ class Base(object, metaclass=abc.ABCMeta):
         """
         user_context = self.user_context_map.get(user_key, None)
 
-        if user_input == '.help':
-            return self.help()
+        if user_input == '.help' or user_input.startswith('.help '):
+            # .help [prefix] [page]
+            args = user_input.split()[1:]
+            page = int(args.pop()) if args and args[-1].isdecimal() else 1
+            return self.help(args[0] if args else '', page)
 
         ret = None  # type: Optional[Union[RichMessage, UserContext, str]]
         error = []  # type: List[Tuple[str, str]]
@@ -317,25 +759,109 @@ class Base(object, metaclass=abc.ABCMeta):
 
         :param text: User input.
         """
-        return next((c for c in self.commands if text.startswith(c.name)),
-                    None)
+        return self.commands.find(text)
+
+    def help(self,
+             prefix: str = '',
+             page: int = 1) -> Union[str, RichMessage]:
+        """Return help message.
 
-    def help(self) -> Union[str, RichMessage]:
-        """Return stringified help message.
+        Help message is built by build_help() and is cached until registered
+        commands change, so repeated .help requests do not rebuild it.
+
+        :param prefix: Optional prefix to filter commands by their names.
+        :param page: Page number to show when help_page_size is set.
+        :return: String or RichMessage that contains help message
+        """
+        registry = self.commands
+        registry_cache, cache = self.__help_cache
+        if registry_cache is not registry:
+            cache = {}
+            self.__help_cache = (registry, cache)
+
+        key = (prefix, page)
+        if key in cache:
+            return cache[key]
+
+        commands = registry.with_prefix(prefix) if prefix else registry
+        if prefix and not commands:
+            return 'No command starts with "%s"' % prefix
+
+        pages = 1
+        if self.help_page_size and len(commands) > self.help_page_size:
+            pages = -(-len(commands) // self.help_page_size)
+            page = min(max(page, 1), pages)
+            start = (page - 1) * self.help_page_size
+            commands = CommandRegistry(
+                commands[start:start + self.help_page_size])
+
+        message = self.build_help(commands, prefix, page, pages)
+
+        # Prefix is given by user, so do not let the cache grow unlimitedly.
+        if len(cache) >= 64:
+            cache.clear()
+        cache[key] = message
+
+        return message
+
+    def build_help(self,
+                   commands: CommandRegistry,
+                   prefix: str,
+                   page: int,
+                   pages: int) -> Union[str, RichMessage]:
+        """Build help message with given commands.
 
         Override this method to provide more detailed or rich help message.
+        Returned value is cached until registered commands change.
+
+        :param commands: Commands to show.
+        :param prefix: Prefix given to filter commands. Empty if not given.
+        :param page: Current page number.
+        :param pages: Number of pages.
         :return: String or RichMessage that contains help message
         """
-        return "\n".join(c.help for c in self.commands)
+        if pages <= 1:
+            return commands.help
+
+        return "%s\n(%d/%d) Type \".help %s%d\" for next page." % (
+            commands.help,
+            page,
+            pages,
+            prefix + " " if prefix else "",
+            page % pages + 1)
+
+    @property
+    def resource_owner(self) -> str:
+        """Return name to tell this bot apart in resources shared with other
+        bots such as schedule store and lease database.
+
+        :return: Bot name, or lowercased class name when not named.
+        """
+        return self.name or self.__class__.__name__.lower()
 
     @property
-    def schedules(self) -> List[ScheduledCommand]:
+    def schedules(self) -> Registry:
         """Return registered schedules.
 
-        :return: List of ScheduledCommand instances.
+        :return: Immutable sequence of ScheduledCommand instances.
         """
-        cls = self.__class__
-        return cls.__schedules.get(cls.__name__, [])
+        return self.__schedules
+
+    def register_schedule(self, command: ScheduledCommand) -> None:
+        """Register given scheduled command.
+
+        If command name duplicates, update with the later one. The order
+        stays.
+
+        :param command: ScheduledCommand instance.
+        :return: None
+        """
+        if self.__staging:
+            # Plugins are being loaded. Registry is replaced after all modules
+            # are loaded.
+            self.__staging[2][command.name] = command
+        else:
+            self.__schedules = self.__schedules.updated(command)
 
     @classmethod
     def schedule(cls, name: str) \
@@ -358,28 +884,24 @@ class Base(object, metaclass=abc.ABCMeta):
                 return func(given_config)
 
             module = inspect.getmodule(func)
-            self = cls.__instances.get(cls.__name__, None)
             # Register only if bot is instantiated.
-            if self and module:
+            instances = list(cls.__instances.get(cls.__name__, ()))
+            for self in instances if module else ():
                 module_name = module.__name__
+                if not self.__accepts(module_name):
+                    continue
+
                 config = self.plugin_config.get(module_name, {})
                 schedule_config = config.get('schedule', {})
                 if schedule_config:
-                    # If command name duplicates, update with the later one.
-                    # The order stays.
-                    command = ScheduledCommand(name,
-                                               wrapped_function,
-                                               module_name,
-                                               config,
-                                               schedule_config)
-                    try:
-                        # If command is already registered, updated it.
-                        idx = [c.name for c in cls.__schedules[cls.__name__]] \
-                            .index(command.name)
-                        cls.__schedules[cls.__name__][idx] = command
-                    except ValueError:
-                        # Not registered, just append it.
-                        cls.__schedules[cls.__name__].append(command)
+                    # Schedule configuration is copied so bot implementations
+                    # can pop their settings without affecting later reload.
+                    self.register_schedule(
+                        ScheduledCommand(name,
+                                         wrapped_function,
+                                         module_name,
+                                         config,
+                                         dict(schedule_config)))
                 else:
                     logging.warning(
                         'Missing configuration for schedule job. %s. '
@@ -393,30 +915,191 @@ class Base(object, metaclass=abc.ABCMeta):
     def add_schedule_jobs(self, commands: Iterable[ScheduledCommand]) -> None:
         """Add given function to scheduler.
 
+        Unless specified in scheduler_args, missed runs are coalesced and only
+        one instance of each job runs at a time, so a slow job never piles up
+        overlapping runs.
+
         :param commands: List of ScheduledCommand instances.
         :return: None
         """
+        jobs = []  # type: List[Tuple[str, Callable[..., None], Dict]]
         for command in commands:
             # self.add_schedule_job(command)
             job_function = self.generate_schedule_job(command)
             if not job_function:
                 continue
-            logging.info("Add schedule %s" % command.job_id)
-            self.scheduler.add_job(
+            job_id = self.schedule_job_id(command)
+
+            if self.schedule_leader:
+                job_function = self.leader_only(job_function, job_id)
+
+            scheduler_args = dict(command.schedule_config.pop(
+                'scheduler_args', {'trigger': "interval",
+                                   'minutes': 5}))
+            scheduler_args.setdefault('coalesce', True)
+            scheduler_args.setdefault('max_instances', 1)
+            # Scheduler only sees submission to worker pool, so the limit is
+            # enforced by the runner.
+            job_function = self.schedule_runner.wrap(
+                job_id,
                 job_function,
-                id=command.job_id,
-                **command.schedule_config.pop(
-                    'scheduler_args', {'trigger': "interval",
-                                       'minutes': 5}))
+                scheduler_args['max_instances'])
+            jitter = command.schedule_config.pop('jitter',
+                                                 self.schedule_jitter)
+            if jitter:
+                # Delayed before submission, so the delay occupies neither a
+                # worker thread nor a slot of max_instances.
+                job_function = self.jittered(job_function, jitter)
+            if self.schedule_store:
+                scheduler_args.update(
+                    self.schedule_store.job_kwargs(job_id, scheduler_args))
+            jobs.append((job_id, job_function, scheduler_args))
+
+        if self.schedule_spread:
+            self.stagger([args for _, _, args in jobs])
+
+        for job_id, job_function, scheduler_args in jobs:
+            logging.info("Add schedule %s" % job_id)
+            self.scheduler.add_job(job_function, id=job_id, **scheduler_args)
+
+    @staticmethod
+    def stagger(scheduler_args_list: Iterable[Dict]) -> None:
+        """Set start_date so interval jobs with the same interval do not run
+        at once.
+
+        The first runs of N jobs sharing the same interval are spread evenly
+        over one interval. Jobs with explicit start_date are left as they are.
+
+        :param scheduler_args_list: Arguments to be passed to add_job().
+        :return: None
+        """
+        groups = OrderedDict()  # type: Dict[float, List[Dict]]
+        for args in scheduler_args_list:
+            if args.get('trigger', None) != 'interval' or 'start_date' in args:
+                continue
+
+            interval = timedelta(weeks=args.get('weeks', 0),
+                                 days=args.get('days', 0),
+                                 hours=args.get('hours', 0),
+                                 minutes=args.get('minutes', 0),
+                                 seconds=args.get('seconds', 0))
+            if interval.total_seconds() > 0:
+                groups.setdefault(interval.total_seconds(), []).append(args)
+
+        now = datetime.now()
+        for interval, group in groups.items():
+            for i, args in enumerate(group):
+                # First run comes after one interval as APScheduler does
+                args['start_date'] = now + timedelta(
+                    seconds=interval * (1 + i / len(group)))
+
+    @staticmethod
+    def jittered(job_function: Callable[..., None],
+                 jitter: float) -> Callable[..., None]:
+        """Wrap job function so each run is delayed by random seconds.
+
+        The wrapper returns at once and a timer thread calls the job function
+        after the delay, so the scheduler thread is never blocked.
+
+        :param job_function: Function wrapped by ScheduleRunner.wrap().
+        :param jitter: Maximum delay in seconds.
+        :return: Wrapped function.
+        """
+        @wraps(job_function)
+        def wrapper(*args, **kwargs):
+            timer = threading.Timer(random.uniform(0, jitter),
+                                    job_function,
+                                    args=args,
+                                    kwargs=kwargs)
+            timer.daemon = True
+            timer.start()
+
+        return wrapper
+
+    def leader_only(self,
+                    job_function: Callable[..., None],
+                    job_id: str) -> Callable[..., None]:
+        """Wrap job function so it runs only while holding the leadership.
+
+        :param job_function: Function generated by generate_schedule_job().
+        :param job_id: ID of the scheduled job.
+        :return: Wrapped function.
+        """
+        election = self.schedule_leader
+
+        @wraps(job_function)
+        def wrapper(*args, **kwargs):
+            if not election.is_leader:
+                logging.debug('Skip %s. Not a leader.', job_id)
+                return None
+            return job_function(*args, **kwargs)
+
+        return wrapper
+
+    def remove_schedule_jobs(self,
+                             commands: Iterable[ScheduledCommand]) -> None:
+        """Remove jobs of given commands from scheduler.
+
+        :param commands: List of ScheduledCommand instances.
+        :return: None
+        """
+        for command in commands:
+            try:
+                self.scheduler.remove_job(self.schedule_job_id(command))
+            except JobLookupError:
+                # Job was not added. e.g. missing configuration.
+                pass
+
+    def schedule_job_id(self, command: ScheduledCommand) -> str:
+        """Return ID of the scheduled job for given command.
+
+        When scheduler is shared with other bots, the ID is prefixed with the
+        bot name to avoid conflict.
+
+        :param command: ScheduledCommand instance.
+        :return: Job ID.
+        """
+        return "%s/%s" % (self.name, command.job_id) if self.name \
+            else command.job_id
 
     @property
-    def commands(self) -> List[Command]:
+    def commands(self) -> CommandRegistry:
         """Return registered commands.
 
-        :return: List of Command instances.
+        :return: Immutable sequence of Command instances.
+        """
+        return self.__commands
+
+    def __accepts(self, module_name: str) -> bool:
+        """Return if commands provided by given module can be registered.
+
+        While plugins are loaded, only modules being loaded and their
+        submodules are accepted. Otherwise commands are registered as soon as
+        they are declared.
+
+        :param module_name: Name of the module that provides commands.
+        :return: True if acceptable.
+        """
+        if self.__staging is None or module_name in self.__staging[0]:
+            return True
+
+        return any(module_name.startswith(m + '.') for m in self.__staging[0])
+
+    def register_command(self, command: Command) -> None:
+        """Register given command.
+
+        If command name duplicates, update with the later one. The order
+        stays.
+
+        :param command: Command instance.
+        :return: None
         """
-        cls = self.__class__
-        return cls.__commands.get(cls.__name__, [])
+        if self.__staging:
+            # Plugins are being loaded. Registry is replaced after all modules
+            # are loaded.
+            self.__staging[1][command.name] = command
+        else:
+            self.__commands = self.__commands.updated(command)
 
     @classmethod
     def command(cls,
@@ -443,23 +1126,16 @@ class Base(object, metaclass=abc.ABCMeta):
                 return func(command_message, given_config)
 
             module = inspect.getmodule(func)
-            self = cls.__instances.get(cls.__name__, None)
             # Register only if bot is instantiated.
-            if self and module:
+            instances = list(cls.__instances.get(cls.__name__, ()))
+            for self in instances if module else ():
                 module_name = module.__name__
-                config = self.plugin_config.get(module_name, {})
-                # If command name duplicates, update with the later one.
-                # The order stays.
+                if not self.__accepts(module_name):
+                    continue
 
-                command = Command(name, func, module_name, config, examples)
-                try:
-                    # If command is already registered, updated it.
-                    idx = [c.name for c in cls.__commands[cls.__name__]] \
-                        .index(command.name)
-                    cls.__commands[cls.__name__][idx] = command
-                except ValueError:
-                    # Not registered, just append it.
-                    cls.__commands[cls.__name__].append(command)
+                config = self.plugin_config.get(module_name, {})
+                self.register_command(
+                    Command(name, func, module_name, config, examples))
 
             # To ease plugin's unit test
             return wrapped_function
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Provide detection of events delivered more than once.
+
+Keys of recently seen events are kept in insertion order with the time they
+were first seen. Keys older than the window are dropped as new keys are
+added, and the oldest key is dropped when the size limit is reached, so
+memory stays constant and each check is O(1) amortized.
+"""
+import threading  # type: ignore
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class Deduplicator(object):
+    """Remember keys of recent events for a limited time."""
+
+    def __init__(self, max_size: int = 10000, window: float = 300.0) -> None:
+        """Initializer.
+
+        :param max_size: Maximum number of keys to remember.
+        :param window: Seconds to remember each key.
+        :return: None
+        """
+        self.max_size = max_size
+        self.window = window
+        self.duplicates = 0
+        self.__seen = OrderedDict()  # type: OrderedDict
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__seen)
+
+    def seen(self, key: Hashable) -> bool:
+        """Return if given key is seen in the window, and remember it.
+
+        :param key: Key that identifies the event.
+        :return: True if the event is a duplicate.
+        """
+        now = time.time()
+        with self.__lock:
+            first_seen = self.__seen.get(key, None)
+            if first_seen is not None and now - first_seen <= self.window:
+                self.duplicates += 1
+                return True
+
+            # Expired key is added again as the newest one
+            self.__seen.pop(key, None)
+            self.__seen[key] = now
+
+            deadline = now - self.window
+            while len(self.__seen) > self.max_size or \
+                    next(iter(self.__seen.values())) < deadline:
+                self.__seen.popitem(last=False)
+
+        return False
@@ -1,19 +1,21 @@
 # -*- coding: utf-8 -*-
 """Provide Gitter interaction."""
 import collections
-import json
 import logging
 from contextlib import closing
-from threading import Thread
+from functools import partial
+from threading import Thread, Lock
 from typing import Dict, Optional, Callable, Any, Iterable, Union, Sequence, \
     List
 
 import requests
 import time
+from requests.adapters import HTTPAdapter
 
-from sarah import ValueObject
+from sarah import ValueObject, json_codec
 from sarah.bot import Base
 from sarah.bot.values import ScheduledCommand, PluginConfig
+from sarah.exceptions import SarahException
 from sarah.value_object import ObjectMapper
 
 
@@ -170,9 +172,15 @@ class GitterClient(object):
 
     def __init__(self,
                  token: str,
-                 base_url: str = "https://api.gitter.im/v1/") -> None:
+                 base_url: str = "https://api.gitter.im/v1/",
+                 pool_size: int = 10) -> None:
         self.token = token
         self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        # Reuse connections among concurrent requests
+        self.session = requests.Session()
+        self.session.mount('https://',
+                           HTTPAdapter(pool_connections=1,
+                                       pool_maxsize=pool_size))
 
     def generate_endpoint(self,
                           resource: str,
@@ -220,17 +228,17 @@ class GitterClient(object):
                    'Content-Type': "application/json"}
 
         try:
-            response = requests.request(method,
-                                        endpoint,
-                                        headers=headers,
-                                        params=params,
-                                        json=post_params)
+            data = None if post_params is None \
+                else json_codec.dumps(post_params).encode('utf-8')
+            response = self.session.request(method,
+                                            endpoint,
+                                            headers=headers,
+                                            params=params,
+                                            data=data)
             logging.debug(response)
             # object_hook is handy when mapping sinple object,
             # but requires extra work to map nested object
-            # return json.loads(response.content.decode(),
-            #                   object_hook=mapper.map)
-            obj = json.loads(response.content.decode())
+            obj = json_codec.loads(response.content)
             if isinstance(obj, collections.Mapping):
                 return mapper.map(obj)
             elif isinstance(obj, collections.Iterable):
@@ -270,28 +278,127 @@ class Gitter(Base):
                  plugins: Iterable[PluginConfig] = None,
                  rest_base_url: str = None,
                  stream_base_url: str = "https://stream.gitter.im/v1/",
-                 max_workers: int = None) -> None:
-        super().__init__(plugins=plugins, max_workers=max_workers)
+                 max_workers: int = None,
+                 plugin_watch_interval: float = None,
+                 help_page_size: int = None,
+                 shards: int = None,
+                 ingest_socket: str = None,
+                 schedule_leader: Dict = None,
+                 broadcast_workers: int = 10,
+                 schedule_jitter: float = 0.0,
+                 schedule_spread: bool = True,
+                 schedule_store: Dict = None,
+                 schedule_workers: int = None) -> None:
+        super().__init__(plugins=plugins,
+                         max_workers=max_workers,
+                         plugin_watch_interval=plugin_watch_interval,
+                         help_page_size=help_page_size,
+                         shards=shards,
+                         ingest_socket=ingest_socket,
+                         schedule_leader=schedule_leader,
+                         broadcast_workers=broadcast_workers,
+                         schedule_jitter=schedule_jitter,
+                         schedule_spread=schedule_spread,
+                         schedule_store=schedule_store,
+                         schedule_workers=schedule_workers)
 
         self.user_id = None
         self.token = token
         self.client = self.setup_client(token=token, base_url=rest_base_url)
+
+        # {room name or ID: room ID, ...}
+        # Replaced, not modified, on every refresh.
+        self.room_directory = {}  # type: Dict[str, str]
+        self.room_directory_updated_at = 0.0
+        self.room_directory_lock = Lock()
         self.stream_base_url = stream_base_url \
             if stream_base_url.endswith("/") else stream_base_url + "/"
 
     def setup_client(self, token: str, base_url: str = None) -> GitterClient:
-        return GitterClient(token, base_url) \
-            if base_url else GitterClient(token)
+        # Fan-out pool may be disabled with None or 0
+        pool_size = max(self.broadcast_workers or 0, 10)
+        return GitterClient(token, base_url, pool_size=pool_size) \
+            if base_url else GitterClient(token, pool_size=pool_size)
 
     def generate_schedule_job(self, command: ScheduledCommand) \
             -> Optional[Callable[..., None]]:
-        pass
+        """Generate callback function to be registered to scheduler.
+
+        This creates a function that execute given command once, and then
+        posts the result to configured rooms concurrently. Rooms can be given
+        by name or ID, and names are resolved with cached room directory.
+
+        :param command: ScheduledCommand object that holds job information
+        :return: Optional callable object to be scheduled
+        """
+        rooms = command.schedule_config.pop('rooms', [])
+        if not rooms:
+            logging.warning(
+                'Missing rooms configuration for schedule job. %s. '
+                'Skipping.' % command.module_name)
+            return None
+
+        def job_function() -> None:
+            ret = command()
+            if not ret:
+                return
+
+            text = str(ret)
+            self.fan_out(command.job_id,
+                         rooms,
+                         lambda room: self.client.post_message(
+                             self.resolve_room_id(room),
+                             text))
+
+        return job_function
+
+    def update_room_directory(self, rooms: Iterable[GitterClient.Room]) \
+            -> None:
+        """Replace room directory with given rooms.
+
+        :param rooms: Rooms the user joins.
+        :return: None
+        """
+        directory = {}  # type: Dict[str, str]
+        for room in rooms:
+            directory[room.id] = room.id
+            directory[room.name] = room.id
+
+        self.room_directory = directory
+        self.room_directory_updated_at = time.time()
+
+    def resolve_room_id(self, room: str) -> str:
+        """Return room ID for given room name or ID.
+
+        Room directory is fetched again only when given room is not found and
+        the directory is older than a minute, so newly joined rooms are found
+        without calling API on every scheduled run.
+
+        :param room: Room name or ID.
+        :return: Room ID.
+        """
+        room_id = self.room_directory.get(room, None)
+        if room_id:
+            return room_id
+
+        with self.room_directory_lock:
+            room_id = self.room_directory.get(room, None)
+            if not room_id \
+                    and time.time() - self.room_directory_updated_at > 60:
+                self.update_room_directory(self.client.get_rooms())
+                room_id = self.room_directory.get(room, None)
+
+        if not room_id:
+            raise SarahGitterException('Unknown room: %s' % room)
+
+        return room_id
 
     def generate_endpoint(self, room_id: str):
         return "%srooms/%s/chatMessages" % (self.stream_base_url, room_id)
 
     def connect(self) -> None:
         rooms = self.client.get_rooms()
+        self.update_room_directory(rooms)
 
         user = self.client.get_current_user()
         self.user_id = user.id
@@ -351,7 +458,7 @@ class Gitter(Base):
                 if not line:
                     continue
 
-                message = message_mapper.map(json.loads(line.decode('utf-8')))
+                message = message_mapper.map(json_codec.loads(line))
                 self.handle_message(room, message)
 
     def handle_message(self,
@@ -362,8 +469,17 @@ class Gitter(Base):
             if message.from_user.id == self.user_id:
                 return None
 
-            ret = self.respond(message.from_user.id, message.text)
-            if ret:
-                self.client.post_message(room.id, ret)
+            self.dispatch(room.id,
+                          message.from_user.id,
+                          message.text,
+                          partial(self.send_response, room.id))
         except Exception as e:
             logging.error(e)
+
+    def send_response(self, room_id: str, ret: Optional[str]) -> None:
+        if ret:
+            self.client.post_message(room_id, ret)
+
+
+class SarahGitterException(SarahException):
+    pass
@@ -20,7 +20,16 @@ class HipChat(Base):
                  rooms: Iterable[str] = None,
                  nick: str = '',
                  proxy: Dict = None,
-                 max_workers: int = None) -> None:
+                 max_workers: int = None,
+                 plugin_watch_interval: float = None,
+                 help_page_size: int = None,
+                 ingest_socket: str = None,
+                 schedule_leader: Dict = None,
+                 broadcast_workers: int = 10,
+                 schedule_jitter: float = 0.0,
+                 schedule_spread: bool = True,
+                 schedule_store: Dict = None,
+                 schedule_workers: int = None) -> None:
         """Initializer.
 
         :param plugins: List of plugin modules.
@@ -30,9 +39,35 @@ class HipChat(Base):
         :param nick: nickname to use.
         :param proxy: Proxy setting as dictionary.
         :param max_workers: Optional number of worker threads.
+        :param plugin_watch_interval: Optional interval in seconds to check
+            plugin modification.
+        :param help_page_size: Optional number of commands per help page.
+        :param ingest_socket: Optional path of Unix domain socket to read
+            events from instead of connecting to HipChat.
+        :param schedule_leader: Optional leader election setting to run
+            scheduled jobs on only one replica.
+        :param broadcast_workers: Number of threads to handle scheduled
+            message sending to multiple rooms.
+        :param schedule_jitter: Maximum seconds to randomly delay each run of
+            scheduled jobs.
+        :param schedule_spread: Whether to stagger the first runs of interval
+            jobs with the same interval.
+        :param schedule_store: Optional setting of persistent schedule store.
+        :param schedule_workers: Optional number of threads to run scheduled
+            jobs.
         :return: None
         """
-        super().__init__(plugins=plugins, max_workers=max_workers)
+        super().__init__(plugins=plugins,
+                         max_workers=max_workers,
+                         plugin_watch_interval=plugin_watch_interval,
+                         help_page_size=help_page_size,
+                         ingest_socket=ingest_socket,
+                         schedule_leader=schedule_leader,
+                         broadcast_workers=broadcast_workers,
+                         schedule_jitter=schedule_jitter,
+                         schedule_spread=schedule_spread,
+                         schedule_store=schedule_store,
+                         schedule_workers=schedule_workers)
 
         self.rooms = rooms if rooms else []  # type: Iterable[str]
         self.nick = nick
@@ -44,7 +79,8 @@ class HipChat(Base):
         """Generate callback function to be registered to scheduler.
 
         This creates a function that execute given command, handle the command
-        response, and then submit response to message sending worker.
+        response, and then submit response to message sending worker. Results
+        for each room are reported when all of them complete.
 
         :param command: ScheduledCommand object that holds job information
         :return: Optional callable object to be scheduled
@@ -60,13 +96,17 @@ class HipChat(Base):
 
         def job_function() -> None:
             ret = command()
-            for room in rooms:
-                self.enqueue_sending_message(
-                    self.client.send_message,
-                    mto=room,
-                    mbody=ret,
-                    mtype=command.schedule_config.get('message_type',
-                                                      'groupchat'))
+            message_type = command.schedule_config.get('message_type',
+                                                       'groupchat')
+            # XMPP stanzas go through one stream, so sending is still
+            # serialized by message worker.
+            self.fan_out(command.job_id,
+                         rooms,
+                         lambda room: self.enqueue_scheduled_message(
+                             self.client.send_message,
+                             mto=room,
+                             mbody=ret,
+                             mtype=message_type))
 
         return job_function
 
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Provide mechanism to run multiple bots in one process.
+
+Each bot instance runs its own connection and message sending worker, while
+plugin modules are imported only once and one scheduler and one worker thread
+pool are shared among all hosted bots. Registered commands are still scoped
+per bot instance, so two bots of the same kind, e.g. two Slack workspaces, can
+have different plugins and configurations.
+"""
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor  # type: ignore
+from threading import Thread
+from apscheduler.schedulers import background  # type: ignore
+from typing import Iterable, Tuple, Optional, List, Dict
+
+import time
+
+from sarah.bot.base import Base
+from sarah.watcher import ModuleWatcher
+
+
+def plugin_module_names(bots: Iterable[Base]) -> List[str]:
+    """Return names of plugin modules used by any of given bots.
+
+    :param bots: Bot instances.
+    :return: List of module names in configured order.
+    """
+    names = OrderedDict()  # type: Dict[str, None]
+    for bot in bots:
+        for module_name in bot.plugin_config.keys():
+            names[module_name] = None
+
+    return list(names.keys())
+
+
+def load_plugins(bots: Dict[str, Base],
+                 module_names: Iterable[str] = None) -> Dict[str, List[str]]:
+    """Import each plugin module once and register to bots using it.
+
+    :param bots: Bot instances by unique name.
+    :param module_names: Names of modules to load. All modules used by given
+        bots are loaded when omitted.
+    :return: Names of successfully loaded modules for each bot.
+    """
+    requested = None if module_names is None else set(module_names)
+    module_names = [m for m in plugin_module_names(bots.values())
+                    if requested is None or m in requested]
+
+    for bot in bots.values():
+        bot.stage_registries(m for m in module_names
+                             if m in bot.plugin_config)
+
+    failed = []  # type: List[str]
+    try:
+        failed = [m for m in module_names if not Base.load_plugin(m)]
+    finally:
+        loaded = {name: bot.commit_registries(failed)
+                  for name, bot in bots.items()}
+
+    return loaded
+
+
+class Host(object):
+    """Run multiple bots in one process with shared resources."""
+
+    def __init__(self,
+                 bots: Iterable[Tuple[str, Base]],
+                 max_workers: Optional[int] = None,
+                 plugin_watch_interval: Optional[float] = None) -> None:
+        """Initializer.
+
+        :param bots: Pairs of unique name and bot instance.
+        :param max_workers: Optional number of worker threads shared among
+            bots. Methods with @concurrent decorator are submitted to this
+            thread pool.
+        :param plugin_watch_interval: Optional interval in seconds to check
+            modification of plugin modules.
+        :return: None
+        """
+        self.bots = OrderedDict(bots)  # type: Dict[str, Base]
+        self.max_workers = max_workers
+        self.plugin_watch_interval = plugin_watch_interval
+        self.scheduler = background.BackgroundScheduler()
+
+        # To be set on run()
+        self.worker = None  # type: ThreadPoolExecutor
+        self.plugin_watcher = None  # type: ModuleWatcher
+
+    @property
+    def module_names(self) -> List[str]:
+        """Return names of plugin modules used by any hosted bot.
+
+        :return: List of module names in configured order.
+        """
+        return plugin_module_names(self.bots.values())
+
+    def load_plugins(self, module_names: Iterable[str] = None) \
+            -> Dict[str, List[str]]:
+        """Import each plugin module once and register to bots using it.
+
+        :param module_names: Names of modules to load. All modules used by
+            hosted bots are loaded when omitted.
+        :return: Names of successfully loaded modules for each bot.
+        """
+        return load_plugins(self.bots, module_names)
+
+    def reload_plugins(self, module_names: Iterable[str]) -> None:
+        """Reload given plugin modules and replace scheduled jobs.
+
+        :param module_names: Names of modified plugin modules.
+        :return: None
+        """
+        old_schedules = {name: bot.schedules
+                         for name, bot in self.bots.items()}
+        loaded = self.load_plugins(module_names)
+        for name, bot in self.bots.items():
+            bot.replace_schedule_jobs(old_schedules[name], loaded[name])
+
+    def run(self) -> None:
+        """Start all hosted bots and wait until all of them stop.
+
+        :return: None
+        """
+        self.worker = ThreadPoolExecutor(max_workers=self.max_workers) \
+            if self.max_workers else None
+        for name, bot in self.bots.items():
+            bot.share_resources(name, self.scheduler, self.worker)
+
+        self.load_plugins()
+
+        if self.plugin_watch_interval:
+            self.plugin_watcher = ModuleWatcher(self.module_names,
+                                                self.reload_plugins,
+                                                self.plugin_watch_interval)
+            self.plugin_watcher.start()
+
+        # Each bot adds its jobs after its message worker is ready.
+        self.scheduler.start()
+
+        threads = [Thread(target=bot.run, name=name, daemon=True)
+                   for name, bot in self.bots.items()]
+        for thread in threads:
+            logging.info('Start %s', thread.name)
+            thread.start()
+
+        try:
+            while [t for t in threads if t.is_alive()]:
+                # Check thread status every 5 secs.
+                time.sleep(5)
+            logging.info('All bots are now stopped.')
+        except KeyboardInterrupt:
+            logging.info('Interrupted.')
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """Stop shared resources."""
+        if self.plugin_watcher:
+            self.plugin_watcher.stop()
+
+        if self.scheduler.running:
+            try:
+                self.scheduler.shutdown()
+            except Exception as e:
+                logging.error(e)
+
+        if self.worker:
+            self.worker.shutdown(wait=False)
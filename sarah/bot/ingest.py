@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""Provide mechanism to feed events to bot via Unix domain socket.
+
+In ingestion mode, bot does not connect to chat service. Instead, another
+process such as a connection-owning gateway or a load testing tool connects to
+the socket and writes normalized events as newline-delimited JSON.
+
+    {"id": "1", "channel": "C06TXXXX", "user": "U06TXXXXX", "text": ".echo a"}
+
+Each event is passed to Base.dispatch() and the result is written back to the
+same connection in the same format.
+
+    {"id": "1", "channel": "C06TXXXX", "response": "a", "rich": null}
+
+Events on one connection are dispatched in the received order. Responses may
+come in different order when shard processes are used.
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import threading  # type: ignore
+from functools import partial
+from typing import Any, Optional, Dict, Iterator
+
+from sarah.bot.values import RichMessage
+from sarah.exceptions import SarahException
+
+
+def encode_value(value: Any) -> Any:
+    """Return JSON serializable form of given value.
+
+    This is passed to json.dumps() as default, so rich message components
+    nested in dictionaries, e.g. attachments of SlackMessage, are converted
+    with their to_dict() as well.
+
+    :param value: Value json module can not serialize.
+    :return: Serializable value.
+    """
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    return str(value)
+
+
+def encode_response(event_id: Any, channel: str, ret: Any) -> bytes:
+    """Return JSON line that represents the result of Base.respond().
+
+    :param event_id: ID given with the event, if any.
+    :param channel: Channel the event came from.
+    :param ret: Result of Base.respond().
+    :return: Encoded line.
+    """
+    rich = None
+    if isinstance(ret, RichMessage) and hasattr(ret, 'to_dict'):
+        rich = ret.to_dict()
+
+    return json.dumps({'id': event_id,
+                       'channel': channel,
+                       'response': None if ret is None else str(ret),
+                       'rich': rich},
+                      default=encode_value).encode('utf-8') + b"\n"
+
+
+class IngestHandler(socketserver.StreamRequestHandler):
+    """Read events from one connection and dispatch them to bot."""
+
+    def handle(self) -> None:
+        # Responses may be written from shard result collector thread
+        lock = threading.Lock()
+
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            try:
+                event = json.loads(line.decode('utf-8'))
+                channel = event['channel']
+                user = event['user']
+                text = event['text']
+            except (ValueError, KeyError, TypeError) as e:
+                logging.error('Malformed event is given. %s. %s', e, line)
+                continue
+
+            self.server.bot.dispatch(channel,
+                                     user,
+                                     text,
+                                     partial(self.reply,
+                                             lock,
+                                             event.get('id', None),
+                                             channel))
+
+    def reply(self,
+              lock: threading.Lock,
+              event_id: Any,
+              channel: str,
+              ret: Any) -> None:
+        data = encode_response(event_id, channel, ret)
+        try:
+            with lock:
+                self.wfile.write(data)
+        except (OSError, ValueError) as e:
+            # Client disconnected before the response is ready
+            logging.warning('Failed to write response to %s. %s',
+                            channel,
+                            e)
+
+
+class IngestServer(socketserver.ThreadingMixIn,
+                   socketserver.UnixStreamServer):
+    """Unix domain socket server to feed events to bot."""
+
+    daemon_threads = True
+
+    def __init__(self, bot, path: str) -> None:
+        """Initializer.
+
+        Stale socket file left by previous run is removed. Any other kind of
+        file at the path is left untouched and SarahException is raised.
+
+        :param bot: Bot instance to dispatch events to.
+        :param path: Path of Unix domain socket.
+        :return: None
+        """
+        self.bot = bot
+        self.path = path
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise SarahException('%s exists and is not a socket.' % path)
+            os.unlink(path)
+        super().__init__(path, IngestHandler)
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class IngestClient(object):
+    """Client to write events to IngestServer and read responses."""
+
+    def __init__(self, path: str) -> None:
+        """Initializer.
+
+        :param path: Path of Unix domain socket.
+        :return: None
+        """
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.reader = self.socket.makefile('rb')
+
+    def send(self,
+             channel: str,
+             user: str,
+             text: str,
+             event_id: Optional[Any] = None) -> None:
+        """Write event.
+
+        :param channel: Channel or room ID.
+        :param user: Stringified unique user key.
+        :param text: User input text.
+        :param event_id: Optional ID to be returned with response.
+        :return: None
+        """
+        self.socket.sendall(json.dumps({'id': event_id,
+                                        'channel': channel,
+                                        'user': user,
+                                        'text': text}).encode('utf-8') + b"\n")
+
+    def receive(self) -> Optional[Dict]:
+        """Read one response. Return None when connection is closed."""
+        line = self.reader.readline()
+        return json.loads(line.decode('utf-8')) if line else None
+
+    def responses(self) -> Iterator[Dict]:
+        """Read responses until connection is closed."""
+        while True:
+            response = self.receive()
+            if response is None:
+                return
+            yield response
+
+    def close(self) -> None:
+        self.reader.close()
+        self.socket.close()
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Provide immutable registries of commands and scheduled commands.
+
+Registered commands are read by message handling threads on every user input,
+while plugin loading may register or replace them at any time. Instead of
+guarding them with a lock, each registry is an immutable snapshot. A change
+builds a new snapshot and replaces the reference, so readers always see a
+consistent view without locking.
+"""
+import threading  # type: ignore
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Sequence
+from itertools import chain, islice
+from typing import Iterable, Iterator, Optional, Any
+
+from sarah.bot.values import Command
+
+try:
+    from typing import Dict, List, Tuple
+
+    # Work-around to avoid pyflakes warning "imported but unused" regarding
+    # mypy's comment-styled type hinting
+    # http://www.laurivan.com/make-pyflakespylint-ignore-unused-imports/
+    # http://stackoverflow.com/questions/5033727/how-do-i-get-pyflakes-to-ignore-a-statement/12121404#12121404
+    assert Dict
+    assert Tuple
+    assert List
+except AssertionError:
+    pass
+
+
+class Registry(Sequence):
+    """Immutable sequence of named items with name-to-index mapping."""
+
+    def __init__(self, items: Iterable[Any] = ()) -> None:
+        """Initializer.
+
+        When more than one item share the same name, the later one replaces
+        the former one while the position of the former one stays.
+
+        :param items: Items with name property.
+        :return: None
+        """
+        deduplicated = OrderedDict()  # type: Dict[str, Any]
+        for item in items:
+            deduplicated[item.name] = item
+
+        self.__share(list(deduplicated.values()),
+                     {name: i for i, name in enumerate(deduplicated.keys())},
+                     threading.Lock(),
+                     len(deduplicated))
+
+    def __share(self,
+                items: List[Any],
+                index: Dict[str, int],
+                lock: threading.Lock,
+                length: int) -> None:
+        # Items and index are append-only and shared with snapshots created
+        # by appending, and each snapshot only sees its first length items.
+        self.__items = items
+        self.__index = index
+        self.__lock = lock
+        self.__length = length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+
+        if index < 0:
+            index += self.__length
+        if not 0 <= index < self.__length:
+            raise IndexError('registry index out of range')
+
+        return self.__items[index]
+
+    def __iter__(self) -> Iterator[Any]:
+        return islice(self.__items, self.__length)
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def __repr__(self) -> str:
+        return '%s(%s)' % (self.__class__.__name__, list(self))
+
+    def index_of(self, name: str) -> Optional[int]:
+        """Return the position of the item with given name.
+
+        :param name: Name of the item.
+        :return: Optional position.
+        """
+        idx = self.__index.get(name, None)
+        # Items appended by newer snapshots are not visible
+        return idx if idx is not None and idx < self.__length else None
+
+    def get(self, name: str) -> Optional[Any]:
+        """Return the item with given name.
+
+        :param name: Name of the item.
+        :return: Optional item.
+        """
+        idx = self.index_of(name)
+        return None if idx is None else self.__items[idx]
+
+    def updated(self, item: Any) -> 'Registry':
+        """Return new registry with given item registered.
+
+        If the name is already registered, the item is replaced and the order
+        stays. Otherwise the item is appended. Appending to the newest
+        registry shares the storage with it, so it takes O(1) amortized time.
+        Replacing, or appending to older registry, copies all items.
+
+        :param item: Item to register.
+        :return: New registry.
+        """
+        if self.index_of(item.name) is None:
+            with self.__lock:
+                if self.__length == len(self.__items) \
+                        and item.name not in self.__index:
+                    self.__items.append(item)
+                    self.__index[item.name] = self.__length
+                    registry = self.__class__.__new__(self.__class__)
+                    registry.__share(self.__items,
+                                     self.__index,
+                                     self.__lock,
+                                     self.__length + 1)
+                    return registry
+
+        return self.__class__(chain(self, (item,)))
+
+
+class CommandRegistry(Registry):
+    """Immutable sequence of commands with prefix lookup and help text."""
+
+    def __derived(self) -> Tuple[Tuple[int, ...], Tuple[str, ...], str]:
+        """Return distinct lengths of command names, sorted names and help.
+
+        These are computed once on first use of each registry, so neither
+        registration nor lookup and help iterate all commands every time.
+        Concurrent first uses may compute them twice, which is harmless.
+        """
+        try:
+            return self.__dict__['_derived']
+        except KeyError:
+            derived = self.__dict__['_derived'] = (
+                tuple(sorted({len(c.name) for c in self})),
+                tuple(sorted(c.name for c in self)),
+                "\n".join(c.help for c in self))
+            return derived
+
+    def find(self, text: str) -> Optional[Command]:
+        """Return the first registered command that given text starts with.
+
+        Instead of testing every command, this looks up the name index with
+        each distinct length of registered names.
+
+        :param text: User input.
+        :return: Optional Command instance.
+        """
+        found = None
+        for length in self.__derived()[0]:
+            if length > len(text):
+                break
+
+            idx = self.index_of(text[:length])
+            if idx is not None and (found is None or idx < found):
+                found = idx
+
+        return None if found is None else self[found]
+
+    def with_prefix(self, prefix: str) -> 'CommandRegistry':
+        """Return new registry with commands whose names start with prefix.
+
+        Matching names are found by binary search on sorted names, and the
+        registration order stays.
+
+        :param prefix: Prefix of command names.
+        :return: New registry.
+        """
+        sorted_names = self.__derived()[1]
+        indexes = []
+        for i in range(bisect_left(sorted_names, prefix), len(sorted_names)):
+            name = sorted_names[i]
+            if not name.startswith(prefix):
+                break
+            indexes.append(self.index_of(name))
+
+        return CommandRegistry(self[i] for i in sorted(indexes))
+
+    @property
+    def help(self) -> str:
+        """Return help text of all registered commands."""
+        return self.__derived()[2]
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""Provide mechanism to run scheduled jobs off the scheduler thread.
+
+Scheduler threads only submit jobs to a worker pool, so a slow plugin does not
+hold them and other jobs do not misfire. Because the scheduler considers a
+job finished once it is submitted, the max_instances limit of each job is
+enforced here, and runs beyond the limit are skipped.
+
+Runs, errors, skipped overlaps, misfires and lateness are tracked per job.
+"""
+import logging
+import threading  # type: ignore
+import time
+from concurrent.futures import Executor  # type: ignore
+from functools import wraps
+from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, \
+    EVENT_JOB_MISSED  # type: ignore
+from apscheduler.schedulers.base import BaseScheduler  # type: ignore
+from typing import Callable, Optional, Any
+
+try:
+    from typing import Dict
+
+    # Work-around to avoid pyflakes warning "imported but unused" regarding
+    # mypy's comment-styled type hinting
+    # http://www.laurivan.com/make-pyflakespylint-ignore-unused-imports/
+    # http://stackoverflow.com/questions/5033727/how-do-i-get-pyflakes-to-ignore-a-statement/12121404#12121404
+    assert Dict
+except AssertionError:
+    pass
+
+
+class JobStats(object):
+    """Execution statistics of one scheduled job.
+
+    Statistics are updated from scheduler and worker threads, so they are
+    only updated through methods that hold the lock.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.runs = 0
+        self.errors = 0
+        self.overlaps = 0
+        self.misfires = 0
+        # Seconds from scheduled time until submitted to worker pool
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+        # Seconds from submission until started on worker pool
+        self.last_queue_delay = 0.0
+        self.max_queue_delay = 0.0
+        self.last_duration = 0.0
+
+    def record_start(self, queue_delay: float) -> None:
+        with self.__lock:
+            self.last_queue_delay = queue_delay
+            self.max_queue_delay = max(self.max_queue_delay, queue_delay)
+
+    def record_end(self, duration: float, failed: bool) -> None:
+        with self.__lock:
+            if failed:
+                self.errors += 1
+            else:
+                self.runs += 1
+            self.last_duration = duration
+
+    def record_overlap(self) -> None:
+        with self.__lock:
+            self.overlaps += 1
+
+    def record_misfire(self) -> None:
+        with self.__lock:
+            self.misfires += 1
+
+    def record_lateness(self, lateness: float) -> None:
+        with self.__lock:
+            self.last_lateness = lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self.__lock:
+            return {k: v for k, v in self.__dict__.items()
+                    if not k.startswith('_')}
+
+    def __repr__(self) -> str:
+        return '%s(%s)' % (self.__class__.__name__, self.as_dict())
+
+
+class ScheduleRunner(object):
+    """Run scheduled jobs on worker pool and track their statistics."""
+
+    def __init__(self, executor: Optional[Executor] = None) -> None:
+        """Initializer.
+
+        :param executor: Optional worker pool to run jobs. When None, jobs run
+            on the scheduler thread.
+        :return: None
+        """
+        self.executor = executor
+        self.scheduler = None  # type: BaseScheduler
+        self.__stats = {}  # type: Dict[str, JobStats]
+        self.__lock = threading.Lock()
+
+    @property
+    def stats(self) -> Dict[str, JobStats]:
+        """Return statistics keyed by job ID."""
+        return dict(self.__stats)
+
+    def wrap(self,
+             job_id: str,
+             job_function: Callable[..., None],
+             max_instances: int = 1) -> Callable[..., None]:
+        """Wrap job function so it is submitted to worker pool.
+
+        :param job_id: ID of the scheduled job.
+        :param job_function: Function to be run.
+        :param max_instances: Maximum number of concurrently running
+            instances of the job. Runs beyond this are skipped.
+        :return: Wrapped function to be added to scheduler.
+        """
+        with self.__lock:
+            stats = self.__stats.setdefault(job_id, JobStats())
+        running = threading.BoundedSemaphore(max_instances)
+
+        def run(submitted: float) -> None:
+            started = time.time()
+            stats.record_start(started - submitted)
+            failed = False
+            try:
+                job_function()
+            except Exception as e:
+                failed = True
+                logging.error('Error on scheduled job %s. %s', job_id, e)
+            finally:
+                stats.record_end(time.time() - started, failed)
+                running.release()
+
+        @wraps(job_function)
+        def wrapper() -> None:
+            if not running.acquire(blocking=False):
+                stats.record_overlap()
+                logging.warning('Skip %s. %d instances are still running.',
+                                job_id,
+                                max_instances)
+                return
+
+            submitted = time.time()
+            if self.executor is None:
+                run(submitted)
+                return
+
+            try:
+                self.executor.submit(run, submitted)
+            except RuntimeError as e:
+                # Worker pool is shut down
+                running.release()
+                logging.error('Failed to submit %s. %s', job_id, e)
+
+        return wrapper
+
+    def listen(self, scheduler: BaseScheduler) -> None:
+        """Start tracking misfires and lateness on given scheduler.
+
+        :param scheduler: Scheduler jobs are added to.
+        :return: None
+        """
+        self.scheduler = scheduler
+        scheduler.add_listener(self.on_event,
+                               EVENT_JOB_EXECUTED | EVENT_JOB_ERROR |
+                               EVENT_JOB_MISSED)
+
+    def stop(self) -> None:
+        """Stop tracking and log statistics."""
+        if self.scheduler:
+            self.scheduler.remove_listener(self.on_event)
+            self.scheduler = None
+
+        for job_id, stats in sorted(self.stats.items()):
+            logging.info('Schedule stats of %s: %s', job_id, stats.as_dict())
+
+    def on_event(self, event) -> None:
+        stats = self.__stats.get(event.job_id, None)
+        if stats is None:
+            # Job of other bot on shared scheduler
+            return
+
+        if event.code == EVENT_JOB_MISSED:
+            stats.record_misfire()
+            logging.warning('Scheduled job %s missed its run time %s.',
+                            event.job_id,
+                            event.scheduled_run_time)
+            return
+
+        stats.record_lateness(max(0.0, time.time() -
+                                  event.scheduled_run_time.timestamp()))
@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+"""Provide mechanism to spread message handling over worker processes.
+
+The process that owns the connection to chat service decodes each event and
+routes the user input to one of worker processes. Worker processes load
+plugins and run Base.respond() on their own cores, and results are sent back
+to the owner process to be sent to the chat service.
+
+Inputs are routed by consistent hash of channel ID, so inputs in one channel
+always go to the same worker and are handled in the received order. UserContext
+of an ongoing conversation is kept by the owner process and sent along with
+each input, so the conversation continues in whichever channel the user
+speaks next. Functions given to InputOption must be picklable, i.e. defined at
+module level, to be sent to worker processes.
+
+Worker processes are forked from a spawner process that is forked before the
+owner process starts any thread. Forking the owner process itself while its
+threads may hold locks could leave the copied locks held forever, so workers
+replacing exited ones are also forked by the spawner.
+"""
+import bisect
+import hashlib
+import itertools
+import logging
+import multiprocessing  # type: ignore
+import os
+import pickle
+import signal
+import sys
+import threading  # type: ignore
+from concurrent.futures import Future  # type: ignore
+from multiprocessing import connection, reduction  # type: ignore
+from typing import Iterable, Any
+
+from sarah.exceptions import SarahException
+from sarah.thread import ThreadExecutor
+from sarah.watcher import ModuleWatcher
+
+try:
+    from multiprocessing.connection import Connection  # type: ignore
+    from typing import Dict, List, Optional, Set, Tuple
+
+    # Work-around to avoid pyflakes warning "imported but unused" regarding
+    # mypy's comment-styled type hinting
+    # http://www.laurivan.com/make-pyflakespylint-ignore-unused-imports/
+    # http://stackoverflow.com/questions/5033727/how-do-i-get-pyflakes-to-ignore-a-statement/12121404#12121404
+    assert Dict
+    assert List
+    assert Optional
+    assert Set
+    assert Tuple
+    assert Connection
+except AssertionError:
+    pass
+
+
+class HashRing(object):
+    """Consistent hash ring to map keys to nodes."""
+
+    def __init__(self, nodes: Iterable[Any], replicas: int = 100) -> None:
+        """Initializer.
+
+        :param nodes: Nodes to distribute keys to.
+        :param replicas: Number of virtual nodes per node. More replicas
+            distribute keys more evenly.
+        :return: None
+        """
+        ring = sorted((self.hash('%s-%d' % (node, i)), node)
+                      for node in nodes for i in range(replicas))
+        self.__hashes = [h for h, _ in ring]
+        self.__nodes = [node for _, node in ring]
+
+    @staticmethod
+    def hash(key: str) -> int:
+        """Return stable hash value of given key.
+
+        Built-in hash() is randomized per process, so it can't be used here.
+        """
+        return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:16], 16)
+
+    def get(self, key: str) -> Any:
+        """Return the node for given key.
+
+        :param key: Key such as channel ID.
+        :return: Node.
+        """
+        idx = bisect.bisect(self.__hashes, self.hash(key))
+        return self.__nodes[idx % len(self.__nodes)]
+
+
+def run_shard(bot, requests, results) -> None:
+    """Handle user inputs in worker process.
+
+    :param bot: Bot instance copied from the owner process.
+    :param requests: Connection to receive inputs from the owner process.
+    :param results: Connection to send results to the owner process.
+    :return: None
+    """
+    if not bot.plugins_loaded:
+        bot.load_plugins()
+
+    if bot.plugin_watch_interval:
+        # Owner process only reloads its own copy of plugins
+        ModuleWatcher(bot.plugin_config.keys(),
+                      bot.reload_plugins,
+                      bot.plugin_watch_interval).start()
+
+    while True:
+        try:
+            request = requests.recv()
+        except EOFError:
+            # Owner process closed the connection or exited
+            return
+
+        request_id, user_key, user_input, user_context = request
+        bot.user_context_map.clear()
+        if user_context:
+            bot.user_context_map[user_key] = user_context
+
+        try:
+            ret = bot.respond(user_key, user_input)
+            new_context = bot.user_context_map.get(user_key, None)
+            # Pickle here so unpicklable response is reported as an error
+            # instead of breaking the connection.
+            ret = pickle.dumps((ret,
+                                new_context is not user_context,
+                                new_context))
+            results.send((request_id, ret, None))
+        except Exception as e:
+            results.send((request_id, None, str(e)))
+
+
+def run_spawner(bot, control) -> None:
+    """Fork worker processes on request of the owner process.
+
+    For each shard index received, two file descriptors follow: one to
+    receive inputs and one to send results. Start and exit of worker
+    processes are reported back as ("started", shard, pid) and
+    ("exited", shard, exit_code).
+
+    :param bot: Bot instance copied from the owner process.
+    :param control: Connection to the owner process.
+    :return: None
+    """
+    # Interruption is handled by the owner process, which stops this and
+    # workers in turn.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    children = {}  # type: Dict[int, int]
+    while True:
+        if control.poll(0.1):
+            try:
+                shard = control.recv()
+            except EOFError:
+                return
+            if shard is None:
+                return
+
+            requests = connection.Connection(reduction.recv_handle(control))
+            results = connection.Connection(reduction.recv_handle(control))
+            pid = os.fork()
+            if pid == 0:
+                control.close()
+                code = 0
+                try:
+                    run_shard(bot, requests, results)
+                except BaseException as e:
+                    logging.error('Error on shard process %d. %s', shard, e)
+                    code = 1
+                finally:
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    os._exit(code)
+
+            requests.close()
+            results.close()
+            children[pid] = shard
+            control.send(('started', shard, pid))
+
+        for pid, shard in list(children.items()):
+            exited, status = os.waitpid(pid, os.WNOHANG)
+            if not exited:
+                continue
+
+            del children[pid]
+            code = os.WEXITSTATUS(status) if os.WIFEXITED(status) \
+                else -os.WTERMSIG(status)
+            control.send(('exited', shard, code))
+
+
+class ShardRouter(object):
+    """Route user inputs to worker processes and receive results."""
+
+    def __init__(self, bot, shards: int) -> None:
+        """Initializer.
+
+        :param bot: Bot instance to be copied to worker processes.
+        :param shards: Number of worker processes.
+        :return: None
+        """
+        self.bot = bot
+        self.shards = shards
+        self.ring = HashRing(range(shards))
+        self.pids = [None] * shards  # type: List[Optional[int]]
+        self.restart_count = 0
+        self.__context = multiprocessing.get_context('fork')
+        self.__spawner = None  # type: multiprocessing.Process
+        self.__control = None  # type: Connection
+        # Each worker has its own connections, so a worker that dies while
+        # reading or writing can't block others.
+        self.__requests = [None] * shards  # type: List[Connection]
+        self.__results = [None] * shards  # type: List[Connection]
+        # Sending may block while worker is busy, so it is done by a thread
+        # per worker in the received order.
+        self.__senders = []  # type: List[ThreadExecutor]
+        self.__running = set()  # type: Set[int]
+        # {request_id: (shard, user_key, future), ...}
+        self.__futures = {}  # type: Dict[int, Tuple[int, str, Future]]
+        self.__lock = threading.Lock()
+        self.__ids = itertools.count(1)
+        self.__collector = None  # type: threading.Thread
+        self.__stopping = False
+
+    def start(self) -> None:
+        """Start worker processes and result collecting thread.
+
+        The spawner process is forked before any thread is started here.
+        """
+        control, spawner_control = self.__context.Pipe()
+        self.__spawner = self.__context.Process(target=run_spawner,
+                                                args=(self.bot,
+                                                      spawner_control),
+                                                daemon=True)
+        self.__spawner.start()
+        spawner_control.close()
+        self.__control = control
+
+        self.__senders = [ThreadExecutor() for _ in range(self.shards)]
+        for shard in range(self.shards):
+            self.__requests[shard], self.__results[shard] = self.spawn(shard)
+            self.__running.add(shard)
+
+        self.__collector = threading.Thread(target=self.collect, daemon=True)
+        self.__collector.start()
+        logging.info('Started %d shard processes', self.shards)
+
+    def spawn(self, shard: int) -> Tuple[Connection, Connection]:
+        """Let the spawner start worker process for given shard.
+
+        :param shard: Index of the shard.
+        :return: Connections to send inputs and receive results.
+        """
+        requests_reader, requests_writer = self.__context.Pipe(duplex=False)
+        results_reader, results_writer = self.__context.Pipe(duplex=False)
+        self.__control.send(shard)
+        for worker_end in (requests_reader, results_writer):
+            reduction.send_handle(self.__control,
+                                  worker_end.fileno(),
+                                  self.__spawner.pid)
+            # Only the worker holds these, so each side sees EOF when the
+            # other is gone.
+            worker_end.close()
+
+        return requests_writer, results_reader
+
+    def submit(self, channel: str, user_key: str, user_input: str) -> Future:
+        """Route user input to the worker responsible for given channel.
+
+        :param channel: Channel or room ID to route by.
+        :param user_key: Stringified unique user key.
+        :param user_input: User input text.
+        :return: Future instance that represents the response.
+        """
+        future = Future()
+        request_id = next(self.__ids)
+        shard = self.ring.get(channel)
+        user_context = self.bot.user_context_map.get(user_key, None)
+        with self.__lock:
+            # Submit while holding the lock so the connection is not replaced
+            # by restart() in between.
+            self.__futures[request_id] = (shard, user_key, future)
+            self.__senders[shard].submit(
+                self.send,
+                self.__requests[shard],
+                request_id,
+                (request_id, user_key, user_input, user_context))
+        return future
+
+    def send(self, requests, request_id: int, request: Tuple) -> None:
+        """Send request to worker and fail its future if impossible.
+
+        :param requests: Connection to the worker.
+        :param request_id: ID of the request.
+        :param request: Request to be sent.
+        :return: None
+        """
+        try:
+            requests.send(request)
+        except Exception as e:
+            # Unpicklable UserContext, or the worker is gone
+            with self.__lock:
+                _, _, future = self.__futures.pop(request_id,
+                                                  (None, None, None))
+            if future is not None:
+                future.set_exception(SarahShardException(
+                    'Failed to send input to shard process. %s' % e))
+
+    def collect(self) -> None:
+        """Receive results from worker processes and resolve futures.
+
+        Worker processes that exited are restarted.
+        """
+        while not self.__stopping or self.__running:
+            readers = {r: shard for shard, r in enumerate(self.__results)
+                       if r is not None}
+            for ready in connection.wait(list(readers) + [self.__control]):
+                if ready in readers:
+                    self.receive(readers[ready])
+                elif not self.notify():
+                    return
+
+    def notify(self) -> bool:
+        """Receive one notification from the spawner.
+
+        :return: False if the spawner is gone.
+        """
+        try:
+            event, shard, value = self.__control.recv()
+        except (EOFError, OSError):
+            if not self.__stopping:
+                logging.error('Shard spawner exited. Exited shard processes '
+                              'are no longer restarted.')
+            return False
+
+        if event == 'started':
+            self.pids[shard] = value
+        elif event == 'exited':
+            self.restart(shard, value)
+        return True
+
+    def receive(self, shard: int) -> None:
+        """Receive one result from given shard and resolve its future.
+
+        :param shard: Index of the shard.
+        :return: None
+        """
+        try:
+            request_id, ret, error = self.__results[shard].recv()
+        except (EOFError, OSError):
+            # Worker is gone. The spawner tells the rest.
+            self.__results[shard].close()
+            self.__results[shard] = None
+            return
+
+        with self.__lock:
+            _, user_key, future = self.__futures.pop(request_id,
+                                                     (None, None, None))
+        if future is None:
+            return
+
+        if error:
+            future.set_exception(SarahShardException(error))
+            return
+
+        ret, context_changed, user_context = pickle.loads(ret)
+        if context_changed:
+            if user_context:
+                self.bot.user_context_map[user_key] = user_context
+            else:
+                self.bot.user_context_map.pop(user_key, None)
+        future.set_result(ret)
+
+    def restart(self, shard: int, exit_code: int) -> None:
+        """Fail inputs routed to given shard and start a new process.
+
+        Inputs not yet read by the exited process are discarded with its
+        connection, since their futures are already failed.
+
+        :param shard: Index of the shard.
+        :param exit_code: Exit code of the exited process.
+        :return: None
+        """
+        # Results sent right before exit are still valid
+        while self.__results[shard] is not None \
+                and self.__results[shard].poll():
+            self.receive(shard)
+        if self.__results[shard] is not None:
+            self.__results[shard].close()
+            self.__results[shard] = None
+        self.pids[shard] = None
+
+        if not self.__stopping:
+            logging.warning('Shard process %d exited with code %s. '
+                            'Restarting.',
+                            shard,
+                            exit_code)
+            requests, self.__results[shard] = self.spawn(shard)
+            self.restart_count += 1
+        else:
+            requests = None
+
+        with self.__lock:
+            failed = [request_id
+                      for request_id, (s, _, _) in self.__futures.items()
+                      if s == shard]
+            futures = [self.__futures.pop(request_id)[2]
+                       for request_id in failed]
+            if self.__requests[shard] is not None:
+                # Closed after pending sends, which fail or are never read
+                self.__senders[shard].submit(self.__requests[shard].close)
+            self.__requests[shard] = requests
+            if requests is None:
+                self.__running.discard(shard)
+
+        for future in futures:
+            future.set_exception(SarahShardException(
+                'Shard process %d exited with code %s' % (shard, exit_code)))
+
+    def stop(self) -> None:
+        """Stop worker processes and result collecting thread."""
+        self.__stopping = True
+        with self.__lock:
+            for shard, requests in enumerate(self.__requests):
+                if requests is not None:
+                    # Workers exit when pending inputs are read
+                    self.__senders[shard].submit(requests.close)
+
+        # Collector returns when all workers exited
+        if self.__collector:
+            self.__collector.join(timeout=5)
+        for pid in self.pids:
+            if pid is not None:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+        if self.__collector:
+            self.__collector.join(timeout=5)
+
+        for sender in self.__senders:
+            sender.shutdown(wait=False)
+        if self.__spawner:
+            try:
+                self.__control.send(None)
+            except OSError:
+                pass
+            self.__spawner.join(timeout=5)
+            if self.__spawner.is_alive():
+                self.__spawner.terminate()
+
+        with self.__lock:
+            futures = [f for _, _, f in self.__futures.values()]
+            self.__futures.clear()
+        for future in futures:
+            future.cancel()
+
+
+class SarahShardException(SarahException):
+    pass
@@ -1,20 +1,29 @@
 # -*- coding: utf-8 -*-
 # https://api.slack.com/rtm
 """Provide Slack interaction."""
-import json
 import logging
-from concurrent.futures import Future  # type: ignore
+import re
+from collections import deque
+import threading  # type: ignore
+from concurrent.futures import Future, ThreadPoolExecutor  # type: ignore
+from functools import partial
 import requests
 import time
-from typing import Optional, Dict, Callable, Iterable
+from requests.adapters import HTTPAdapter
+from typing import Optional, Dict, Callable, Iterable, Tuple, List
 from websocket import WebSocketApp  # type: ignore
-from sarah import ValueObject
+from sarah import ValueObject, json_codec
+from sarah.value_object import memoize
+from sarah.backoff import ExponentialBackoff
 from sarah.bot import Base, concurrent
+from sarah.bot.ack_tracker import AckTracker, LatencyHistogram
+from sarah.bot.dedup import Deduplicator
 from sarah.bot.values import ScheduledCommand, RichMessage, PluginConfig
 from sarah.exceptions import SarahException
+from sarah.thread import KeyedExecutor
 
 try:
-    from typing import Any, Union
+    from typing import Any, Union, Deque
 
     # Work-around to avoid pyflakes warning "imported but unused" regarding
     # mypy's comment-styled type hinting
@@ -22,6 +31,7 @@ try:
     # http://stackoverflow.com/questions/5033727/how-do-i-get-pyflakes-to-ignore-a-statement/12121404#12121404
     assert Any
     assert Union
+    assert Deque
 except AssertionError:
     pass
 
@@ -31,15 +41,24 @@ class SlackClient(object):
 
     def __init__(self,
                  token: str,
-                 base_url: str = 'https://slack.com/api/') -> None:
+                 base_url: str = 'https://slack.com/api/',
+                 pool_size: int = 10) -> None:
         """Initializer.
 
+        HTTP connections are kept in a pool and reused, so concurrent requests
+        do not establish new connection for every request.
+
         :param token: Access token to be passed to Slack endpoint.
         :param base_url: Optional Slack API base url.
+        :param pool_size: Maximum number of connections kept in the pool.
         :return: None.
         """
         self.base_url = base_url
         self.token = token
+        self.session = requests.Session()
+        self.session.mount('https://',
+                           HTTPAdapter(pool_connections=1,
+                                       pool_maxsize=pool_size))
 
     def generate_endpoint(self, method: str) -> str:
         """Provide Slack endpoint with the given API method.
@@ -53,13 +72,14 @@ class SlackClient(object):
         return self.base_url + method if self.base_url.endswith('/') else \
             self.base_url + '/' + method
 
-    def get(self, method) -> Dict:
+    def get(self, method, params=None) -> Dict:
         """Wrapper method to make HTTP GET request with given Slack API method.
 
         :param method: Slack API method.
+        :param params: Sending query parameter.
         :return: Dictionary that contains response.
         """
-        return self.request('GET', method)
+        return self.request('GET', method, params)
 
     def post(self, method, params=None, data=None) -> Dict:
         """Wrapper method to make HTTP POST request with given Slack API method.
@@ -93,23 +113,23 @@ class SlackClient(object):
             params['token'] = self.token
 
         try:
-            response = requests.request(http_method,
-                                        endpoint,
-                                        params=params,
-                                        data=data)
+            response = self.session.request(http_method,
+                                            endpoint,
+                                            params=params,
+                                            data=data)
         except Exception as e:
             logging.error(e)
             raise e
 
-        # Avoid "can't use a string pattern on a bytes-like object"
-        # j = json.loads(response.content)
-        return json.loads(response.content.decode())
+        # Decode bytes as they are without copying to str
+        return json_codec.loads(response.content)
 
 
 class AttachmentField(ValueObject):
     def __init__(self, title: str, value: str, short: bool = None) -> None:
         pass
 
+    @memoize
     def to_dict(self):
         # Exclude empty fields
         params = dict()
@@ -138,6 +158,7 @@ class MessageAttachment(ValueObject):
                  color: str = None) -> None:
         pass
 
+    @memoize
     def to_dict(self):
         # Exclude empty fields
         params = dict()
@@ -170,6 +191,7 @@ class SlackMessage(RichMessage):
     def __str__(self) -> str:
         return self['text']
 
+    @memoize
     def to_dict(self):
         # Exclude empty fields
         params = dict()
@@ -182,38 +204,390 @@ class SlackMessage(RichMessage):
         return params
 
     def to_request_params(self) -> Dict:
-        params = self.to_dict()
+        # Copy so callers can add channel without serializing attachments
+        # again for every channel and every reply.
+        return dict(self.request_params())
+
+    @memoize
+    def request_params(self) -> Dict:
+        params = dict(self.to_dict())
 
         if 'attachments' in params:
-            params['attachments'] = json.dumps(
+            params['attachments'] = json_codec.dumps(
                 [a.to_dict() for a in params['attachments']])
 
         return params
 
 
-EventTypeMap = Dict[str, Dict[str, Union[Callable[..., Optional[Any]], str]]]
+class SlackDirectory(object):
+    """Keep users and channels of the team in memory.
+
+    The directory is loaded from rtm.start response and kept current by RTM
+    events, so users and channels are looked up by ID or name without web
+    API request. It is fetched again when it is older than given TTL, or when
+    a lookup misses and the last fetch is older than min_refresh_interval.
+    """
+
+    KINDS = ('users', 'channels')
+
+    def __init__(self,
+                 fetch: Callable[[], Dict] = None,
+                 ttl: float = 3600.0,
+                 min_refresh_interval: float = 60.0) -> None:
+        """Initializer.
+
+        :param fetch: Optional function that returns dictionary with the same
+            "users" and "channels" properties as rtm.start response.
+        :param ttl: Seconds until loaded directory is fetched again.
+        :param min_refresh_interval: Minimum seconds between fetches on
+            lookup miss.
+        :return: None
+        """
+        self.fetch = fetch
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.updated_at = 0.0
+
+        # {kind: {id: entry, ...}, ...} and {kind: {name: id, ...}, ...}
+        self.__entries = {kind: {} for kind in self.KINDS}  # type: Dict
+        self.__ids = {kind: {} for kind in self.KINDS}  # type: Dict
+        self.__lock = threading.RLock()
+        self.__fetch_lock = threading.Lock()
+
+    def load(self, payload: Dict) -> None:
+        """Replace the whole directory with given rtm.start response.
+
+        :param payload: Dictionary with "users", "channels" and optionally
+            "groups" properties.
+        :return: None
+        """
+        sources = {'users': payload.get('users', []),
+                   'channels': payload.get('channels', []) +
+                   payload.get('groups', [])}
+        entries = {}  # type: Dict
+        ids = {}  # type: Dict
+        for kind in self.KINDS:
+            entries[kind] = {e['id']: e for e in sources[kind]}
+            ids[kind] = {e['name']: e['id'] for e in sources[kind]
+                         if 'name' in e}
+
+        with self.__lock:
+            self.__entries = entries
+            self.__ids = ids
+            self.updated_at = time.time()
+
+    def refresh(self) -> bool:
+        """Fetch the whole directory again.
+
+        Fetching is done without holding the lock, so lookups and RTM events
+        are served with the current directory meanwhile. When another thread
+        is already fetching, this returns without fetching.
+
+        :return: True if fetched.
+        """
+        if self.fetch is None or not self.__fetch_lock.acquire(False):
+            return False
+
+        try:
+            payload = self.fetch()
+        except Exception as e:
+            with self.__lock:
+                # Try again after min_refresh_interval
+                self.updated_at = time.time() - self.ttl + \
+                    self.min_refresh_interval
+            logging.error('Failed to fetch Slack directory. %s', e)
+            return False
+        finally:
+            self.__fetch_lock.release()
+
+        self.load(payload)
+        return True
+
+    def user(self, key: str) -> Optional[Dict]:
+        """Return user with given ID or name.
+
+        :param key: User ID, name or name prefixed with @.
+        :return: Dictionary that represents the user, or None.
+        """
+        return self.lookup('users', key[1:] if key.startswith('@') else key)
+
+    def channel(self, key: str) -> Optional[Dict]:
+        """Return channel or private group with given ID or name.
+
+        :param key: Channel ID, name or name prefixed with #.
+        :return: Dictionary that represents the channel, or None.
+        """
+        return self.lookup('channels',
+                           key[1:] if key.startswith('#') else key)
+
+    def lookup(self, kind: str, key: str) -> Optional[Dict]:
+        if not self.updated_at:
+            # Not loaded yet. Loaded on connection.
+            return self.get(kind, key)
+
+        age = time.time() - self.updated_at
+        if age > self.ttl:
+            self.refresh()
+            return self.get(kind, key)
+
+        entry = self.get(kind, key)
+        if entry is None and age > self.min_refresh_interval \
+                and self.refresh():
+            entry = self.get(kind, key)
+
+        return entry
+
+    def get(self, kind: str, key: str) -> Optional[Dict]:
+        entries = self.__entries[kind]
+        entry = entries.get(key, None)
+        if entry is None:
+            entry = entries.get(self.__ids[kind].get(key, None), None)
+
+        return entry
+
+    def put(self, kind: str, entry: Dict) -> None:
+        """Add given entry or merge it to existing one.
+
+        :param kind: "users" or "channels".
+        :param entry: Dictionary with id property.
+        :return: None
+        """
+        with self.__lock:
+            entries = self.__entries[kind]
+            ids = self.__ids[kind]
+            old = entries.get(entry['id'], {})
+            if old.get('name', None) in ids:
+                del ids[old['name']]
+
+            merged = dict(old, **entry)
+            entries[merged['id']] = merged
+            if 'name' in merged:
+                ids[merged['name']] = merged['id']
+
+    def remove(self, kind: str, entry_id: str) -> None:
+        with self.__lock:
+            entry = self.__entries[kind].pop(entry_id, {})
+            self.__ids[kind].pop(entry.get('name', None), None)
+
+    def apply(self, event: Dict) -> None:
+        """Update directory with given RTM event.
+
+        :param event: Dictionary that represents the event.
+        :return: None
+        """
+        event_type = event['type']
+        if event_type in ('team_join', 'user_change'):
+            self.put('users', event['user'])
+        elif event_type in ('channel_created', 'channel_rename',
+                            'group_joined', 'group_rename'):
+            self.put('channels', event['channel'])
+        elif event_type in ('channel_deleted', 'group_left'):
+            self.remove('channels', event['channel'])
+        elif event_type in ('channel_archive', 'group_archive'):
+            self.put('channels', {'id': event['channel'],
+                                  'is_archived': True})
+        elif event_type in ('channel_unarchive', 'group_unarchive'):
+            self.put('channels', {'id': event['channel'],
+                                  'is_archived': False})
+
+
+# {event type: (name of handler method or None to ignore, description), ...}
+EventTypes = Dict[str, Tuple[Optional[str], str]]
 
 
 class Slack(Base):
     """Provide bot for Slack."""
 
+    # Subclass can handle more event types by extending this.
+    # e.g. event_types = dict(Slack.event_types,
+    #                         reaction_added=('handle_reaction', "..."))
+    event_types = {
+        'hello': ('handle_hello',
+                  "The client has successfully connected to the server"),
+        'pong': ('handle_pong',
+                 "The server replied to ping"),
+        'message': ('handle_message',
+                    "A message was sent to a channel"),
+        'user_typing': (None,
+                        "A channel member is typing a message"),
+        'presence_change': (None,
+                            "A team member's presence changed"),
+        'team_migration_started': ('handle_team_migration',
+                                   "The team is being migrated between "
+                                   "servers"),
+        'team_join': ('handle_directory_event',
+                      "A new team member has joined"),
+        'user_change': ('handle_directory_event',
+                        "A team member's data has changed"),
+        'channel_created': ('handle_directory_event',
+                            "A channel was created"),
+        'channel_rename': ('handle_directory_event',
+                           "A channel was renamed"),
+        'channel_deleted': ('handle_directory_event',
+                            "A channel was deleted"),
+        'channel_archive': ('handle_directory_event',
+                            "A channel was archived"),
+        'channel_unarchive': ('handle_directory_event',
+                              "A channel was unarchived"),
+        'group_joined': ('handle_directory_event',
+                         "You joined a private channel"),
+        'group_rename': ('handle_directory_event',
+                         "A private channel was renamed"),
+        'group_left': ('handle_directory_event',
+                       "You left a private channel"),
+        'group_archive': ('handle_directory_event',
+                          "A private channel was archived"),
+        'group_unarchive': ('handle_directory_event',
+                            "A private channel was unarchived")
+    }  # type: EventTypes
+
+    # Finds type property without decoding the whole event
+    event_type_pattern = re.compile(r'"type"\s*:\s*"([^"\\]*)"')
+
+    # Finds top-level reply_to property of acknowledgement
+    reply_to_pattern = re.compile(r'"reply_to"\s*:\s*\d')
+
+    # Find properties of message event to drop messages of this bot, other
+    # bots and ignored subtypes without decoding the whole event
+    subtype_pattern = re.compile(r'"subtype"\s*:\s*"([^"\\]*)"')
+    bot_id_pattern = re.compile(r'"bot_id"\s*:\s*"')
+    user_pattern = re.compile(r'"user"\s*:\s*"([^"\\]*)"')
+
+    # IDs of public and private channels and direct messages. Channel names
+    # are lowercased, so these never collide with them.
+    channel_id_pattern = re.compile(r'^[CGD][A-Z0-9]+$')
+
     def __init__(self,
                  token: str = '',
                  plugins: Iterable[PluginConfig] = None,
-                 max_workers: int = None) -> None:
+                 max_workers: int = None,
+                 plugin_watch_interval: float = None,
+                 help_page_size: int = None,
+                 shards: int = None,
+                 ingest_socket: str = None,
+                 schedule_leader: Dict = None,
+                 broadcast_workers: int = 10,
+                 schedule_jitter: float = 0.0,
+                 schedule_spread: bool = True,
+                 schedule_store: Dict = None,
+                 schedule_workers: int = None,
+                 ack_timeout: float = 10.0,
+                 max_pending_acks: int = 1000,
+                 reconnect_max_delay: float = 120.0,
+                 directory_ttl: float = 3600.0,
+                 post_workers: int = 4,
+                 channel_post_concurrency: int = 1,
+                 dedup_window: float = 300.0,
+                 dedup_size: int = 10000,
+                 ping_interval: float = 30.0,
+                 ping_timeout: float = 10.0,
+                 ignored_subtypes: Iterable[str] = ('bot_message',
+                                                    'message_changed',
+                                                    'message_deleted',
+                                                    'message_replied'),
+                 ignore_bots: bool = True) -> None:
         """Initializer.
 
         :param token: Access token provided by Slack.
         :param plugins: List of plugin modules.
         :param max_workers: Optional number of worker threads.
+        :param plugin_watch_interval: Optional interval in seconds to check
+            plugin modification.
+        :param help_page_size: Optional number of commands per help page.
+        :param shards: Optional number of processes to handle user inputs.
+        :param ingest_socket: Optional path of Unix domain socket to read
+            events from instead of connecting to Slack.
+        :param schedule_leader: Optional leader election setting to run
+            scheduled jobs on only one replica.
+        :param broadcast_workers: Number of threads to post scheduled message
+            to multiple channels concurrently.
+        :param schedule_jitter: Maximum seconds to randomly delay each run of
+            scheduled jobs.
+        :param schedule_spread: Whether to stagger the first runs of interval
+            jobs with the same interval.
+        :param schedule_store: Optional setting of persistent schedule store.
+        :param schedule_workers: Optional number of threads to run scheduled
+            jobs.
+        :param ack_timeout: Seconds to wait for acknowledgement of sent
+            message before posting it again via web API.
+        :param max_pending_acks: Maximum number of sent messages to wait for
+            acknowledgement at a time. This also limits the number of
+            messages kept while disconnected.
+        :param reconnect_max_delay: Upper limit of delay in seconds between
+            reconnection attempts.
+        :param directory_ttl: Seconds until directory of users and channels
+            is fetched again.
+        :param post_workers: Number of threads to post rich message replies
+            via web API. With 0, they are posted on the handler thread.
+        :param channel_post_concurrency: Maximum number of rich message
+            replies posted to one channel at a time. Others wait in order.
+        :param dedup_window: Seconds to remember received messages to ignore
+            the same message delivered again.
+        :param dedup_size: Maximum number of received messages to remember.
+        :param ping_interval: Seconds between pings to keep connection alive
+            and to measure round-trip time. With 0, pings are not sent.
+        :param ping_timeout: Seconds to wait for pong in addition to
+            ping_interval before the connection is considered dead and
+            reconnected. This must be smaller than ping_interval.
+        :param ignored_subtypes: Subtypes of message events to be dropped
+            without responding.
+        :param ignore_bots: Whether to drop messages posted by other bots.
+            Messages of this bot are always dropped.
         :return: None
         """
-        super().__init__(plugins=plugins, max_workers=max_workers)
-
+        if ping_interval and ping_timeout >= ping_interval:
+            raise SarahSlackException(
+                'ping_timeout must be smaller than ping_interval.')
+
+        super().__init__(plugins=plugins,
+                         max_workers=max_workers,
+                         plugin_watch_interval=plugin_watch_interval,
+                         help_page_size=help_page_size,
+                         shards=shards,
+                         ingest_socket=ingest_socket,
+                         schedule_leader=schedule_leader,
+                         broadcast_workers=broadcast_workers,
+                         schedule_jitter=schedule_jitter,
+                         schedule_spread=schedule_spread,
+                         schedule_store=schedule_store,
+                         schedule_workers=schedule_workers)
+
+        self.post_workers = post_workers
         self.client = self.setup_client(token=token)
+        # Threads are not started until the first reply is posted
+        self.post_worker = KeyedExecutor(
+            ThreadPoolExecutor(max_workers=post_workers)
+            if post_workers else None,
+            max_per_key=channel_post_concurrency)
         self.message_id = 0
+        self.message_id_lock = threading.Lock()
+        self.ack_tracker = AckTracker(timeout=ack_timeout,
+                                      max_pending=max_pending_acks,
+                                      on_timeout=self.resend_message)
         self.ws = None  # type: WebSocketApp
         self.connect_attempt_count = 0
+        self.reconnect_backoff = ExponentialBackoff(
+            initial=1.0,
+            maximum=reconnect_max_delay,
+            jitter=0.5)
+        self.closing = threading.Event()
+        self.ignored_subtypes = frozenset(ignored_subtypes)
+        self.ignore_bots = ignore_bots
+        self.user_id = None  # type: str
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.ping_latency = LatencyHistogram()
+        self.last_pong_at = 0.0
+        self.keepalive_thread = None  # type: threading.Thread
+        self.deduplicator = Deduplicator(max_size=dedup_size,
+                                         window=dedup_window)
+        self.directory = SlackDirectory(fetch=self.fetch_directory,
+                                        ttl=directory_ttl)
+
+        # Messages sent while disconnected are kept until next hello event
+        self.connected = False
+        self.outbox = deque(maxlen=max_pending_acks)  # type: Deque
+        self.send_lock = threading.Lock()
 
     def setup_client(self, token: str) -> SlackClient:
         """Setup ClackClient and return its instance.
@@ -221,14 +595,31 @@ class Slack(Base):
         :param token: Slack access token.
         :return: SlackClient instance
         """
-        return SlackClient(token=token)
+        # Either of the workers may be disabled with None or 0
+        workers = (self.broadcast_workers or 0) + (self.post_workers or 0)
+        return SlackClient(token=token, pool_size=max(workers, 10))
 
     def connect(self) -> None:
         """Connect to Slack websocket server and start interaction.
 
+        Connection is re-established whenever it is lost until interrupted or
+        stopped. Delay between attempts grows exponentially up to
+        reconnect_max_delay, and is randomized so multiple bots do not
+        reconnect at the same moment after an outage. Delay is reset on every
+        successful connection.
+
         :return: None
         """
-        while self.connect_attempt_count < 10:
+        self.ack_tracker.start()
+        if self.ping_interval and not self.keepalive_thread:
+            self.keepalive_thread = threading.Thread(target=self.keep_alive,
+                                                     daemon=True)
+            self.keepalive_thread.start()
+
+        while not self.closing.is_set():
+            with self.send_lock:
+                self.connected = False
+
             try:
                 self.connect_attempt_count += 1
                 self.try_connect()
@@ -237,9 +628,14 @@ class Slack(Base):
             except Exception as e:
                 logging.error(e)
 
-            time.sleep(self.connect_attempt_count)
-        else:
-            logging.error("Attempted 10 times, but all failed. Quitting.")
+            if self.closing.is_set():
+                break
+
+            delay = self.reconnect_backoff.next_delay()
+            logging.info('Reconnect in %.1f seconds. attempt: %d',
+                         delay,
+                         self.connect_attempt_count)
+            self.closing.wait(delay)
 
     def try_connect(self) -> None:
         """Try establish connection with Slack websocket server."""
@@ -251,12 +647,101 @@ class Slack(Base):
             raise SarahSlackException(
                 "Slack request error on /rtm.start. %s" % e)
         else:
+            self.directory.load(response)
+            self.user_id = response.get('self', {}).get('id', None)
             self.ws = WebSocketApp(response['url'],
                                    on_message=self.message,
                                    on_error=self.on_error,
                                    on_open=self.on_open,
                                    on_close=self.on_close)
-            self.ws.run_forever()
+            # Websocket level pings detect half-open TCP connection, while
+            # RTM pings in keep_alive() detect unresponsive server.
+            if self.ping_interval:
+                self.ws.run_forever(ping_interval=self.ping_interval,
+                                    ping_timeout=self.ping_timeout)
+            else:
+                self.ws.run_forever()
+
+    def keep_alive(self) -> None:
+        """Send RTM ping every ping_interval until stopped."""
+        while not self.closing.wait(self.ping_interval):
+            try:
+                self.ping()
+            except Exception as e:
+                logging.error('Failed to send ping. %s', e)
+
+    def ping(self) -> None:
+        """Send RTM ping, or close connection when pongs stopped coming.
+
+        https://api.slack.com/rtm#ping_and_pong
+        The pong contains the time property given on ping, so round-trip time
+        is measured on handle_pong().
+
+        :return: None
+        """
+        with self.send_lock:
+            if not self.connected:
+                return
+
+            now = time.time()
+            silence = now - self.last_pong_at
+            if silence <= self.ping_interval + self.ping_timeout:
+                self.ws.send(json_codec.dumps({'type': 'ping',
+                                               'id': self.next_message_id(),
+                                               'time': now}))
+                return
+
+            self.connected = False
+
+        logging.warning('No pong for %.1f seconds. Reconnecting.', silence)
+        # run_forever() returns and connect() starts reconnection
+        self.ws.close()
+
+    def fetch_directory(self) -> Dict:
+        """Fetch users, channels and private groups via web API.
+
+        :return: Dictionary with users, channels and groups properties.
+        """
+        return {'users': self.fetch_list('users.list', 'members'),
+                'channels': self.fetch_list('channels.list', 'channels'),
+                'groups': self.fetch_list('groups.list', 'groups')}
+
+    def fetch_list(self, method: str, key: str) -> List[Dict]:
+        """Fetch all pages of given list method via web API.
+
+        :param method: Slack API method such as users.list.
+        :param key: Property of the response that holds listed entries.
+        :return: Entries of all pages.
+        """
+        entries = []  # type: List[Dict]
+        params = {'limit': 200}
+        while True:
+            response = self.client.get(method, dict(params))
+            if not response.get('ok', False):
+                raise SarahSlackException(
+                    'Failed to fetch %s. %s' % (method,
+                                                response.get('error', None)))
+
+            entries.extend(response.get(key, []))
+            cursor = (response.get('response_metadata', None) or {}) \
+                .get('next_cursor', None)
+            if not cursor:
+                return entries
+            params['cursor'] = cursor
+
+    def resolve_channel_id(self, channel: str) -> str:
+        """Return channel ID for given channel name or ID.
+
+        :param channel: Channel name or ID.
+        :return: Channel ID, or given value as is when not found.
+        """
+        if self.channel_id_pattern.match(channel):
+            # Already an ID. Do not refresh directory for ones not listed
+            # there such as direct messages.
+            return channel
+
+        entry = self.directory.channel(channel)
+        return entry['id'] if entry else channel
 
     def generate_schedule_job(self,
                               command: ScheduledCommand) \
@@ -265,8 +750,10 @@ class Slack(Base):
 
         This creates a function that execute given command and then handle the
         command response. If the response is SlackMessage instance, it make
-        HTTP POST request to Slack web API endpoint. If string is returned,
-        then it submit it to the message sending worker.
+        HTTP POST requests to Slack web API endpoint concurrently. If string
+        is returned, then it submit it to the message sending worker. Results
+        for each channel are reported when all of them complete. Channels can
+        be given by their names.
 
         :param command: ScheduledCommand object that holds job information
         :return: Optional callable object to be scheduled
@@ -281,62 +768,130 @@ class Slack(Base):
         def job_function() -> None:
             ret = command()
             if isinstance(ret, SlackMessage):
-                for channel in channels:
-                    # TODO Error handling
-                    data = {'channel': channel}
-                    data.update(ret.to_request_params())
-                    self.client.post('chat.postMessage', data=data)
+                params = ret.to_request_params()
+                self.fan_out(command.job_id,
+                             channels,
+                             lambda channel: self.post_rich_message(
+                                 self.resolve_channel_id(channel),
+                                 params))
             else:
-                for channel in channels:
-                    self.enqueue_sending_message(self.send_message,
-                                                 channel,
-                                                 str(ret))
+                text = str(ret)
+                self.fan_out(command.job_id,
+                             channels,
+                             lambda channel: self.enqueue_scheduled_message(
+                                 self.send_message,
+                                 self.resolve_channel_id(channel),
+                                 text))
 
         return job_function
 
-    @concurrent
+    def post_rich_message(self, channel: str, params: Dict) -> Dict:
+        """Post rich message to given channel via Slack web API.
+
+        :param channel: Channel ID.
+        :param params: Request parameters of SlackMessage.
+        :return: Dictionary that contains response.
+        """
+        data = {'channel': channel}
+        data.update(params)
+        response = self.client.post('chat.postMessage', data=data)
+        if not response.get('ok', False):
+            raise SarahSlackException(
+                'Failed to post message. %s' % response.get('error', None))
+
+        return response
+
     def message(self, _: WebSocketApp, event: str) -> None:
-        """Receive event from Slack and dispatch it to corresponding method.
+        """Receive event from Slack and pass it to handle_event().
+
+        Events of ignored types, and messages posted by this bot, other bots
+        or of ignored subtypes are dropped here with a cheap lookup of their
+        properties, before decoding whole JSON and before submitting them to
+        worker pool. The lookup is used only to drop events, so an event that
+        is not found to be ignored is fully decoded and checked again.
 
         :param _: WebSocketApp instance. This is not to be used here.
         :param event: JSON string that contains event information.
         :return: None
         """
-        decoded_event = json.loads(event)
+        if self.reply_to_pattern.search(event):
+            # Acknowledgements and pongs are handled right here, so their
+            # latency is not affected by queued events.
+            decoded_event = json_codec.loads(event)
+            if 'ok' in decoded_event and 'reply_to' in decoded_event:
+                self.handle_reply(decoded_event)
+                return None
+            elif decoded_event.get('type', None) == 'pong':
+                self.handle_pong(decoded_event)
+                return None
+
+        match = self.event_type_pattern.search(event)
+        if match:
+            event_type = self.event_types.get(match.group(1), None)
+            if event_type and event_type[0] is None:
+                logging.debug('%s: %s', match.group(1), event_type[1])
+                return None
+
+            if match.group(1) == 'message' and self.is_ignored_message(event):
+                return None
+
+        self.handle_event(event)
+        return None
+
+    def is_ignored_message(self, event: str) -> bool:
+        """Return if given message event is not to be responded.
+
+        The raw JSON string is searched first, so most messages are passed
+        without being decoded here. Since the patterns also match nested
+        properties such as attachments or edited.user, the event is decoded
+        to check its top-level properties only when any of them matches.
+
+        :param event: JSON string of message event.
+        :return: True if the message is posted by this bot, other bots or of
+            ignored subtypes.
+        """
+        subtype = self.subtype_pattern.search(event)
+        candidate = (subtype and subtype.group(1) in self.ignored_subtypes) \
+            or (self.ignore_bots and self.bot_id_pattern.search(event)) \
+            or (self.user_id and
+                any(m.group(1) == self.user_id
+                    for m in self.user_pattern.finditer(event)))
+        if not candidate:
+            return False
+
+        try:
+            content = json_codec.loads(event)
+        except ValueError:
+            # Reported on handle_event()
+            return False
+
+        return self.is_ignored_content(content)
+
+    def is_ignored_content(self, content: Dict) -> bool:
+        """Return if given decoded message is not to be responded.
+
+        :param content: Dictionary that represents message event.
+        :return: True if the message is posted by this bot, other bots or of
+            ignored subtypes.
+        """
+        return content.get('subtype', None) in self.ignored_subtypes \
+            or bool(self.ignore_bots and content.get('bot_id', None)) \
+            or bool(self.user_id and
+                    content.get('user', None) == self.user_id)
+
+    @concurrent
+    def handle_event(self, event: str) -> None:
+        """Decode event and dispatch it to corresponding method.
+
+        :param event: JSON string that contains event information.
+        :return: None
+        """
+        decoded_event = json_codec.loads(event)
 
         if 'ok' in decoded_event and 'reply_to' in decoded_event:
-            # https://api.slack.com/rtm#sending_messages
-            # Replies to messages sent by clients will always contain two
-            # properties: a boolean ok indicating whether they succeeded and
-            # an integer reply_to indicating which message they are in response
-            # to.
-            if decoded_event['ok'] is False:
-                # Something went wrong with the previous message
-                logging.error(
-                    'Something went wrong with the previous message. '
-                    'message_id: %s. error: %s' % (
-                        decoded_event['reply_to'],
-                        decoded_event.get('error', "")))
+            self.handle_reply(decoded_event)
             return None
 
-        # TODO organize
-        type_map = {
-            'hello': {
-                'method': self.handle_hello,
-                'description': "The client has successfully connected to the "
-                               "server"},
-            'message': {
-                'method': self.handle_message,
-                'description': "A message was sent to a channel"},
-            'user_typing': {
-                'description': "A channel member is typing a message"},
-            'presence_change': {
-                'description': "A team member's presence changed"},
-            'team_migration_started': {
-                'method': self.handle_team_migration,
-                'description': "The team is being migrated between servers"}
-        }  # type: EventTypeMap
-
         if 'type' not in decoded_event:
             # https://api.slack.com/rtm#events
             # Every event has a type property which describes the type of
@@ -345,23 +900,58 @@ class Slack(Base):
                           event)
             return None
 
-        if decoded_event['type'] not in type_map:
-            logging.error('Unknown type value is given. %s' % event)
+        event_type = self.event_types.get(decoded_event['type'], None)
+        if event_type is None:
+            logging.error('Unknown type value is given. %s', event)
             return None
 
-        logging.debug(
-            '%s: %s. %s' % (
-                decoded_event['type'],
-                type_map[decoded_event['type']].get('description',
-                                                    'NO DESCRIPTION'),
-                event))
+        method_name, description = event_type
+        logging.debug('%s: %s. %s', decoded_event['type'], description, event)
 
-        method = type_map[decoded_event['type']].get('method', None)
-        if method:
-            method(decoded_event)
+        if method_name:
+            getattr(self, method_name)(decoded_event)
 
         return None
 
+    def handle_reply(self, reply: Dict) -> None:
+        """Handle acknowledgement of sent message.
+
+        https://api.slack.com/rtm#sending_messages
+        Replies to messages sent by clients will always contain two
+        properties: a boolean ok indicating whether they succeeded and an
+        integer reply_to indicating which message they are in response to.
+
+        :param reply: Dictionary that represent acknowledgement.
+        :return: None
+        """
+        ok = reply['ok'] is not False
+        content = self.ack_tracker.ack(reply['reply_to'], ok)
+        if not ok:
+            # Something went wrong with the previous message
+            logging.error(
+                'Something went wrong with the previous message. '
+                'message_id: %s. error: %s. message: %s' % (
+                    reply['reply_to'],
+                    reply.get('error', ""),
+                    content))
+
+    def resend_message(self, message_id: int, params: Dict) -> None:
+        """Post message that is not acknowledged in time via web API.
+
+        The message might have been delivered while its acknowledgement was
+        lost, so this may rarely post the same message twice.
+
+        :param message_id: ID the message was sent with.
+        :param params: Content sent via websocket connection.
+        :return: None
+        """
+        if params.get('type', None) != 'message':
+            return
+
+        logging.info('Post message %s via web API.', message_id)
+        self.post_rich_message(params['channel'], {'text': params['text'],
+                                                   'as_user': True})
+
     def handle_hello(self, _: Dict) -> None:
         """Handle hello event.
 
@@ -371,8 +961,40 @@ class Slack(Base):
         :return: None
         """
         self.connect_attempt_count = 0  # Reset retry count
+        self.reconnect_backoff.reset()
+        self.last_pong_at = time.time()
         logging.info('Successfully connected to the server.')
 
+        with self.send_lock:
+            self.connected = True
+            if self.outbox:
+                logging.info('Send %d messages kept while disconnected.',
+                             len(self.outbox))
+
+            while self.outbox:
+                channel, text, message_type = self.outbox[0]
+                try:
+                    self.transmit(channel, text, message_type)
+                except Exception as e:
+                    logging.error('Failed to send kept message. %s', e)
+                    self.connected = False
+                    break
+
+                self.outbox.popleft()
+
+    def handle_pong(self, event: Dict) -> None:
+        """Handle pong event and record round-trip time.
+
+        :param event: Dictionary that represent event.
+        :return: None
+        """
+        now = time.time()
+        self.last_pong_at = now
+        sent = event.get('time', None)
+        if isinstance(sent, (int, float)):
+            self.ping_latency.observe(max(0.0, now - sent))
+            logging.debug('Round-trip time: %.3f sec.', now - sent)
+
     def handle_message(self, content: Dict) -> Optional[Future]:
         """Handle message event.
 
@@ -389,6 +1011,10 @@ class Slack(Base):
         #     "ts":"1438477080.000004",
         #     "team":"T06TXXXXX"
         # }
+        if self.is_ignored_content(content):
+            logging.debug('Ignore message. %s', content)
+            return None
+
         required_props = ('type', 'channel', 'user', 'text', 'ts')
         missing_props = [p for p in required_props if p not in content]
 
@@ -398,18 +1024,59 @@ class Slack(Base):
                 content))
             return None
 
-        ret = self.respond(content['user'], content['text'])
-        if isinstance(ret, SlackMessage):
-            # TODO Error handling
-            data = {'channel': content["channel"]}
-            data.update(ret.to_request_params())
-            self.client.post('chat.postMessage', data=data)
+        if self.deduplicator.seen((content['channel'], content['ts'])):
+            # Same message is delivered again after reconnection or retry
+            logging.info('Ignore duplicate message. channel: %s. ts: %s',
+                         content['channel'],
+                         content['ts'])
             return None
+
+        return self.dispatch(content['channel'],
+                             content['user'],
+                             content['text'],
+                             partial(self.send_response, content['channel']))
+
+    def send_response(self,
+                      channel: str,
+                      ret: Optional[Union[SlackMessage, str]]) \
+            -> Optional[Future]:
+        """Send the result of respond() to given channel.
+
+        SlackMessage is posted via web API on post worker, and text is sent
+        via websocket connection on message worker.
+
+        :param channel: Channel ID to send response to.
+        :param ret: Response to send.
+        :return: Optional Future instance that represent message sending
+            result.
+        """
+        if isinstance(ret, SlackMessage):
+            future = self.post_worker.submit(channel,
+                                             self.post_rich_message,
+                                             channel,
+                                             ret.to_request_params())
+            future.add_done_callback(partial(self.report_post, channel))
+            return future
         elif isinstance(ret, str):
             return self.enqueue_sending_message(self.send_message,
-                                                content['channel'],
+                                                channel,
                                                 ret)
 
+    @staticmethod
+    def report_post(channel: str, future: Future) -> None:
+        if future.exception():
+            logging.error('Failed to post reply to %s. %s',
+                          channel,
+                          future.exception())
+
+    def handle_directory_event(self, event: Dict) -> None:
+        """Update directory with event on users and channels.
+
+        :param event: Dictionary that represent event.
+        :return: None
+        """
+        self.directory.apply(event)
+
     def handle_team_migration(self, _: Dict) -> None:
         """Handle team_migration_started event.
 
@@ -420,7 +1087,13 @@ class Slack(Base):
         :param _: Dictionary that represent event.
         :return: None
         """
-        logging.info("Team migration started.")
+        logging.info("Team migration started. Reconnecting.")
+        with self.send_lock:
+            self.connected = False
+
+        # run_forever() returns and connect() starts reconnection
+        if self.ws:
+            self.ws.close()
 
     def on_error(self, _: WebSocketApp, error: Exception) -> None:
         """Callback method called by WebSocketApp when error occurred.
@@ -430,6 +1103,9 @@ class Slack(Base):
         :return: None
         """
         logging.error("error %s", error)
+        if isinstance(error, (KeyboardInterrupt, SystemExit)):
+            # WebSocketApp may swallow interruption, so stop reconnecting here
+            self.closing.set()
 
     def on_open(self, _: WebSocketApp) -> None:
         """Callback method called by WebSocketApp on connection establishment.
@@ -448,7 +1124,9 @@ class Slack(Base):
         :param reason: Closing reason.
         :return: None
         """
-        logging.info('connection closed. code: %d. reason: %s', code, reason)
+        with self.send_lock:
+            self.connected = False
+        logging.info('connection closed. code: %s. reason: %s', code, reason)
 
     def send_message(self,
                      channel: str,
@@ -456,16 +1134,43 @@ class Slack(Base):
                      message_type: str = 'message') -> None:
         """Send message to Slack via websocket connection.
 
+        While disconnected, the message is kept and sent on reconnection.
+        When too many messages are kept, the oldest one is dropped.
+
         :param channel: Target channel to send message.
         :param text: Sending text.
         :param message_type: Message type. Default is "message."
         :return: None
         """
+        with self.send_lock:
+            if self.connected:
+                self.transmit(channel, text, message_type)
+                return
+
+            if len(self.outbox) == self.outbox.maxlen:
+                logging.warning('Too many messages are kept while '
+                                'disconnected. Drop the oldest one.')
+            self.outbox.append((channel, text, message_type))
+
+    def transmit(self, channel: str, text: str, message_type: str) -> None:
+        """Write message to current websocket connection.
+
+        :param channel: Target channel to send message.
+        :param text: Sending text.
+        :param message_type: Message type.
+        :return: None
+        """
+        message_id = self.next_message_id()
         params = {'channel': channel,
                   'text': text,
                   'type': message_type,
-                  'id': self.next_message_id()}
-        self.ws.send(json.dumps(params))
+                  'id': message_id}
+        self.ack_tracker.add(message_id, params)
+        try:
+            self.ws.send(json_codec.dumps(params))
+        except Exception:
+            self.ack_tracker.discard(message_id)
+            raise
 
     def next_message_id(self) -> int:
         """Return unique ID for sending message.
@@ -476,8 +1181,24 @@ class Slack(Base):
 
         :return: Unique ID as int
         """
-        self.message_id += 1
-        return self.message_id
+        with self.message_id_lock:
+            self.message_id += 1
+            return self.message_id
+
+    def stop(self) -> None:
+        """Stop. Cleanup scheduler, workers and acknowledgement tracking."""
+        self.closing.set()
+        super().stop()
+
+        if self.post_worker.executor:
+            self.post_worker.executor.shutdown(wait=False)
+
+        self.ack_tracker.stop()
+        logging.info('Acknowledgement stats: %s', self.ack_tracker.as_dict())
+        if self.keepalive_thread:
+            self.keepalive_thread.join()
+            self.keepalive_thread = None
+        logging.info('Round-trip time stats: %s', self.ping_latency.as_dict())
 
 
 class SarahSlackException(SarahException):
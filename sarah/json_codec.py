@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Provide JSON encoding and decoding with the fastest available library.
+
+orjson or ujson is used when installed, and stdlib json is used otherwise.
+Decoding accepts bytes as they are received, so callers do not need to decode
+them to str first.
+
+    from sarah import json_codec
+    json_codec.loads(response.content)
+    json_codec.dumps({'type': "message"})
+
+The backend can be switched with use(), e.g. to compare them.
+"""
+import json
+import sys
+from collections import OrderedDict
+from typing import Any, Union, List
+
+try:
+    from typing import Callable
+
+    # Work-around to avoid pyflakes warning "imported but unused" regarding
+    # mypy's comment-styled type hinting
+    # http://www.laurivan.com/make-pyflakespylint-ignore-unused-imports/
+    # http://stackoverflow.com/questions/5033727/how-do-i-get-pyflakes-to-ignore-a-statement/12121404#12121404
+    assert Callable
+except AssertionError:
+    pass
+
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+try:
+    import ujson  # type: ignore
+except ImportError:
+    ujson = None
+
+from sarah.exceptions import SarahException
+
+
+def _stdlib_loads(data: Union[bytes, str]) -> Any:
+    if isinstance(data, bytes) and sys.version_info < (3, 6):
+        # bytes is accepted since 3.6
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+
+def _orjson_dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode('utf-8')
+
+
+# {name: (loads, dumps), ...} in preferred order
+BACKENDS = OrderedDict()  # type: OrderedDict
+if orjson:
+    BACKENDS['orjson'] = (orjson.loads, _orjson_dumps)
+if ujson:
+    BACKENDS['ujson'] = (ujson.loads, ujson.dumps)
+BACKENDS['json'] = (_stdlib_loads, json.dumps)
+
+_loads = None  # type: Callable[[Union[bytes, str]], Any]
+_dumps = None  # type: Callable[[Any], str]
+backend = None  # type: str
+
+
+def use(name: str) -> None:
+    """Switch JSON library.
+
+    :param name: One of available_backends().
+    :return: None
+    """
+    global _loads, _dumps, backend
+    if name not in BACKENDS:
+        raise SarahException('JSON backend %s is not available.' % name)
+
+    _loads, _dumps = BACKENDS[name]
+    backend = name
+
+
+def available_backends() -> List[str]:
+    """Return names of installed JSON libraries in preferred order."""
+    return list(BACKENDS.keys())
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode JSON given as bytes or str.
+
+    :param data: UTF-8 encoded bytes or str.
+    :return: Decoded object.
+    """
+    return _loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """Encode given object to JSON string.
+
+    :param obj: Object to encode.
+    :return: JSON string.
+    """
+    return _dumps(obj)
+
+
+use(available_backends()[0])
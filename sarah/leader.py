@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""Provide leader election among replicas of the same bot.
+
+When more than one replica of the same bot runs for availability, each of
+them has its own scheduler. To avoid sending every scheduled message more than
+once, only the replica that holds the leadership runs scheduled jobs.
+
+Leadership is renewed periodically. A leader that fails to renew it stops
+running jobs when the lease interval passes, and another replica takes over
+on its next renewal.
+"""
+import abc
+import importlib
+import logging
+import os
+import socket
+import sqlite3
+import threading  # type: ignore
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows
+    fcntl = None
+
+try:
+    from typing import Optional
+
+    # Work-around to avoid pyflakes warning "imported but unused" regarding
+    # mypy's comment-styled type hinting
+    # http://www.laurivan.com/make-pyflakespylint-ignore-unused-imports/
+    # http://stackoverflow.com/questions/5033727/how-do-i-get-pyflakes-to-ignore-a-statement/12121404#12121404
+    assert Optional
+except AssertionError:
+    pass
+
+from sarah.exceptions import SarahException
+
+
+class LeaderElection(object, metaclass=abc.ABCMeta):
+    """Base class of leader election implementation."""
+
+    def __init__(self, lease_interval: float = 15.0) -> None:
+        """Initializer.
+
+        :param lease_interval: Seconds the leadership stays valid after each
+            renewal. Leadership is renewed three times per interval.
+        :return: None
+        """
+        self.lease_interval = lease_interval
+        self.__expires_at = 0.0
+        self.__stopped = threading.Event()
+        self.__thread = None  # type: threading.Thread
+
+    @abc.abstractmethod
+    def acquire(self) -> bool:
+        """Acquire or renew the leadership.
+
+        :return: True if this replica holds the leadership.
+        """
+        pass
+
+    @abc.abstractmethod
+    def release(self) -> None:
+        """Release the leadership, if held."""
+        pass
+
+    @property
+    def is_leader(self) -> bool:
+        """Return if this replica is the leader at this moment."""
+        return time.time() < self.__expires_at
+
+    def renew(self) -> bool:
+        """Try acquiring the leadership and update its expiration.
+
+        :return: True if this replica holds the leadership.
+        """
+        started = time.time()
+        try:
+            acquired = self.acquire()
+        except Exception as e:
+            logging.error('Failed to renew leadership. %s', e)
+            acquired = False
+
+        was_leader = self.is_leader
+        self.__expires_at = started + self.lease_interval if acquired else 0.0
+        if acquired and not was_leader:
+            logging.info('Became leader.')
+        elif was_leader and not acquired:
+            logging.info('Lost leadership.')
+
+        return acquired
+
+    def start(self) -> None:
+        """Try acquiring the leadership and keep renewing it in a thread."""
+        self.__stopped.clear()
+        self.renew()
+        self.__thread = threading.Thread(target=self.keep_renewing,
+                                         daemon=True)
+        self.__thread.start()
+
+    def keep_renewing(self) -> None:
+        while not self.__stopped.wait(self.lease_interval / 3):
+            self.renew()
+
+    def stop(self) -> None:
+        """Stop renewing and release the leadership."""
+        self.__stopped.set()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+
+        self.__expires_at = 0.0
+        try:
+            self.release()
+        except Exception as e:
+            logging.error('Failed to release leadership. %s', e)
+
+
+class FileLockElection(LeaderElection):
+    """Leadership held by an exclusive lock on a local file.
+
+    The lock is released by OS when the leader process exits, so this suits
+    replicas running on the same host.
+    """
+
+    def __init__(self, path: str, lease_interval: float = 15.0) -> None:
+        """Initializer.
+
+        :param path: Path of the lock file.
+        :param lease_interval: Seconds the leadership stays valid after each
+            renewal.
+        :return: None
+        """
+        if fcntl is None:
+            raise SarahException('File lock election is not available on '
+                                 'this platform. Use "sqlite" instead.')
+
+        super().__init__(lease_interval)
+        self.path = path
+        self.__fd = None  # type: Optional[int]
+
+    def acquire(self) -> bool:
+        if self.__fd is not None:
+            return True
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            os.close(fd)
+            return False
+
+        self.__fd = fd
+        return True
+
+    def release(self) -> None:
+        if self.__fd is None:
+            return
+
+        try:
+            fcntl.flock(self.__fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self.__fd)
+            self.__fd = None
+
+
+class SQLiteLeaseElection(LeaderElection):
+    """Leadership held by a lease row in a SQLite database.
+
+    Unlike file lock, a leader that stops renewing loses its leadership when
+    the lease expires even if the process is still alive.
+    """
+
+    def __init__(self,
+                 path: str,
+                 name: str = 'sarah',
+                 lease_interval: float = 15.0) -> None:
+        """Initializer.
+
+        :param path: Path of the SQLite database file.
+        :param name: Name of the lease. Replicas of the same bot must share
+            the same name, while different bots sharing one database must
+            have different names. Bot passes its own name unless given.
+        :param lease_interval: Seconds the lease stays valid after each
+            renewal.
+        :return: None
+        """
+        super().__init__(lease_interval)
+        self.path = path
+        self.name = name
+        self.holder = '%s:%d:%s' % (socket.gethostname(),
+                                    os.getpid(),
+                                    uuid.uuid4().hex[:8])
+
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS lease ('
+                             'name TEXT PRIMARY KEY, '
+                             'holder TEXT NOT NULL, '
+                             'expires_at REAL NOT NULL)')
+        finally:
+            conn.close()
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path,
+                               timeout=self.lease_interval / 3,
+                               isolation_level='IMMEDIATE')
+
+    def acquire(self) -> bool:
+        now = time.time()
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute('INSERT OR IGNORE INTO lease VALUES (?, ?, 0)',
+                             (self.name, self.holder))
+                cursor = conn.execute(
+                    'UPDATE lease SET holder = ?, expires_at = ? '
+                    'WHERE name = ? AND (holder = ? OR expires_at < ?)',
+                    (self.holder, now + self.lease_interval,
+                     self.name, self.holder, now))
+                return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def release(self) -> None:
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute('UPDATE lease SET expires_at = 0 '
+                             'WHERE name = ? AND holder = ?',
+                             (self.name, self.holder))
+        finally:
+            conn.close()
+
+
+ELECTIONS = {'file': FileLockElection,
+             'sqlite': SQLiteLeaseElection}
+
+
+def create_election(type: str = 'file', **kwargs) -> LeaderElection:
+    """Create leader election from configuration.
+
+    :param type: One of "file" and "sqlite", or import path of custom
+        LeaderElection class such as "mypackage.election.MyElection".
+    :param kwargs: Arguments passed to the class.
+    :return: LeaderElection instance.
+    """
+    cls = ELECTIONS.get(type, None)
+    if cls is None:
+        module_name, _, class_name = type.rpartition('.')
+        try:
+            cls = getattr(importlib.import_module(module_name), class_name)
+        except (ImportError, AttributeError, ValueError) as e:
+            raise SarahException(
+                'Unknown leader election type: %s. %s' % (type, e))
+
+    return cls(**kwargs)
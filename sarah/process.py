@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""Provide utilities for bot processes."""
+import os
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+def memory_usage() -> str:
+    """Return human readable memory usage of current process.
+
+    Peak resident set size is reported by getrusage(). On Linux, memory pages
+    private to this process are also reported so the effect of copy-on-write
+    sharing with the parent process can be seen.
+
+    :return: Stringified memory usage.
+    """
+    usage = []
+    if resource:
+        # Kilobytes on Linux
+        usage.append('maxrss: %d KB' %
+                     resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+    try:
+        with open('/proc/%d/smaps_rollup' % os.getpid()) as f:
+            private = sum(int(line.split()[1]) for line in f
+                          if line.startswith('Private_'))
+        usage.append('private: %d KB' % private)
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+
+    return ', '.join(usage) if usage else 'unknown'
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Provide persistent state of scheduled jobs.
+
+APScheduler's persistent job stores pickle job functions, while job functions
+of this project are closures generated on every start and can not be pickled.
+Instead, jobs are added to the in-memory store as usual and only their next
+run times are kept in SQLite database keyed by job ID. On restart, each job
+is added with its stored next run time, so restarting does not reset the
+schedule. Jobs are stored per owner, so multiple bots can share one database.
+"""
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime, timezone
+from apscheduler.events import EVENT_JOB_ADDED, EVENT_JOB_MODIFIED, \
+    EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED  # type: ignore
+from apscheduler.schedulers.base import BaseScheduler  # type: ignore
+from typing import Optional
+
+try:
+    from typing import Dict, List
+
+    # Work-around to avoid pyflakes warning "imported but unused" regarding
+    # mypy's comment-styled type hinting
+    # http://www.laurivan.com/make-pyflakespylint-ignore-unused-imports/
+    # http://stackoverflow.com/questions/5033727/how-do-i-get-pyflakes-to-ignore-a-statement/12121404#12121404
+    assert Dict
+    assert List
+except AssertionError:
+    pass
+
+from sarah.exceptions import SarahException
+
+EVENTS = EVENT_JOB_ADDED | EVENT_JOB_MODIFIED | EVENT_JOB_EXECUTED | \
+         EVENT_JOB_ERROR | EVENT_JOB_MISSED
+
+
+class ScheduleStore(object):
+    """Keep next run times of scheduled jobs in SQLite database."""
+
+    MISFIRE_POLICIES = ('run', 'skip')
+
+    def __init__(self,
+                 path: str,
+                 misfire: str = 'run',
+                 misfire_grace_time: Optional[int] = None,
+                 owner: str = '') -> None:
+        """Initializer.
+
+        :param path: Path of the SQLite database file.
+        :param misfire: What to do with a run that was due while stopped.
+            "run" runs it once right after start, and "skip" waits for the
+            next regular run.
+        :param misfire_grace_time: Optional seconds a run can be late. Later
+            runs are skipped both on start and while running.
+        :param owner: Name of the bot that owns stored jobs. Bots sharing one
+            database must have different owners, or they overwrite and prune
+            each other's jobs.
+        :return: None
+        """
+        if misfire not in self.MISFIRE_POLICIES:
+            raise SarahException('Unknown misfire policy: %s' % misfire)
+
+        self.path = path
+        self.misfire = misfire
+        self.misfire_grace_time = misfire_grace_time
+        self.owner = owner
+        self.scheduler = None  # type: BaseScheduler
+
+        # {job_id: signature, ...} of jobs added by this bot
+        self.__signatures = {}  # type: Dict[str, str]
+
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS schedule ('
+                             'job_id TEXT NOT NULL, '
+                             'owner TEXT NOT NULL, '
+                             'signature TEXT NOT NULL, '
+                             'next_run_time REAL, '
+                             'PRIMARY KEY (owner, job_id))')
+        finally:
+            conn.close()
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path)
+
+    @staticmethod
+    def signature(scheduler_args: Dict) -> str:
+        """Return string that changes when the trigger setting changes.
+
+        :param scheduler_args: Arguments to be passed to add_job().
+        :return: Signature string.
+        """
+        return json.dumps({k: v for k, v in scheduler_args.items()
+                           if k not in ('start_date', 'next_run_time')},
+                          sort_keys=True,
+                          default=str)
+
+    def job_kwargs(self, job_id: str, scheduler_args: Dict) -> Dict:
+        """Return arguments for add_job() restored from stored state.
+
+        Stored state is used only when the trigger setting is not changed.
+
+        :param job_id: ID of the job.
+        :param scheduler_args: Arguments to be passed to add_job().
+        :return: Arguments to be added.
+        """
+        signature = self.signature(scheduler_args)
+        self.__signatures[job_id] = signature
+
+        kwargs = {}  # type: Dict
+        if self.misfire_grace_time is not None:
+            kwargs['misfire_grace_time'] = self.misfire_grace_time
+
+        conn = self.connect()
+        try:
+            row = conn.execute('SELECT signature, next_run_time '
+                               'FROM schedule WHERE owner = ? AND job_id = ?',
+                               (self.owner, job_id)).fetchone()
+        finally:
+            conn.close()
+
+        if row is None or row[0] != signature or row[1] is None:
+            return kwargs
+
+        next_run_time = row[1]
+        now = time.time()
+        if next_run_time < now:
+            late = now - next_run_time
+            if self.misfire == 'skip' or (
+                    self.misfire_grace_time is not None and
+                    late > self.misfire_grace_time):
+                logging.info('Skip missed run of %s.', job_id)
+                return kwargs
+
+            logging.info('Run %s missed %d seconds ago.', job_id, late)
+            next_run_time = now
+
+        kwargs['next_run_time'] = datetime.fromtimestamp(next_run_time,
+                                                         timezone.utc)
+        return kwargs
+
+    def listen(self, scheduler: BaseScheduler) -> None:
+        """Start saving next run times of jobs on given scheduler.
+
+        :param scheduler: Scheduler jobs are added to.
+        :return: None
+        """
+        self.scheduler = scheduler
+        scheduler.add_listener(self.on_event, EVENTS)
+
+    def stop(self) -> None:
+        """Stop saving next run times."""
+        if self.scheduler:
+            self.scheduler.remove_listener(self.on_event)
+            self.scheduler = None
+
+    def on_event(self, event) -> None:
+        signature = self.__signatures.get(event.job_id, None)
+        if signature is None:
+            # Job of other bot on shared scheduler
+            return
+
+        job = self.scheduler.get_job(event.job_id) if self.scheduler else None
+        next_run_time = getattr(job, 'next_run_time', None)
+        if next_run_time is None:
+            # Not started yet, or paused
+            return
+
+        try:
+            self.save(event.job_id, signature, next_run_time.timestamp())
+        except sqlite3.Error as e:
+            logging.error('Failed to save schedule of %s. %s',
+                          event.job_id,
+                          e)
+
+    def save(self, job_id: str, signature: str, next_run_time: float) -> None:
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO schedule '
+                             'VALUES (?, ?, ?, ?)',
+                             (job_id, self.owner, signature, next_run_time))
+        finally:
+            conn.close()
+
+    def prune(self) -> List[str]:
+        """Delete stored jobs of this bot that are no longer added.
+
+        :return: IDs of deleted jobs.
+        """
+        conn = self.connect()
+        try:
+            with conn:
+                stale = [row[0] for row in conn.execute(
+                    'SELECT job_id FROM schedule WHERE owner = ?',
+                    (self.owner,))
+                    if row[0] not in self.__signatures]
+                conn.executemany('DELETE FROM schedule '
+                                 'WHERE owner = ? AND job_id = ?',
+                                 [(self.owner, job_id) for job_id in stale])
+        finally:
+            conn.close()
+
+        if stale:
+            logging.info('Removed stale schedules: %s', ', '.join(stale))
+        return stale
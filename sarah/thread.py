@@ -1,12 +1,25 @@
 # -*- coding: utf-8 -*-
 # noinspection PyProtectedMember
 import atexit
+import itertools
 import logging
 import threading  # type: ignore
 import weakref
+from collections import deque
 from concurrent.futures import Executor, Future  # type: ignore
 from concurrent.futures.thread import _WorkItem as WorkItem  # type: ignore
-from queue import Queue
+from queue import PriorityQueue
+
+# Smaller value runs first. Replies to users are sent before scheduled
+# messages that are waiting in the same queue.
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = 10
+
+# Queued after any work item, so pending items run before worker exits.
+_SENTINEL_PRIORITY = float('inf')
+
+# Keeps FIFO order among queued items with the same priority
+_sequence = itertools.count()
 
 # Provide the same interface as ThreadPoolExecutor, but create only on thread.
 # Worker is created as daemon thread. This is done to allow the interpreter to
@@ -38,7 +51,7 @@ atexit.register(_python_exit)
 def _worker(executor_reference, work_queue):
     try:
         while True:
-            work_item = work_queue.get(block=True)
+            _, _, work_item = work_queue.get(block=True)
             if work_item is not None:
                 work_item.run()
                 continue
@@ -49,7 +62,7 @@ def _worker(executor_reference, work_queue):
             #   - The executor that owns the worker has been shutdown.
             if _shutdown or executor is None or executor._shutdown:
                 # Notice other workers
-                work_queue.put(None)
+                work_queue.put((_SENTINEL_PRIORITY, next(_sequence), None))
                 return
             del executor
     except BaseException:
@@ -59,12 +72,12 @@ def _worker(executor_reference, work_queue):
 class ThreadExecutor(Executor):
     def __init__(self):
         """ Initialize a new ThreadExecutor instance. """
-        self._work_queue = Queue()
+        self._work_queue = PriorityQueue()
         self._shutdown = False
         self._shutdown_lock = threading.Lock()
 
         def weakref_cb(_, q=self._work_queue):
-            q.put(None)
+            q.put((_SENTINEL_PRIORITY, next(_sequence), None))
 
         t = threading.Thread(target=_worker,
                              args=(weakref.ref(self, weakref_cb),
@@ -74,6 +87,18 @@ class ThreadExecutor(Executor):
         self._thread = t
 
     def submit(self, fn, *args, **kwargs):
+        return self.submit_with_priority(PRIORITY_NORMAL, fn, *args, **kwargs)
+
+    submit.__doc__ = Executor.submit.__doc__
+
+    def submit_with_priority(self, priority, fn, *args, **kwargs):
+        """Submit a callable to be executed after pending callables with
+        smaller or the same priority value.
+
+        :param priority: Priority such as PRIORITY_NORMAL or PRIORITY_LOW.
+        :param fn: Callable to be executed.
+        :return: Future instance that represents the execution.
+        """
         with self._shutdown_lock:
             if self._shutdown:
                 raise RuntimeError(
@@ -82,16 +107,95 @@ class ThreadExecutor(Executor):
             f = Future()
             w = WorkItem(f, fn, args, kwargs)
 
-            self._work_queue.put(w)
+            self._work_queue.put((priority, next(_sequence), w))
             return f
 
-    submit.__doc__ = Executor.submit.__doc__
-
     def shutdown(self, wait=True):
         with self._shutdown_lock:
             self._shutdown = True
-            self._work_queue.put(None)
+            self._work_queue.put((_SENTINEL_PRIORITY, next(_sequence), None))
         if wait:
             self._thread.join()
 
     shutdown.__doc__ = Executor.shutdown.__doc__
+
+
+class KeyedExecutor(object):
+    """Limit the number of callables running at a time for each key.
+
+    Callables are submitted to given executor as long as fewer than
+    max_per_key callables of the same key are running. Others wait in FIFO
+    order per key without occupying worker threads, so a busy key does not
+    block callables of other keys. Without executor, callables run on the
+    calling thread.
+    """
+
+    def __init__(self, executor: Executor = None, max_per_key: int = 1):
+        self.executor = executor
+        self.max_per_key = max_per_key
+        # {key: [running count, deque of waiting items], ...}
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Submit a callable to be executed when its key is available.
+
+        :param key: Hashable key such as destination of a message.
+        :param fn: Callable to be executed.
+        :return: Future instance that represents the execution.
+        """
+        future = Future()
+        item = (future, fn, args, kwargs)
+        with self._lock:
+            state = self._keys.setdefault(key, [0, deque()])
+            if state[0] >= self.max_per_key:
+                state[1].append(item)
+                return future
+            state[0] += 1
+
+        self._start(key, item)
+        return future
+
+    def pending(self, key):
+        """Return the number of running and waiting callables of given key."""
+        with self._lock:
+            state = self._keys.get(key, None)
+            return state[0] + len(state[1]) if state else 0
+
+    def _start(self, key, item):
+        if self.executor is None:
+            self._run(key, item)
+            return
+
+        try:
+            self.executor.submit(self._run, key, item)
+        except RuntimeError as e:
+            # Executor is shut down
+            item[0].set_exception(e)
+            self._done(key)
+
+    def _run(self, key, item):
+        future, fn, args, kwargs = item
+        try:
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+        finally:
+            self._done(key)
+
+    def _done(self, key):
+        with self._lock:
+            state = self._keys[key]
+            if not state[1]:
+                state[0] -= 1
+                if not state[0]:
+                    del self._keys[key]
+                return
+            item = state[1].popleft()
+
+        self._start(key, item)
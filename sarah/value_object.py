@@ -17,6 +17,7 @@ recursive comparison.
 """
 import hashlib
 import inspect
+from functools import wraps
 from inspect import getfullargspec  # type: ignore
 from typing import Any, Dict, List, Callable, Mapping
 
@@ -144,6 +145,30 @@ class ValueObject(object):
         return self.__stash.keys()
 
 
+def memoize(method: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """Cache the result of given method of ValueObject on each instance.
+
+    Since ValueObject is not modified after initialization, values derived
+    from its members only need to be calculated once. The method must not
+    take arguments, and callers must not modify the returned value.
+
+    :param method: Method that only takes self.
+    :return: Wrapped method.
+    """
+    name = '_memoized_' + method.__name__
+
+    @wraps(method)
+    def wrapper(self):
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            # Concurrent first calls may calculate twice, which is harmless
+            value = self.__dict__[name] = method(self)
+            return value
+
+    return wrapper
+
+
 class ObjectMapper(object):
     def __init__(self, mapping_class: Callable[..., ValueObject]) -> None:
         self.mapping_class = mapping_class
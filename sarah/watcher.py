@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Provide mechanism to detect modification of plugin modules.
+
+inotify and its equivalents are not available in standard library and their
+behaviours vary depending on platform, so this simply polls modification time
+of each module's source file. Since the number of watched plugin modules is
+small, this is cheap enough to run every few seconds.
+"""
+import importlib.util
+import logging
+import os
+import sys
+import threading  # type: ignore
+from typing import Callable, Iterable, Optional, List
+
+try:
+    from typing import Dict
+
+    # Work-around to avoid pyflakes warning "imported but unused" regarding
+    # mypy's comment-styled type hinting
+    # http://www.laurivan.com/make-pyflakespylint-ignore-unused-imports/
+    # http://stackoverflow.com/questions/5033727/how-do-i-get-pyflakes-to-ignore-a-statement/12121404#12121404
+    assert Dict
+except AssertionError:
+    pass
+
+
+class ModuleWatcher(object):
+    """Watch source files of given modules and report modified ones."""
+
+    # {module_name: mtime, ...} of source files at the time modules were
+    # loaded. Forked child processes inherit this, so modification made after
+    # the parent process preloaded plugins is still detected by the child.
+    loaded_mtimes = {}  # type: Dict[str, Optional[float]]
+
+    def __init__(self,
+                 module_names: Iterable[str],
+                 callback: Callable[[List[str]], None],
+                 interval: float = 3.0) -> None:
+        """Initializer.
+
+        :param module_names: Names of modules to watch.
+        :param callback: Function to be called with the list of modified
+            module names.
+        :param interval: Polling interval in seconds.
+        :return: None
+        """
+        self.module_names = list(module_names)
+        self.callback = callback
+        self.interval = interval
+        self.__mtimes = {}  # type: Dict[str, Optional[float]]
+        self.__stop_event = threading.Event()
+        self.__thread = None  # type: threading.Thread
+
+    @staticmethod
+    def source_path(module_name: str) -> Optional[str]:
+        """Return path to the source file of given module.
+
+        Modules that are not loaded, e.g. ones failed to load, are looked up
+        on import path, so they are loaded once fixed.
+
+        :param module_name: Module name.
+        :return: Optional path.
+        """
+        module = sys.modules.get(module_name, None)
+        if module is not None:
+            return getattr(module, '__file__', None)
+
+        try:
+            spec = importlib.util.find_spec(module_name)
+        except Exception:
+            # Parent package failed to load or module name is invalid
+            return None
+        return spec.origin if spec and spec.has_location else None
+
+    @staticmethod
+    def modified_time(path: Optional[str]) -> Optional[float]:
+        """Return the modification time of given file.
+
+        :param path: Path to the file.
+        :return: Optional modification time. None is returned when the file
+            does not exist.
+        """
+        if not path:
+            return None
+
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    @classmethod
+    def mark_loaded(cls, module_name: str) -> None:
+        """Record modification time of given module's source file on load.
+
+        Call this right after importing or reloading the module.
+
+        :param module_name: Module name.
+        :return: None
+        """
+        cls.loaded_mtimes[module_name] = cls.modified_time(
+            cls.source_path(module_name))
+
+    def snapshot(self) -> None:
+        """Record modification time of all watched modules.
+
+        Time recorded on load is preferred, so modification made after the
+        modules were loaded, but before watching started, is reported on the
+        first check.
+        """
+        self.__mtimes = {}
+        for module_name in self.module_names:
+            if module_name in self.loaded_mtimes:
+                mtime = self.loaded_mtimes[module_name]
+            else:
+                mtime = self.modified_time(self.source_path(module_name))
+            self.__mtimes[module_name] = mtime
+
+    def check(self) -> List[str]:
+        """Return names of modules modified since last check.
+
+        :return: List of modified module names.
+        """
+        modified = []
+        for module_name in self.module_names:
+            mtime = self.modified_time(self.source_path(module_name))
+            if mtime is None:
+                # Not found or being rewritten. Check on the next round.
+                continue
+
+            if self.__mtimes.get(module_name, None) != mtime:
+                self.__mtimes[module_name] = mtime
+                modified.append(module_name)
+
+        return modified
+
+    def start(self) -> None:
+        """Start watching in a daemon thread."""
+        self.snapshot()
+        self.__stop_event.clear()
+        self.__thread = threading.Thread(target=self.watch, daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """Stop watching."""
+        self.__stop_event.set()
+
+    def watch(self) -> None:
+        """Poll modification and pass modified modules to the callback."""
+        while not self.__stop_event.wait(self.interval):
+            modified = self.check()
+            if not modified:
+                continue
+
+            logging.info('Detected modification. %s' % ', '.join(modified))
+            try:
+                self.callback(modified)
+            except Exception as e:
+                logging.error('Failed to handle modification. %s' % e)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import time
+from unittest.mock import patch, MagicMock
+
+from assertpy import assert_that
+
+from sarah.bot.ack_tracker import AckTracker, LatencyHistogram
+
+
+class TestLatencyHistogram(object):
+    def test_empty(self):
+        histogram = LatencyHistogram()
+        assert_that(histogram.percentile(50)).is_none()
+        assert_that(histogram.as_dict()) \
+            .contains_entry({'count': 0}) \
+            .contains_entry({'mean': None})
+
+    def test_observe(self):
+        histogram = LatencyHistogram()
+        for seconds in (0.01, 0.02, 0.3, 0.3, 30.0):
+            histogram.observe(seconds)
+
+        assert_that(histogram.counts[0]).is_equal_to(2)
+        assert_that(histogram.counts[3]).is_equal_to(2)
+        assert_that(histogram.counts[-1]).is_equal_to(1)
+        assert_that(histogram.percentile(40)).is_equal_to(0.05)
+        assert_that(histogram.percentile(50)).is_equal_to(0.5)
+        assert_that(histogram.percentile(100)).is_equal_to(30.0)
+
+        stats = histogram.as_dict()
+        assert_that(stats).contains_entry({'count': 5}) \
+            .contains_entry({'max': 30.0})
+        assert_that(stats['buckets']).contains_entry({'le_inf': 1})
+
+
+class TestAckTracker(object):
+    def test_ack(self):
+        tracker = AckTracker()
+        with patch.object(time, 'time', return_value=100.0):
+            tracker.add(1, {'text': "spam"})
+            tracker.add(2, {'text': "ham"})
+        assert_that(tracker).is_length(2)
+
+        with patch.object(time, 'time', return_value=100.2):
+            assert_that(tracker.ack(1)).is_equal_to({'text': "spam"})
+            assert_that(tracker.ack(2, False)).is_equal_to({'text': "ham"})
+            assert_that(tracker.ack(3)).is_none()
+
+        assert_that(tracker).is_length(0)
+        assert_that(tracker.as_dict()) \
+            .contains_entry({'errors': 1}) \
+            .contains_entry({'unknown': 1})
+        assert_that(tracker.latency.count).is_equal_to(2)
+        assert_that(tracker.latency.max).is_close_to(0.2, 0.001)
+
+    def test_max_pending(self):
+        tracker = AckTracker(max_pending=2)
+        for i in range(1, 4):
+            tracker.add(i, {})
+
+        assert_that(tracker).is_length(2)
+        assert_that(tracker.evictions).is_equal_to(1)
+        assert_that(tracker.ack(1)).is_none()
+        assert_that(tracker.ack(3)).is_not_none()
+
+    def test_discard(self):
+        tracker = AckTracker()
+        tracker.add(1, {})
+        tracker.discard(1)
+        tracker.discard(2)
+        assert_that(tracker).is_length(0)
+
+    def test_sweep(self):
+        on_timeout = MagicMock(side_effect=[Exception, None])
+        tracker = AckTracker(timeout=10.0, on_timeout=on_timeout)
+        with patch.object(time, 'time', return_value=100.0):
+            tracker.add(1, {'text': "spam"})
+            tracker.add(2, {'text': "ham"})
+        with patch.object(time, 'time', return_value=105.0):
+            tracker.add(3, {'text': "egg"})
+
+        with patch.object(time, 'time', return_value=111.0):
+            tracker.sweep()
+
+        assert_that(on_timeout.call_count).is_equal_to(2)
+        assert_that(on_timeout.call_args[0]).is_equal_to((2, {'text': "ham"}))
+        assert_that(tracker).is_length(1)
+        assert_that(tracker.timeouts).is_equal_to(2)
+
+    def test_start_stop(self):
+        tracker = AckTracker(timeout=0.01)
+        tracker.start()
+        tracker.stop()
+        tracker.stop()
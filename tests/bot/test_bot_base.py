@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 import logging
 import sys
+import threading
 from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import datetime, timedelta, timezone
 from typing import Dict, Any, Optional, Callable
 from unittest.mock import patch, PropertyMock, Mock
 
@@ -10,8 +12,11 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from assertpy import assert_that
 
 from sarah.bot import Base
+from sarah.bot.registry import CommandRegistry
 from sarah.bot.values import CommandMessage, ScheduledCommand, Command, \
     UserContext, InputOption
+from sarah.leader import create_election
+from sarah.schedule_store import ScheduleStore
 from sarah.thread import ThreadExecutor
 
 
@@ -23,6 +28,10 @@ def create_concrete_class():
                  'generate_schedule_job': lambda self, command: None})
 
 
+# Referred by plugin module that is dynamically generated in reload test
+BASE_IMPL_CLASS = None
+
+
 class TestInit(object):
     def test_init_no_args(self):
         kls = create_concrete_class()
@@ -74,6 +83,22 @@ class TestRun(object):
                 assert_that(base_impl.connect.call_count).is_equal_to(1)
                 assert_that(base_impl.stop.call_count).is_equal_to(1)
 
+    def test_plugins_loaded_before_fork(self):
+        kls = create_concrete_class()
+        base_impl = kls(plugins=[('sarah.bot.plugins.echo',)])
+        assert_that(base_impl.plugins_loaded).is_false()
+        base_impl.stage_registries(['sarah.bot.plugins.echo'])
+        base_impl.commit_registries()
+        assert_that(base_impl.plugins_loaded).is_true()
+
+        with patch.object(base_impl, 'connect', return_value=None), \
+                patch.object(base_impl, 'stop', return_value=None), \
+                patch.object(Base, 'load_plugin') as load_plugin:
+            base_impl.run()
+
+        # Registries built in the parent are used as they are
+        assert_that(load_plugin.called).is_false()
+
 
 class TestStop(object):
     def test_valid(self):
@@ -114,6 +139,82 @@ class TestLoadPlugins(object):
             assert_that(logging.warning.call_count).is_equal_to(1)
 
 
+class TestReloadPlugins(object):
+    def test_valid(self, tmpdir):
+        source = "\n".join((
+            "from sarah.bot.values import CommandMessage",
+            "from {0} import BASE_IMPL_CLASS".format(__name__),
+            "@BASE_IMPL_CLASS.command('.reloading')",
+            "def reloading(msg: CommandMessage, config) -> str:",
+            "    return '%s'",
+            ""))
+        path = tmpdir.join('reloading_dummy_plugin.py')
+        path.write(source % "first")
+        sys.path.insert(0, str(tmpdir))
+
+        global BASE_IMPL_CLASS
+        BASE_IMPL_CLASS = create_concrete_class()
+        try:
+            base_impl = BASE_IMPL_CLASS(
+                    plugins=[('reloading_dummy_plugin',)])
+            base_impl.load_plugins()
+            original_commands = base_impl.commands
+            assert_that(original_commands).is_length(1)
+
+            path.write(source % "second")
+            base_impl.reload_plugins(['reloading_dummy_plugin'])
+
+            # Registered list is replaced, not modified
+            assert_that(base_impl.commands) \
+                .is_not_same_as(original_commands) \
+                .is_length(1)
+            assert_that(original_commands).is_length(1)
+            assert_that(base_impl.commands[0](
+                    CommandMessage(".reloading", "", "homer"))) \
+                .is_equal_to("second")
+
+            # Failed module keeps previous commands
+            path.write("raise Exception()\n")
+            with patch.object(logging, 'warning', return_value=None):
+                base_impl.reload_plugins(['reloading_dummy_plugin'])
+            assert_that(base_impl.commands).is_length(1)
+        finally:
+            sys.path.remove(str(tmpdir))
+            sys.modules.pop('reloading_dummy_plugin', None)
+
+    def test_order(self, tmpdir):
+        source = "\n".join((
+            "from {0} import BASE_IMPL_CLASS".format(__name__),
+            "@BASE_IMPL_CLASS.command('.%s')",
+            "def command(msg, config):",
+            "    return ''",
+            ""))
+        names = ['ordered_plugin_%s' % c for c in "zyxwvutsrqponmlk"]
+        for name in names:
+            tmpdir.join(name + '.py').write(source % name)
+        sys.path.insert(0, str(tmpdir))
+
+        global BASE_IMPL_CLASS
+        BASE_IMPL_CLASS = create_concrete_class()
+        try:
+            # Duplicated configuration does not change the order
+            base_impl = BASE_IMPL_CLASS(
+                plugins=[(name,) for name in names + names[:3]])
+            with patch.object(base_impl,
+                              'load_plugin',
+                              wraps=base_impl.load_plugin) as load_plugin:
+                base_impl.load_plugins()
+
+            assert_that([c[0][0] for c in load_plugin.call_args_list]) \
+                .is_equal_to(names)
+            assert_that([c.name for c in base_impl.commands]) \
+                .is_equal_to(['.' + name for name in names])
+        finally:
+            sys.path.remove(str(tmpdir))
+            for name in names:
+                sys.modules.pop(name, None)
+
+
 class TestEnqueueSendingMessage(object):
     def test_valid(self):
         base_impl = create_concrete_class()(None, max_workers=3)
@@ -127,6 +228,46 @@ class TestEnqueueSendingMessage(object):
                 .is_equal_to(1)
 
 
+class TestFanOut(object):
+    @staticmethod
+    def send(destination):
+        if destination == "ham":
+            raise Exception("failed")
+        return destination.upper()
+
+    def test_without_worker(self):
+        base_impl = create_concrete_class()()
+        with patch.object(logging, 'error') as error:
+            results = base_impl.fan_out("job", ["spam", "ham", "egg"],
+                                        self.send).result()
+
+            assert_that(list(results.keys())) \
+                .is_equal_to(["spam", "ham", "egg"])
+            assert_that(results["spam"]).is_equal_to("SPAM")
+            assert_that(results["ham"]).is_instance_of(Exception)
+            assert_that(error.call_count).is_equal_to(1)
+
+    def test_with_worker(self):
+        base_impl = create_concrete_class()()
+        base_impl.broadcast_worker = ThreadPoolExecutor(max_workers=3)
+        base_impl.message_worker = ThreadExecutor()
+        try:
+            future = base_impl.fan_out(
+                "job",
+                ["spam", "egg"],
+                lambda d: base_impl.enqueue_sending_message(self.send, d))
+            assert_that(future.result(timeout=5)) \
+                .is_equal_to({"spam": "SPAM", "egg": "EGG"})
+        finally:
+            base_impl.broadcast_worker.shutdown()
+            base_impl.message_worker.shutdown()
+
+    def test_empty(self):
+        base_impl = create_concrete_class()()
+        assert_that(base_impl.fan_out("job", [], self.send).result()) \
+            .is_empty()
+
+
 class TestConcurrentDecorator(object):
     def test_with_worker(self):
         base_impl = create_concrete_class()(None, max_workers=3)
@@ -341,6 +482,182 @@ class TestAddScheduleJobs(object):
 
         assert_that(base_impl.scheduler.get_jobs()).is_empty()
 
+    def test_defaults(self):
+        base_impl = create_concrete_class()()
+        base_impl.generate_schedule_job = lambda command: lambda: None
+        commands = [ScheduledCommand(name,
+                                     lambda config: "ham",
+                                     'dummy_module_name',
+                                     {},
+                                     {'scheduler_args': args})
+                    for name, args in (('spam', {'trigger': "interval",
+                                                 'minutes': 4}),
+                                       ('ham', {'trigger': "interval",
+                                                'seconds': 240}),
+                                       ('egg', {'trigger': "interval",
+                                                'minutes': 4,
+                                                'coalesce': False}),
+                                       ('bacon', {'trigger': "interval",
+                                                  'minutes': 5,
+                                                  'max_instances': 3}))]
+        with patch.object(base_impl.schedule_runner,
+                          'wrap',
+                          wraps=base_impl.schedule_runner.wrap) as wrap:
+            base_impl.add_schedule_jobs(commands)
+
+            # The limit is enforced by the runner
+            assert_that([c[0][2] for c in wrap.call_args_list]) \
+                .is_equal_to([1, 1, 1, 3])
+
+        jobs = [base_impl.scheduler.get_job(c.job_id) for c in commands]
+        assert_that([j.coalesce for j in jobs]) \
+            .is_equal_to([True, True, False, True])
+        assert_that([j.max_instances for j in jobs]) \
+            .is_equal_to([1, 1, 1, 3])
+
+        # Jobs with the same 4 minutes interval are staggered
+        start_dates = [j.trigger.start_date for j in jobs]
+        assert_that(int((start_dates[1] - start_dates[0]).total_seconds())) \
+            .is_equal_to(80)
+        assert_that(int((start_dates[2] - start_dates[1]).total_seconds())) \
+            .is_equal_to(80)
+
+    def test_without_spread(self):
+        base_impl = create_concrete_class()(schedule_spread=False)
+        args = {'trigger': "interval", 'minutes': 4}
+        base_impl.stagger = Mock()
+        base_impl.generate_schedule_job = lambda command: lambda: None
+        base_impl.add_schedule_jobs([ScheduledCommand('spam',
+                                                      lambda config: "ham",
+                                                      'dummy_module_name',
+                                                      {},
+                                                      {'scheduler_args': args})
+                                     ])
+        assert_that(base_impl.stagger.call_count).is_zero()
+
+    def test_jitter(self):
+        calls = []
+        base_impl = create_concrete_class()(schedule_jitter=10)
+        base_impl.generate_schedule_job = lambda command: \
+            lambda: calls.append(command.name)
+        commands = [ScheduledCommand(name,
+                                     lambda config: "ham",
+                                     'dummy_module_name',
+                                     {},
+                                     schedule_config)
+                    for name, schedule_config in (('spam', {}),
+                                                  ('ham', {'jitter': 0}))]
+        base_impl.add_schedule_jobs(commands)
+
+        with patch.object(threading, 'Timer') as timer:
+            for command in commands:
+                base_impl.scheduler.get_job(command.job_id).func()
+
+            # Delayed one is handed to timer thread
+            assert_that(calls).is_equal_to(['ham'])
+            assert_that(timer.call_count).is_equal_to(1)
+            assert_that(timer.call_args[0][0]).is_between(0, 10)
+            assert_that(timer.return_value.start.call_count).is_equal_to(1)
+
+            timer.call_args[0][1]()
+            assert_that(calls).is_equal_to(['ham', 'spam'])
+
+    def test_schedule_store(self, tmpdir):
+        base_impl = create_concrete_class()(
+            schedule_store={'path': str(tmpdir.join('schedule.db'))})
+        base_impl.generate_schedule_job = lambda command: lambda: None
+        base_impl.schedule_store = ScheduleStore(
+            **base_impl.schedule_store_config)
+
+        next_run_time = datetime.now(timezone.utc) + timedelta(seconds=10)
+        with patch.object(base_impl.schedule_store,
+                          'job_kwargs',
+                          return_value={'next_run_time': next_run_time}):
+            command = ScheduledCommand('spam',
+                                       lambda config: "ham",
+                                       'dummy_module_name',
+                                       {},
+                                       {})
+            base_impl.add_schedule_jobs([command])
+
+        base_impl.scheduler.start()
+        try:
+            assert_that(base_impl.scheduler.get_job(command.job_id)
+                        .next_run_time).is_equal_to(next_run_time)
+        finally:
+            base_impl.scheduler.shutdown()
+
+    def test_schedule_store_owner(self, tmpdir):
+        kls = create_concrete_class()
+        config = {'path': str(tmpdir.join('schedule.db'))}
+        named = kls(schedule_store=config)
+        named.name = 'slack.0'
+        explicit = kls(schedule_store=dict(config, owner='spam'))
+        unnamed = kls(schedule_store=config)
+
+        for bot in (named, explicit, unnamed):
+            with patch.object(bot, 'connect', return_value=None), \
+                    patch.object(bot, 'stop', return_value=None):
+                bot.run()
+            bot.scheduler.shutdown()
+
+        assert_that([bot.schedule_store.owner
+                     for bot in (named, explicit, unnamed)]) \
+            .is_equal_to(['slack.0', 'spam', 'baseimpl'])
+
+    def test_schedule_leader_name(self, tmpdir):
+        kls = create_concrete_class()
+        config = {'type': "sqlite", 'path': str(tmpdir.join('lease.db'))}
+        bots = [kls(schedule_leader=config) for _ in range(3)]
+        bots[0].name = 'slack.0'
+        bots[1].name = 'gitter.0'
+
+        for bot in bots:
+            with patch.object(bot, 'connect', return_value=None), \
+                    patch.object(bot, 'stop', return_value=None):
+                bot.run()
+            bot.scheduler.shutdown()
+
+        try:
+            assert_that([bot.schedule_leader.name for bot in bots]) \
+                .is_equal_to(['slack.0', 'gitter.0', 'baseimpl'])
+            # Different bots do not compete for one lease
+            assert_that([bot.schedule_leader.is_leader for bot in bots]) \
+                .is_equal_to([True, True, True])
+        finally:
+            for bot in bots:
+                bot.schedule_leader.stop()
+
+    def test_leader_only(self, tmpdir):
+        calls = []
+        base_impl = create_concrete_class()(
+            schedule_leader={'type': "file",
+                             'path': str(tmpdir.join('sarah.lock'))})
+        base_impl.generate_schedule_job = lambda command: \
+            lambda: calls.append(command.name)
+
+        command = ScheduledCommand('spam',
+                                   lambda config: "ham",
+                                   'dummy_module_name',
+                                   {'egg': "spam"},
+                                   {'spam': "egg"})
+        base_impl.schedule_leader = create_election(
+            **base_impl.schedule_leader_config)
+        base_impl.add_schedule_jobs([command])
+        job = base_impl.scheduler.get_job(command.job_id)
+
+        # Not a leader yet
+        job.func()
+        assert_that(calls).is_empty()
+
+        base_impl.schedule_leader.renew()
+        job.func()
+        assert_that(calls).is_equal_to(['spam'])
+
+        base_impl.schedule_leader.stop()
+        job.func()
+        assert_that(calls).is_length(1)
+
 
 class TestHelp(object):
     def test_with_examples(self):
@@ -357,10 +674,71 @@ class TestHelp(object):
         with patch.object(base_impl.__class__,
                           'commands',
                           new_callable=PropertyMock) as m:
-            m.return_value = commands
+            m.return_value = CommandRegistry(commands)
             assert_that(base_impl.help()) \
                 .is_equal_to("\n".join(c.help for c in commands))
 
+    def test_cache(self):
+        base_impl = create_concrete_class()()
+        with patch.object(base_impl.__class__,
+                          'commands',
+                          new_callable=PropertyMock) as m:
+            m.return_value = CommandRegistry([Command(".spam",
+                                                      lambda msg, config: "",
+                                                      "module_name",
+                                                      {})])
+            with patch.object(base_impl,
+                              'build_help',
+                              return_value="DUMMY"):
+                assert_that(base_impl.help()).is_equal_to("DUMMY")
+                assert_that(base_impl.help()).is_equal_to("DUMMY")
+                assert_that(base_impl.build_help.call_count).is_equal_to(1)
+
+                # Registry is replaced
+                m.return_value = CommandRegistry()
+                base_impl.help()
+                assert_that(base_impl.build_help.call_count).is_equal_to(2)
+
+    def test_with_prefix_and_page(self):
+        base_impl = create_concrete_class()(help_page_size=2)
+        commands = [Command(name,
+                            lambda msg, config: "",
+                            "module_name",
+                            {}) for name in (".spam1", ".ham", ".spam2",
+                                             ".spam3", ".egg")]
+
+        with patch.object(base_impl.__class__,
+                          'commands',
+                          new_callable=PropertyMock) as m:
+            m.return_value = CommandRegistry(commands)
+
+            assert_that(base_impl.help()) \
+                .starts_with(".spam1\n.ham\n") \
+                .contains("(1/3)") \
+                .contains(".help 2")
+            assert_that(base_impl.help(page=3)) \
+                .starts_with(".egg\n") \
+                .contains("(3/3)") \
+                .contains(".help 1")
+            assert_that(base_impl.help(".spam")) \
+                .starts_with(".spam1\n.spam2\n") \
+                .contains(".help .spam 2")
+            assert_that(base_impl.help(".spam", 2)).starts_with(".spam3\n")
+            assert_that(base_impl.help(".ham")).is_equal_to(".ham")
+            assert_that(base_impl.help(".bacon")).contains("No command")
+
+            with patch.object(base_impl, 'help', return_value="DUMMY"):
+                base_impl.respond("homer", ".help .spam 2")
+                base_impl.help.assert_called_with(".spam", 2)
+                base_impl.respond("homer", ".help 3")
+                base_impl.help.assert_called_with("", 3)
+
+                # Non-decimal digits are not taken as page number
+                base_impl.respond("homer", ".help \u00b2")
+                base_impl.help.assert_called_with("\u00b2", 1)
+                base_impl.respond("homer", ".help .spam \u2460")
+                base_impl.help.assert_called_with(".spam", 1)
+
 
 class TestFindCommand(object):
     def test_valid(self):
@@ -381,7 +759,8 @@ class TestFindCommand(object):
         with patch.object(base_impl.__class__,
                           'commands',
                           new_callable=PropertyMock) as m:
-            m.return_value = [irrelevant_command, matching_command]
+            m.return_value = CommandRegistry([irrelevant_command,
+                                              matching_command])
             assert_that(base_impl.find_command(".SPAM_HAM_EGG")).is_none()
             assert_that(base_impl.find_command(".matching")) \
                 .is_equal_to(matching_command)
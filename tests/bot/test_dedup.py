@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import time
+from unittest.mock import patch
+
+from assertpy import assert_that
+
+from sarah.bot.dedup import Deduplicator
+
+
+class TestDeduplicator(object):
+    def test_seen(self):
+        deduplicator = Deduplicator()
+        assert_that(deduplicator.seen(("C1", "1.000001"))).is_false()
+        assert_that(deduplicator.seen(("C1", "1.000002"))).is_false()
+        assert_that(deduplicator.seen(("C2", "1.000001"))).is_false()
+        assert_that(deduplicator.seen(("C1", "1.000001"))).is_true()
+        assert_that(deduplicator.duplicates).is_equal_to(1)
+
+    def test_max_size(self):
+        deduplicator = Deduplicator(max_size=2)
+        for key in ("spam", "ham", "egg"):
+            deduplicator.seen(key)
+
+        assert_that(deduplicator).is_length(2)
+        assert_that(deduplicator.seen("spam")).is_false()
+        assert_that(deduplicator.seen("egg")).is_true()
+
+    def test_window(self):
+        deduplicator = Deduplicator(window=10.0)
+        with patch.object(time, 'time', return_value=100.0):
+            deduplicator.seen("spam")
+            deduplicator.seen("ham")
+        with patch.object(time, 'time', return_value=105.0):
+            deduplicator.seen("egg")
+
+        with patch.object(time, 'time', return_value=111.0):
+            assert_that(deduplicator.seen("spam")).is_false()
+            # Expired ham is dropped while spam is added again
+            assert_that(deduplicator).is_length(2)
+            assert_that(deduplicator.seen("egg")).is_true()
@@ -1,14 +1,16 @@
 # -*- coding: utf-8 -*-
 import json
+import logging
 from inspect import getfullargspec
 from unittest.mock import patch, Mock
 
 import pytest
-import requests
 from assertpy import assert_that
 from requests.models import Response
 
-from sarah.bot.gitter import GitterClient, Gitter, ConnectAttemptionCounter
+from sarah.bot.gitter import GitterClient, Gitter, ConnectAttemptionCounter, \
+    SarahGitterException
+from sarah.bot.values import ScheduledCommand
 from sarah.value_object import ObjectMapper
 
 room_info = [{'unreadItems': 0,
@@ -115,29 +117,28 @@ class TestGitterClient(object):
 
     def test_request(self, client):
         response = Mock(spec=Response)
-        with patch.object(requests,
+        response.content = json.dumps(room_info).encode('utf-8')
+        with patch.object(client.session,
                           "request",
                           return_value=response):
             mapper = ObjectMapper(GitterClient.Room)
-            with patch.object(response.content,
-                              "decode",
-                              return_value=json.dumps(room_info)):
-                ret = client.request("GET",
-                                     "http://localhost/rooms",
-                                     ObjectMapper(GitterClient.Room),
-                                     {'param': "spam"},
-                                     {'body': "ham"})
-                method, endpoint = requests.request.call_args[0]
-                kwargs = requests.request.call_args[1]
-                assert_that(ret).is_equal_to([mapper.map(obj)
-                                              for obj in room_info])
-                assert_that(method).is_equal_to("GET")
-                assert_that(endpoint).is_equal_to("http://localhost/rooms")
-                assert_that(kwargs['params']).is_equal_to({'param': "spam"})
-                assert_that(kwargs['json']).is_equal_to({'body': "ham"})
-                assert_that(kwargs['headers']['Authorization']).is_not_empty()
-                assert_that(kwargs['headers']['Accept']).is_not_empty()
-                assert_that(kwargs['headers']['Content-Type']).is_not_empty()
+            ret = client.request("GET",
+                                 "http://localhost/rooms",
+                                 ObjectMapper(GitterClient.Room),
+                                 {'param': "spam"},
+                                 {'body': "ham"})
+            method, endpoint = client.session.request.call_args[0]
+            kwargs = client.session.request.call_args[1]
+            assert_that(ret).is_equal_to([mapper.map(obj)
+                                          for obj in room_info])
+            assert_that(method).is_equal_to("GET")
+            assert_that(endpoint).is_equal_to("http://localhost/rooms")
+            assert_that(kwargs['params']).is_equal_to({'param': "spam"})
+            assert_that(json.loads(kwargs['data'].decode('utf-8'))) \
+                .is_equal_to({'body': "ham"})
+            assert_that(kwargs['headers']['Authorization']).is_not_empty()
+            assert_that(kwargs['headers']['Accept']).is_not_empty()
+            assert_that(kwargs['headers']['Content-Type']).is_not_empty()
 
     def test_room(self):
         orig_data = room_info[0]
@@ -223,6 +224,12 @@ class TestGitter(object):
             .has_stream_base_url("https://stream.gitter.im/v1/")
         assert_that(gitter.client).is_instance_of(GitterClient)
 
+    def test_pool_size(self):
+        for workers, pool_size in ((None, 10), (0, 10), (24, 24)):
+            gitter = Gitter("dummy_token", broadcast_workers=workers)
+            adapter = gitter.client.session.get_adapter('https://gitter.im')
+            assert_that(adapter._pool_maxsize).is_equal_to(pool_size)
+
     def test_generate_endpoint(self, gitter):
         endpoint = gitter.generate_endpoint("dummy")
         assert_that(endpoint).starts_with("http")
@@ -242,3 +249,60 @@ class TestGitter(object):
                                   return_value=None):
                     gitter.connect()
                     assert_that(gitter.connect_room.call_count).is_equal_to(1)
+
+    def test_resolve_room_id(self, gitter):
+        room = ObjectMapper(GitterClient.Room).map(room_info[0])
+        with patch.object(gitter.client,
+                          "get_rooms",
+                          return_value=[room]):
+            assert_that(gitter.resolve_room_id("spam/ham/egg")) \
+                .is_equal_to(room.id)
+            assert_that(gitter.resolve_room_id(room.id)) \
+                .is_equal_to(room.id)
+
+            # Directory is not fetched again within a minute
+            with pytest.raises(SarahGitterException):
+                gitter.resolve_room_id("unknown")
+            assert_that(gitter.client.get_rooms.call_count).is_equal_to(1)
+
+
+class TestGenerateScheduleJob(object):
+    @pytest.fixture(scope='function')
+    def gitter(self, request):
+        return Gitter("dummy_token")
+
+    def test_missing_room_settings(self, gitter):
+        with patch.object(logging, 'warning') as warning:
+            ret = gitter.generate_schedule_job(
+                ScheduledCommand("name",
+                                 lambda _: "dummy",
+                                 "module_name",
+                                 {},
+                                 {}))
+
+            assert_that(warning.call_count).is_equal_to(1)
+            assert_that(ret).is_none()
+
+    def test_valid_settings(self, gitter):
+        room = ObjectMapper(GitterClient.Room).map(room_info[0])
+        gitter.update_room_directory([room])
+        calls = []
+
+        ret = gitter.generate_schedule_job(
+            ScheduledCommand("name",
+                             lambda _: calls.append(1) or "dummy",
+                             "module_name",
+                             {},
+                             {'rooms': ("spam/ham/egg", "other_room_id")}))
+
+        with patch.object(gitter.client, "post_message") as post_message:
+            with patch.object(gitter.client, "get_rooms", return_value=[]):
+                with patch.object(logging, 'error') as error:
+                    ret()
+
+                    # Result is computed once for all rooms
+                    assert_that(calls).is_length(1)
+                    assert_that(post_message.call_count).is_equal_to(1)
+                    assert_that(post_message.call_args[0]) \
+                        .is_equal_to((room.id, "dummy"))
+                    assert_that(error.call_count).is_equal_to(1)
@@ -172,10 +172,10 @@ class TestGenerateScheduleJob(object):
         assert_that(inspect.isfunction(ret)).is_true()
 
         with patch.object(hipchat,
-                          "enqueue_sending_message",
+                          "enqueue_scheduled_message",
                           return_value=Future()):
             ret()
-            assert_that(hipchat.enqueue_sending_message.call_count) \
+            assert_that(hipchat.enqueue_scheduled_message.call_count) \
                 .is_equal_to(1)
 
 
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import logging
+import sys
+from unittest.mock import patch, MagicMock
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from assertpy import assert_that
+
+from sarah.bot import Base
+from sarah.bot.host import Host
+from sarah.bot.values import CommandMessage, ScheduledCommand
+
+# Referred by plugin module that is dynamically generated in tests
+HOSTED_CLASS = type('HostedImpl',
+                    (Base,),
+                    {'connect': lambda self: None,
+                     'generate_schedule_job':
+                         lambda self, command: lambda: None})
+
+PLUGIN_SOURCE = "\n".join((
+    "from {0} import HOSTED_CLASS".format(__name__),
+    "LOAD_COUNT = globals().get('LOAD_COUNT', 0) + 1",
+    "@HOSTED_CLASS.command('.hosted')",
+    "def hosted(msg, config):",
+    "    return config.get('reply', 'default')",
+    ""))
+
+
+class TestHost(object):
+    def setup_method(self, method):
+        self.module_name = 'hosted_dummy_plugin'
+
+    def teardown_method(self, method):
+        sys.modules.pop(self.module_name, None)
+
+    def create_plugin(self, tmpdir):
+        tmpdir.join(self.module_name + '.py').write(PLUGIN_SOURCE)
+        sys.path.insert(0, str(tmpdir))
+
+    def test_module_names(self):
+        host = Host([('spam', HOSTED_CLASS(plugins=[("ham",), ("egg",)])),
+                     ('bacon', HOSTED_CLASS(plugins=[("egg",),
+                                                     ("sausage",)]))])
+        assert_that(host.module_names) \
+            .is_equal_to(["ham", "egg", "sausage"])
+
+    def test_load_plugins(self, tmpdir):
+        self.create_plugin(tmpdir)
+        try:
+            first = HOSTED_CLASS(plugins=[(self.module_name,
+                                           {'reply': "first"})])
+            second = HOSTED_CLASS(plugins=[(self.module_name,
+                                            {'reply': "second"})])
+            other = HOSTED_CLASS(plugins=[("other_dummy_module",)])
+            host = Host([('first', first),
+                         ('second', second),
+                         ('other', other)])
+
+            with patch.object(Base,
+                              'load_plugin',
+                              wraps=Base.load_plugin) as load_plugin:
+                with patch.object(logging, 'warning', return_value=None):
+                    host.load_plugins()
+
+                # Once for each distinct module
+                assert_that(load_plugin.call_count).is_equal_to(2)
+
+            assert_that(sys.modules[self.module_name].LOAD_COUNT) \
+                .is_equal_to(1)
+
+            # Registries are scoped per instance
+            msg = CommandMessage(".hosted", "", "homer")
+            assert_that(first.commands).is_length(1)
+            assert_that(first.commands[0](msg)).is_equal_to("first")
+            assert_that(second.commands).is_length(1)
+            assert_that(second.commands[0](msg)).is_equal_to("second")
+            assert_that(other.commands).is_empty()
+        finally:
+            sys.path.remove(str(tmpdir))
+
+    def test_load_package(self, tmpdir):
+        package = tmpdir.mkdir('hosted_dummy_package')
+        package.join('__init__.py').write("from . import sub\n")
+        package.join('sub.py').write(PLUGIN_SOURCE)
+        sys.path.insert(0, str(tmpdir))
+        try:
+            bot = HOSTED_CLASS(plugins=[('hosted_dummy_package',
+                                         {'reply': "spam"})])
+            bot.load_plugins()
+
+            # Submodules provide commands without their own configuration
+            assert_that([(c.name, c.module_name, c.config)
+                         for c in bot.commands]) \
+                .is_equal_to([('.hosted', 'hosted_dummy_package.sub', {})])
+        finally:
+            sys.path.remove(str(tmpdir))
+            sys.modules.pop('hosted_dummy_package', None)
+            sys.modules.pop('hosted_dummy_package.sub', None)
+
+    def test_share_resources(self):
+        bot = HOSTED_CLASS()
+        scheduler = MagicMock(spec=BackgroundScheduler)
+        bot.share_resources("spam", scheduler, None)
+
+        command = ScheduledCommand("name",
+                                   lambda config: "ham",
+                                   "module_name",
+                                   {},
+                                   {})
+        assert_that(bot.schedule_job_id(command)) \
+            .is_equal_to("spam/module_name.name")
+
+        bot.message_worker = MagicMock()
+        bot.stop()
+
+        # Shared scheduler is not stopped by the bot
+        assert_that(scheduler.shutdown.called).is_false()
+        assert_that(bot.message_worker.shutdown.called).is_true()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import socket
+import threading
+from unittest.mock import patch, MagicMock
+
+import pytest
+from assertpy import assert_that
+
+from sarah.bot import Base
+from sarah.bot.ingest import IngestServer, IngestClient, IngestHandler, \
+    encode_response
+from sarah.bot.slack import SlackMessage, MessageAttachment, AttachmentField
+from sarah.bot.values import Command
+from sarah.exceptions import SarahException
+
+INGEST_CLASS = type('IngestImpl',
+                    (Base,),
+                    {'connect': lambda self: None,
+                     'generate_schedule_job':
+                         lambda self, command: lambda: None})
+
+
+def echo(msg, config):
+    return msg.text
+
+
+class TestEncodeResponse(object):
+    def test_str(self):
+        line = encode_response("1", "C1", "spam")
+        assert_that(line[-1:]).is_equal_to(b"\n")
+        assert_that(json.loads(line.decode('utf-8'))) \
+            .is_equal_to({'id': "1",
+                          'channel': "C1",
+                          'response': "spam",
+                          'rich': None})
+
+    def test_none(self):
+        line = encode_response(None, "C1", None)
+        assert_that(json.loads(line.decode('utf-8'))['response']).is_none()
+
+    def test_rich(self):
+        message = SlackMessage(
+            text="spam",
+            attachments=[MessageAttachment(
+                fallback="ham",
+                title="egg",
+                fields=[AttachmentField(title="bacon", value="sausage")])])
+        line = encode_response("1", "C1", message)
+
+        decoded = json.loads(line.decode('utf-8'))
+        assert_that(decoded['response']).is_equal_to("spam")
+        assert_that(decoded['rich']['attachments']) \
+            .is_equal_to([{'fallback': "ham",
+                           'title': "egg",
+                           'fields': [{'title': "bacon",
+                                       'value': "sausage"}]}])
+
+
+class TestIngestHandler(object):
+    def test_reply_after_disconnect(self):
+        handler = IngestHandler.__new__(IngestHandler)
+        handler.wfile = MagicMock()
+        handler.wfile.write.side_effect = BrokenPipeError
+
+        with patch.object(logging, 'warning', return_value=None) as warning:
+            handler.reply(threading.Lock(), "1", "C1", "spam")
+            assert_that(warning.call_count).is_equal_to(1)
+
+
+class TestIngestServer(object):
+    def test_stale_socket(self, tmpdir):
+        path = str(tmpdir.join('sarah.sock'))
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+
+        server = IngestServer(INGEST_CLASS(), path)
+        server.server_close()
+
+    def test_non_socket(self, tmpdir):
+        path = tmpdir.join('sarah.sock')
+        path.write("spam")
+
+        with pytest.raises(SarahException):
+            IngestServer(INGEST_CLASS(), str(path))
+        assert_that(path.read()).is_equal_to("spam")
+
+    def test_dispatch(self, tmpdir):
+        path = str(tmpdir.join('sarah.sock'))
+        bot = INGEST_CLASS(ingest_socket=path)
+        bot.register_command(Command('.echo', echo, __name__, {}))
+
+        server = IngestServer(bot, path)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        client = IngestClient(path)
+        try:
+            client.send('C1', 'U1', '.echo spam', event_id=1)
+            client.socket.sendall(b"not json\n")
+            client.send('C2', 'U2', '.unknown', event_id=2)
+            client.send('C1', 'U1', '.echo ham', event_id=3)
+
+            responses = [client.receive() for _ in range(3)]
+            assert_that([r['id'] for r in responses]).is_equal_to([1, 2, 3])
+            assert_that([r['response'] for r in responses]) \
+                .is_equal_to(['spam', None, 'ham'])
+            assert_that(responses[1]['channel']).is_equal_to('C2')
+        finally:
+            client.close()
+            server.shutdown()
+            server.server_close()
+
+        assert_that(tmpdir.join('sarah.sock').check()).is_false()
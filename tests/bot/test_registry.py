@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+
+from assertpy import assert_that
+
+from sarah.bot.registry import Registry, CommandRegistry
+from sarah.bot.values import Command, CommandMessage
+
+Item = namedtuple('Item', ('name', 'value'))
+
+
+def create_command(name, examples=None):
+    return Command(name,
+                   lambda msg, config: name,
+                   "module_name",
+                   {},
+                   examples)
+
+
+class TestRegistry(object):
+    def test_init(self):
+        registry = Registry([Item("spam", 1), Item("ham", 2), Item("spam", 3)])
+
+        assert_that(registry).is_length(2)
+        assert_that(registry[0]).is_equal_to(Item("spam", 3))
+        assert_that(registry.index_of("ham")).is_equal_to(1)
+        assert_that(registry.index_of("egg")).is_none()
+        assert_that(registry.get("ham")).is_equal_to(Item("ham", 2))
+        assert_that(registry.get("egg")).is_none()
+
+    def test_updated(self):
+        registry = Registry([Item("spam", 1), Item("ham", 2)])
+
+        replaced = registry.updated(Item("spam", 3))
+        assert_that(replaced).is_not_same_as(registry)
+        assert_that(list(replaced)).is_equal_to([Item("spam", 3),
+                                                 Item("ham", 2)])
+
+        appended = registry.updated(Item("egg", 4))
+        assert_that(list(appended)).is_equal_to([Item("spam", 1),
+                                                 Item("ham", 2),
+                                                 Item("egg", 4)])
+
+        # Original stays as it is
+        assert_that(list(registry)).is_equal_to([Item("spam", 1),
+                                                 Item("ham", 2)])
+
+    def test_updated_shares_storage(self):
+        registry = Registry([Item("spam", 1)])
+        appended = registry.updated(Item("ham", 2))
+        appended_again = appended.updated(Item("egg", 3))
+
+        # Older snapshots do not see items appended later
+        assert_that(list(registry)).is_equal_to([Item("spam", 1)])
+        assert_that(registry.get("ham")).is_none()
+        assert_that(list(appended)).is_equal_to([Item("spam", 1),
+                                                 Item("ham", 2)])
+        assert_that(appended.get("egg")).is_none()
+        assert_that(appended[-1]).is_equal_to(Item("ham", 2))
+        assert_that(appended_again.index_of("egg")).is_equal_to(2)
+
+        # Appending to an older snapshot does not affect newer ones
+        branched = registry.updated(Item("bacon", 4))
+        assert_that(list(branched)).is_equal_to([Item("spam", 1),
+                                                 Item("bacon", 4)])
+        assert_that(appended_again[1]).is_equal_to(Item("ham", 2))
+        assert_that(appended_again.get("bacon")).is_none()
+
+    def test_command_registry_updated(self):
+        registry = CommandRegistry([create_command(".spam")])
+        assert_that(registry.find(".ham")).is_none()
+
+        appended = registry.updated(create_command(".ham"))
+        assert_that(appended).is_instance_of(CommandRegistry)
+        assert_that(appended.find(".ham").name).is_equal_to(".ham")
+        assert_that(registry.find(".ham")).is_none()
+        assert_that(appended.help).contains(".ham")
+
+
+class TestCommandRegistry(object):
+    def test_find(self):
+        registry = CommandRegistry([create_command(".count"),
+                                    create_command(".c"),
+                                    create_command(".reset_count")])
+
+        assert_that(registry.find(".count beer").name).is_equal_to(".count")
+        assert_that(registry.find(".cat").name).is_equal_to(".c")
+        assert_that(registry.find(".reset_count").name) \
+            .is_equal_to(".reset_count")
+        assert_that(registry.find(".spam")).is_none()
+        assert_that(registry.find("")).is_none()
+
+    def test_find_respects_registration_order(self):
+        registry = CommandRegistry([create_command(".c"),
+                                    create_command(".count")])
+
+        found = registry.find(".count beer")
+        assert_that(found.name).is_equal_to(".c")
+        assert_that(found(CommandMessage(".count beer", "", "homer"))) \
+            .is_equal_to(".c")
+
+    def test_with_prefix(self):
+        registry = CommandRegistry([create_command(".spam"),
+                                    create_command(".egg"),
+                                    create_command(".spam_ham"),
+                                    create_command(".sp")])
+
+        assert_that([c.name for c in registry.with_prefix(".spam")]) \
+            .is_equal_to([".spam", ".spam_ham"])
+        assert_that([c.name for c in registry.with_prefix(".s")]) \
+            .is_equal_to([".spam", ".spam_ham", ".sp"])
+        assert_that(registry.with_prefix(".bacon")).is_empty()
+
+    def test_help(self):
+        commands = [create_command(".spam", [".spam ham"]),
+                    create_command(".egg")]
+        registry = CommandRegistry(commands)
+
+        assert_that(registry.help) \
+            .is_equal_to("\n".join(c.help for c in commands))
+        assert_that(CommandRegistry().help).is_empty()
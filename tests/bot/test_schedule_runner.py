@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from unittest.mock import patch, Mock
+
+from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_EXECUTED
+from assertpy import assert_that
+
+from sarah.bot.schedule_runner import ScheduleRunner
+
+
+class TestScheduleRunner(object):
+    def test_without_executor(self):
+        runner = ScheduleRunner()
+        calls = []
+        runner.wrap('spam', lambda: calls.append(1))()
+
+        assert_that(calls).is_length(1)
+        assert_that(runner.stats['spam'].runs).is_equal_to(1)
+
+    def test_with_executor(self):
+        executor = ThreadPoolExecutor(max_workers=2)
+        runner = ScheduleRunner(executor)
+        started = threading.Event()
+        blocker = threading.Event()
+
+        def job():
+            started.set()
+            blocker.wait(5)
+
+        wrapper = runner.wrap('spam', job)
+        try:
+            # Returns without waiting for the job
+            wrapper()
+            assert_that(started.wait(5)).is_true()
+
+            # Previous run is still running
+            with patch.object(logging, 'warning'):
+                wrapper()
+            assert_that(runner.stats['spam'].overlaps).is_equal_to(1)
+        finally:
+            blocker.set()
+            executor.shutdown(wait=True)
+
+        assert_that(runner.stats['spam'].runs).is_equal_to(1)
+
+    def test_max_instances(self):
+        executor = ThreadPoolExecutor(max_workers=3)
+        runner = ScheduleRunner(executor)
+        started = threading.Semaphore(0)
+        blocker = threading.Event()
+
+        def job():
+            started.release()
+            blocker.wait(5)
+
+        wrapper = runner.wrap('spam', job, max_instances=2)
+        try:
+            wrapper()
+            wrapper()
+            assert_that(started.acquire(timeout=5)).is_true()
+            assert_that(started.acquire(timeout=5)).is_true()
+
+            with patch.object(logging, 'warning'):
+                wrapper()
+            assert_that(runner.stats['spam'].overlaps).is_equal_to(1)
+        finally:
+            blocker.set()
+            executor.shutdown(wait=True)
+
+        assert_that(runner.stats['spam'].runs).is_equal_to(2)
+
+    def test_concurrent_stats(self):
+        executor = ThreadPoolExecutor(max_workers=8)
+        runner = ScheduleRunner(executor)
+        wrapper = runner.wrap('spam', lambda: None, max_instances=1000)
+        try:
+            for _ in range(1000):
+                wrapper()
+        finally:
+            executor.shutdown(wait=True)
+
+        assert_that(runner.stats['spam'].as_dict()) \
+            .contains_entry({'runs': 1000}) \
+            .contains_entry({'overlaps': 0})
+
+    def test_error(self):
+        runner = ScheduleRunner()
+
+        def job():
+            raise Exception("failed")
+
+        wrapper = runner.wrap('spam', job)
+        with patch.object(logging, 'error'):
+            wrapper()
+            wrapper()
+
+        assert_that(runner.stats['spam'].errors).is_equal_to(2)
+
+    def test_on_event(self):
+        runner = ScheduleRunner()
+        runner.wrap('spam', lambda: None)
+        scheduled = datetime.now(timezone.utc) - timedelta(seconds=3)
+
+        with patch.object(logging, 'warning'):
+            runner.on_event(Mock(code=EVENT_JOB_MISSED,
+                                 job_id='spam',
+                                 scheduled_run_time=scheduled))
+        runner.on_event(Mock(code=EVENT_JOB_EXECUTED,
+                             job_id='spam',
+                             scheduled_run_time=scheduled))
+        runner.on_event(Mock(code=EVENT_JOB_EXECUTED,
+                             job_id='other_bot_job',
+                             scheduled_run_time=scheduled))
+
+        stats = runner.stats['spam']
+        assert_that(stats.misfires).is_equal_to(1)
+        assert_that(stats.max_lateness).is_between(2.5, 10)
+        assert_that(runner.stats).does_not_contain_key('other_bot_job')
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import os
+import threading
+from collections import Counter
+from unittest.mock import patch
+
+import pytest
+from assertpy import assert_that
+
+from sarah.bot import Base
+from sarah.bot.shard import HashRing, ShardRouter, SarahShardException, \
+    run_shard
+from sarah.bot.values import Command, UserContext, InputOption
+
+SHARDED_CLASS = type('ShardedImpl',
+                     (Base,),
+                     {'connect': lambda self: None,
+                      'generate_schedule_job':
+                          lambda self, command: lambda: None})
+
+
+def pid(msg, config):
+    return str(os.getpid())
+
+
+def fail(msg, config):
+    raise Exception('failed')
+
+
+def unpicklable(msg, config):
+    return threading.Lock()
+
+
+def crash(msg, config):
+    os._exit(1)
+
+
+def ask(msg, config):
+    return UserContext("Sure?",
+                       "Input YES",
+                       [InputOption("YES", pid)])
+
+
+def ask_unpicklable(msg, config):
+    return UserContext("Sure?",
+                       "Input YES",
+                       [InputOption("YES", lambda m, c: "OK")])
+
+
+class TestHashRing(object):
+    def test_stable(self):
+        ring = HashRing(range(4))
+        keys = ['C%05d' % i for i in range(100)]
+        assert_that([ring.get(k) for k in keys]) \
+            .is_equal_to([HashRing(range(4)).get(k) for k in keys])
+
+    def test_distribution(self):
+        ring = HashRing(range(4))
+        counts = Counter(ring.get('C%05d' % i) for i in range(1000))
+        assert_that(sorted(counts.keys())).is_equal_to([0, 1, 2, 3])
+        assert_that(min(counts.values())).is_greater_than(100)
+
+    def test_minimal_remap(self):
+        keys = ['C%05d' % i for i in range(1000)]
+        four = HashRing(range(4))
+        five = HashRing(range(5))
+        moved = [k for k in keys if four.get(k) != five.get(k)]
+
+        # Only keys taken by the new node move
+        assert_that([five.get(k) for k in moved]).contains_only(4)
+
+
+class TestRunShard(object):
+    def test_watch_plugins(self):
+        bot = SHARDED_CLASS(plugins=[('spam',)], plugin_watch_interval=3)
+        bot.stage_registries([])
+        bot.commit_registries()
+
+        requests, writer = multiprocessing.Pipe(duplex=False)
+        writer.close()
+        with patch('sarah.bot.shard.ModuleWatcher') as watcher:
+            run_shard(bot, requests, None)
+
+        # Each worker reloads its own copy of plugins
+        assert_that(list(watcher.call_args[0][0])).is_equal_to(['spam'])
+        assert_that(watcher.call_args[0][1]).is_equal_to(bot.reload_plugins)
+        assert_that(watcher.return_value.start.call_count).is_equal_to(1)
+
+
+class TestShardRouter(object):
+    @pytest.fixture
+    def router(self):
+        bot = SHARDED_CLASS()
+        for name, function in (('.pid', pid),
+                               ('.fail', fail),
+                               ('.lock', unpicklable),
+                               ('.crash', crash),
+                               ('.ask', ask),
+                               ('.confirm', ask_unpicklable)):
+            bot.register_command(Command(name, function, __name__, {}))
+
+        router = ShardRouter(bot, 2)
+        router.start()
+        yield router
+        router.stop()
+
+    def test_route_by_channel(self, router):
+        results = [router.submit('C%05d' % (i % 10), 'U%05d' % i, '.pid')
+                   for i in range(50)]
+        pids = [f.result(timeout=10) for f in results]
+
+        # Same channel is always handled by the same process
+        for i in range(10):
+            assert_that(set(pids[i::10])).is_length(1)
+        assert_that(set(pids)).is_length(2)
+        assert_that(pids).does_not_contain(str(os.getpid()))
+
+    def test_conversation(self, router):
+        channels = ['C%05d' % i for i in range(10)]
+        shards = {router.ring.get(c): c for c in channels}
+        assert_that(shards).is_length(2)
+
+        assert_that(router.submit(shards[0], 'U1', '.ask')
+                    .result(timeout=10)).is_equal_to("Sure?")
+        assert_that(router.bot.user_context_map).contains_key('U1')
+
+        # Conversation continues in the channel handled by the other worker
+        pid = router.submit(shards[1], 'U1', 'YES').result(timeout=10)
+        assert_that(pid).is_equal_to(router.submit(shards[1], 'U2', '.pid')
+                                     .result(timeout=10))
+        assert_that(router.bot.user_context_map).does_not_contain_key('U1')
+
+    def test_restart(self, router):
+        before = router.submit('C1', 'U1', '.pid').result(timeout=10)
+
+        future = router.submit('C1', 'U1', '.crash')
+        with pytest.raises(SarahShardException) as e:
+            future.result(timeout=10)
+        assert_that(str(e.value)).contains('exited with code 1')
+
+        after = router.submit('C1', 'U1', '.pid').result(timeout=10)
+        assert_that(after).is_not_equal_to(before)
+        assert_that(router.restart_count).is_equal_to(1)
+        assert_that(router.pids).contains(int(after))
+
+    def test_error(self, router):
+        future = router.submit('C1', 'U1', '.fail')
+        assert_that(future.result(timeout=10)) \
+            .contains("Something went wrong")
+
+        future = router.submit('C1', 'U1', '.lock')
+        with pytest.raises(SarahShardException):
+            future.result(timeout=10)
+
+        future = router.submit('C1', 'U1', '.confirm')
+        with pytest.raises(SarahShardException):
+            future.result(timeout=10)
+        assert_that(router.bot.user_context_map).does_not_contain_key('U1')
+
+
+class TestDispatch(object):
+    def test_without_shard(self):
+        bot = SHARDED_CLASS()
+        bot.register_command(Command('.pid', pid, __name__, {}))
+
+        results = []
+        assert_that(bot.dispatch('C1', 'U1', '.pid', results.append)).is_none()
+        assert_that(results).is_equal_to([str(os.getpid())])
+
+    def test_with_shard(self):
+        bot = SHARDED_CLASS(shards=2)
+        bot.register_command(Command('.pid', pid, __name__, {}))
+        bot.shard_router = ShardRouter(bot, 2)
+        bot.shard_router.start()
+
+        done = threading.Event()
+        results = []
+
+        def callback(ret):
+            results.append(ret)
+            done.set()
+
+        try:
+            bot.dispatch('C1', 'U1', '.pid', callback)
+            assert_that(done.wait(10)).is_true()
+            assert_that(results).is_length(1)
+            assert_that(results[0]).is_not_equal_to(str(os.getpid()))
+        finally:
+            bot.shard_router.stop()
@@ -2,19 +2,20 @@
 import inspect
 import json
 import logging
+from collections import deque
+import threading
 import time
 from concurrent.futures import Future
 from unittest.mock import patch, MagicMock, Mock
 
 import pytest
-import requests
 from assertpy import assert_that
 from requests.models import Response
 from websocket import WebSocketApp  # type: ignore
 
 import sarah
 from sarah.bot.slack import Slack, SlackClient, SarahSlackException, \
-    SlackMessage, AttachmentField, MessageAttachment
+    SlackMessage, AttachmentField, MessageAttachment, SlackDirectory
 from sarah.bot.values import ScheduledCommand
 
 
@@ -57,20 +58,19 @@ class TestSlackClient(object):
 
     def test_requet(self, client):
         response = Mock(spec=Response)
-        with patch.object(requests,
+        response.content = json.dumps({'ok': True}).encode('utf-8')
+        with patch.object(client.session,
                           "request",
                           return_value=response):
-            with patch.object(response.content,
-                              "decode",
-                              return_value=json.dumps({'ok': True})):
-                ret = client.request("GET", "api.test", {'key': "val"})
-                assert_that(requests.request.call_count).is_equal_to(1)
-                assert_that(ret).is_equal_to({'ok': True})
+            ret = client.request("GET", "api.test", {'key': "val"})
+            assert_that(client.session.request.call_count) \
+                .is_equal_to(1)
+            assert_that(ret).is_equal_to({'ok': True})
 
     def test_request_exception(self, client):
         logging.error = MagicMock()
         with pytest.raises(Exception):
-            with patch.object(requests,
+            with patch.object(client.session,
                               "request",
                               side_effect=Exception):
                 client.request("GET", "api.test")
@@ -116,6 +116,150 @@ class TestSlackMessage(object):
         p = instance.to_request_params()
         assert_that(p['attachments'][0]).is_instance_of(str)
 
+    def test_request_params_memoized(self, instance):
+        with patch.object(sarah.json_codec,
+                          'dumps',
+                          wraps=sarah.json_codec.dumps) as mock_dumps:
+            p1 = instance.to_request_params()
+            p1['channel'] = "C1"
+            p2 = instance.to_request_params()
+
+            assert_that(mock_dumps.call_count).is_equal_to(1)
+            assert_that(p2).does_not_contain_key('channel')
+            assert_that(p2['attachments']).is_same_as(p1['attachments'])
+
+
+class TestSlackDirectory(object):
+    @pytest.fixture(scope='function')
+    def directory(self, request):
+        directory = SlackDirectory()
+        directory.load({'users': [{'id': "U1", 'name': "spam"}],
+                        'channels': [{'id': "C1", 'name': "general"}],
+                        'groups': [{'id': "G1", 'name': "secret"}]})
+        return directory
+
+    def test_lookup(self, directory):
+        assert_that(directory.user("U1")).contains_entry({'name': "spam"})
+        assert_that(directory.user("@spam")).contains_entry({'id': "U1"})
+        assert_that(directory.channel("#general")) \
+            .contains_entry({'id': "C1"})
+        assert_that(directory.channel("secret")).contains_entry({'id': "G1"})
+        assert_that(directory.channel("random")).is_none()
+
+    def test_apply(self, directory):
+        directory.apply({'type': "team_join",
+                         'user': {'id': "U2", 'name': "ham"}})
+        directory.apply({'type': "user_change",
+                         'user': {'id': "U1", 'name': "egg"}})
+        assert_that(directory.user("ham")).contains_entry({'id': "U2"})
+        assert_that(directory.user("egg")).contains_entry({'id': "U1"})
+        assert_that(directory.user("spam")).is_none()
+
+        directory.apply({'type': "channel_rename",
+                         'channel': {'id': "C1", 'name': "lobby"}})
+        directory.apply({'type': "channel_archive", 'channel': "C1"})
+        assert_that(directory.channel("lobby")) \
+            .contains_entry({'id': "C1"}) \
+            .contains_entry({'is_archived': True})
+        assert_that(directory.channel("general")).is_none()
+
+        directory.apply({'type': "group_left", 'channel': "G1"})
+        assert_that(directory.channel("secret")).is_none()
+
+    def test_refresh(self, directory):
+        fetch = MagicMock(return_value={
+            'users': [],
+            'channels': [{'id': "C2", 'name': "random"}]})
+        directory.fetch = fetch
+        directory.min_refresh_interval = 60.0
+        now = directory.updated_at
+
+        # Miss right after loading does not fetch
+        assert_that(directory.channel("random")).is_none()
+        assert_that(fetch.call_count).is_zero()
+
+        # Miss after min_refresh_interval fetches
+        with patch.object(time, 'time', return_value=now + 61):
+            assert_that(directory.channel("random")).is_not_none()
+        assert_that(fetch.call_count).is_equal_to(1)
+
+        # Hit fetches only when TTL passed
+        with patch.object(time, 'time', return_value=now + 120):
+            directory.channel("random")
+        assert_that(fetch.call_count).is_equal_to(1)
+        with patch.object(time, 'time', return_value=now + 61 + 3601):
+            directory.channel("random")
+        assert_that(fetch.call_count).is_equal_to(2)
+
+    def test_refresh_error(self, directory):
+        directory.fetch = MagicMock(side_effect=Exception)
+        assert_that(directory.refresh()).is_false()
+        assert_that(directory.channel("general")).is_not_none()
+
+    def test_refresh_without_lock(self, directory):
+        fetching = threading.Event()
+        release = threading.Event()
+
+        def fetch():
+            fetching.set()
+            release.wait(5)
+            return {'users': [], 'channels': [{'id': "C2", 'name': "random"}]}
+
+        directory.fetch = fetch
+        thread = threading.Thread(target=directory.refresh)
+        thread.start()
+        try:
+            assert_that(fetching.wait(5)).is_true()
+
+            # Directory is available while fetching
+            directory.apply({'type': "team_join",
+                             'user': {'id': "U2", 'name': "ham"}})
+            assert_that(directory.user("ham")).is_not_none()
+            assert_that(directory.channel("general")).is_not_none()
+
+            # Fetched only once at a time
+            assert_that(directory.refresh()).is_false()
+        finally:
+            release.set()
+            thread.join(5)
+
+        assert_that(directory.channel("random")).is_not_none()
+        assert_that(directory.channel("general")).is_none()
+
+
+class TestFetchDirectory(object):
+    def test_pagination(self):
+        slack = Slack(token='spam_ham_egg')
+        pages = {
+            ('users.list', None): {'ok': True,
+                                   'members': [{'id': "U1"}],
+                                   'response_metadata': {'next_cursor': "a"}},
+            ('users.list', "a"): {'ok': True,
+                                  'members': [{'id': "U2"}],
+                                  'response_metadata': {'next_cursor': ""}},
+            ('channels.list', None): {'ok': True,
+                                      'channels': [{'id': "C1"}]},
+            ('groups.list', None): {'ok': True, 'groups': [{'id': "G1"}]}}
+
+        def get(method, params):
+            return pages[(method, params.get('cursor', None))]
+
+        with patch.object(slack.client, 'get', side_effect=get):
+            directory = slack.fetch_directory()
+
+        assert_that(directory).is_equal_to({
+            'users': [{'id': "U1"}, {'id': "U2"}],
+            'channels': [{'id': "C1"}],
+            'groups': [{'id': "G1"}]})
+
+    def test_error(self):
+        slack = Slack(token='spam_ham_egg')
+        response = {'ok': False, 'error': "missing_scope"}
+        with patch.object(slack.client, 'get', return_value=response):
+            with pytest.raises(SarahSlackException) as e:
+                slack.fetch_directory()
+        assert_that(str(e.value)).contains("missing_scope")
+
 
 class TestInit(object):
     def test_init(self):
@@ -133,6 +277,16 @@ class TestInit(object):
             .has_ws(None) \
             .has_connect_attempt_count(0)
 
+    def test_pool_size(self):
+        for workers, pool_size in (((None, None), 10),
+                                   ((0, 4), 10),
+                                   ((16, 8), 24)):
+            slack = Slack(token='spam_ham_egg',
+                          broadcast_workers=workers[0],
+                          post_workers=workers[1])
+            adapter = slack.client.session.get_adapter('https://slack.com')
+            assert_that(adapter._pool_maxsize).is_equal_to(pool_size)
+
 
 class TestTryConnect(object):
     @pytest.fixture(scope='function')
@@ -172,22 +326,126 @@ class TestTryConnect(object):
 
                 assert_that(mock_connect.call_count).is_equal_to(1)
 
+    def test_ping_options(self, slack):
+        with patch.object(slack.client,
+                          'get',
+                          return_value={'url': 'ws://localhost:80/'}):
+            with patch.object(sarah.bot.slack.WebSocketApp,
+                              'run_forever',
+                              return_value=True) as mock_connect:
+                slack.try_connect()
+
+                assert_that(mock_connect.call_args[1]) \
+                    .is_equal_to({'ping_interval': 30.0,
+                                  'ping_timeout': 10.0})
+
+    def test_invalid_ping_timeout(self):
+        with pytest.raises(SarahSlackException):
+            Slack(token='spam_ham_egg',
+                  plugins=(),
+                  ping_interval=10.0,
+                  ping_timeout=10.0)
+
+    def test_load_directory(self, slack):
+        with patch.object(slack.client,
+                          'get',
+                          return_value={'url': 'ws://localhost:80/',
+                                        'self': {'id': "U0BOT",
+                                                 'name': "sarah"},
+                                        'users': [{'id': "U1",
+                                                   'name': "spam"}],
+                                        'channels': []}):
+            with patch.object(sarah.bot.slack.WebSocketApp,
+                              'run_forever',
+                              return_value=True):
+                slack.try_connect()
+
+        assert_that(slack.directory.user("spam")).is_not_none()
+        assert_that(slack.user_id).is_equal_to("U0BOT")
+
+        slack.message(None, json.dumps({'type': "channel_created",
+                                        'channel': {'id': "C1",
+                                                    'name': "general"}}))
+        assert_that(slack.resolve_channel_id("#general")).is_equal_to("C1")
+        assert_that(slack.resolve_channel_id("C2")).is_equal_to("C2")
+
+    def test_resolve_channel_id(self, slack):
+        slack.directory.load({'users': [],
+                              'channels': [{'id': "C1", 'name': "general"}]})
+        with patch.object(time, 'time', return_value=time.time() + 120), \
+                patch.object(slack.directory, 'refresh') as refresh:
+            assert_that(slack.resolve_channel_id("D024BE91L")) \
+                .is_equal_to("D024BE91L")
+            assert_that(slack.resolve_channel_id("G2")).is_equal_to("G2")
+            assert_that(refresh.call_count).is_equal_to(0)
+
+            assert_that(slack.resolve_channel_id("#general")) \
+                .is_equal_to("C1")
+            assert_that(slack.resolve_channel_id("random")) \
+                .is_equal_to("random")
+            assert_that(refresh.call_count).is_equal_to(1)
+
 
 class TestConnect(object):
     @pytest.fixture(scope='function')
     def slack(self, request):
         return Slack(token='spam_ham_egg',
                      plugins=(),
-                     max_workers=1)
+                     max_workers=1,
+                     ping_interval=0)
 
     def test_reconnection(self, slack):
         logging.error = MagicMock()
-        time.sleep = MagicMock()
-        with patch.object(slack, "try_connect", side_effect=Exception):
+        delays = []
+
+        def try_connect():
+            if len(delays) < 3:
+                raise Exception
+            elif len(delays) < 15:
+                # Connection is lost after a while
+                return
+            raise KeyboardInterrupt
+
+        with patch.object(slack, "try_connect", side_effect=try_connect), \
+                patch.object(slack.closing, "wait", side_effect=delays.append):
+            slack.connect()
+
+            assert_that(slack.try_connect.call_count).is_equal_to(16)
+            assert_that(logging.error.call_count).is_equal_to(3)
+
+        # Exponential, jittered, capped and never gives up
+        assert_that(delays[0]).is_between(0.5, 1.0)
+        assert_that(delays[2]).is_between(2.0, 4.0)
+        assert_that(max(delays)).is_less_than_or_equal_to(120.0)
+        assert_that(delays[-1]).is_between(60.0, 120.0)
+
+    def test_reset_on_hello(self, slack):
+        slack.reconnect_backoff.next_delay()
+        slack.reconnect_backoff.next_delay()
+        slack.handle_hello({'type': "hello"})
+        assert_that(slack.reconnect_backoff.attempts).is_zero()
+
+    def test_stop(self, slack):
+        with patch.object(slack, "try_connect", side_effect=slack.stop):
+            slack.connect()
+            assert_that(slack.try_connect.call_count).is_equal_to(1)
+
+    def test_interrupted_in_websocket(self, slack):
+        logging.error = MagicMock()
+
+        def try_connect():
+            slack.on_error(None, KeyboardInterrupt())
+
+        with patch.object(slack, "try_connect", side_effect=try_connect):
             slack.connect()
+            assert_that(slack.try_connect.call_count).is_equal_to(1)
 
-            assert_that(slack.try_connect.call_count).is_equal_to(10)
-            assert_that(logging.error.call_count).is_equal_to(11)
+    def test_team_migration(self, slack):
+        slack.ws = MagicMock()
+        slack.connected = True
+        slack.handle_team_migration({'type': "team_migration_started"})
+        assert_that(slack.ws.close.call_count).is_equal_to(1)
+        assert_that(slack.connected).is_false()
 
 
 class TestWsCallback(object):
@@ -259,6 +517,112 @@ class TestMessage(object):
 
         assert_that(slack.handle_message.call_count).is_equal_to(1)
 
+    def test_ignored_type(self, slack):
+        slack.handle_event = MagicMock()
+
+        slack.message(slack.ws, json.dumps({'type': "user_typing",
+                                            'channel': "C1",
+                                            'user': "U1"}))
+        slack.message(slack.ws, '{"type" : "presence_change", "user": "U1"}')
+        assert_that(slack.handle_event.call_count).is_zero()
+
+        # Nested type of ignored event does not drop handled event
+        slack.message(slack.ws, json.dumps({'text': "{\"type\": "
+                                                    "\"user_typing\"}",
+                                            'type': "message"}))
+        assert_that(slack.handle_event.call_count).is_equal_to(1)
+
+    def test_ignored_message(self, slack):
+        slack.handle_event = MagicMock()
+        slack.user_id = "U0BOT"
+
+        slack.message(slack.ws, json.dumps({'type': "message",
+                                            'channel': "C1",
+                                            'user': "U0BOT",
+                                            'text': ".echo spam"}))
+        slack.message(slack.ws, json.dumps({'type': "message",
+                                            'subtype': "bot_message",
+                                            'bot_id': "B1",
+                                            'text': "Build passed"}))
+        slack.message(slack.ws, json.dumps({'type': "message",
+                                            'channel': "C1",
+                                            'user': "U1",
+                                            'bot_id': "B1",
+                                            'text': ".echo spam"}))
+        slack.message(slack.ws, json.dumps({'type': "message",
+                                            'subtype': "message_changed",
+                                            'channel': "C1"}))
+        assert_that(slack.handle_event.call_count).is_zero()
+
+        slack.message(slack.ws, json.dumps({'type': "message",
+                                            'channel': "C1",
+                                            'user': "U1",
+                                            'text': "\"user\": \"U0BOT\""}))
+        slack.message(slack.ws, json.dumps({'type': "message",
+                                            'subtype': "me_message",
+                                            'channel': "C1",
+                                            'user': "U1",
+                                            'text': ".echo spam"}))
+        assert_that(slack.handle_event.call_count).is_equal_to(2)
+
+    def test_nested_properties(self, slack):
+        slack.handle_event = MagicMock()
+        slack.user_id = "U0BOT"
+
+        # Human messages quoting bot's message or edited by this bot
+        slack.message(slack.ws, json.dumps({
+            'type': "message",
+            'channel': "C1",
+            'user': "U1",
+            'text': ".echo spam",
+            'attachments': [{'bot_id': "B1",
+                             'subtype': "bot_message",
+                             'text': "Build passed"}]}))
+        slack.message(slack.ws, json.dumps({
+            'type': "message",
+            'channel': "C1",
+            'user': "U1",
+            'text': ".echo ham",
+            'edited': {'user': "U0BOT", 'ts': "1438477080.000004"}}))
+        assert_that(slack.handle_event.call_count).is_equal_to(2)
+
+        slack.handle_event.reset_mock()
+        slack.message(slack.ws, json.dumps({
+            'type': "message",
+            'channel': "C1",
+            'edited': {'user': "U1"},
+            'user': "U0BOT",
+            'text': ".echo egg"}))
+        assert_that(slack.handle_event.call_count).is_zero()
+
+    def test_ignored_message_configured(self, slack):
+        configured = Slack(token='spam_ham_egg',
+                           plugins=(),
+                           ignored_subtypes=('channel_join',),
+                           ignore_bots=False)
+        configured.handle_event = MagicMock()
+        configured.message(None, json.dumps({'type': "message",
+                                             'subtype': "channel_join",
+                                             'channel': "C1",
+                                             'user': "U1",
+                                             'text': "joined"}))
+        configured.message(None, json.dumps({'type': "message",
+                                             'channel': "C1",
+                                             'user': "U1",
+                                             'bot_id': "B1",
+                                             'text': ".echo spam"}))
+        assert_that(configured.handle_event.call_count).is_equal_to(1)
+
+    def test_extended_event_types(self, slack):
+        class ExtendedSlack(Slack):
+            event_types = dict(Slack.event_types,
+                               reaction_added=('handle_reaction', "Reacted"))
+            handle_reaction = MagicMock()
+
+        extended = ExtendedSlack(token='spam_ham_egg', plugins=())
+        extended.message(None, json.dumps({'type': "reaction_added"}))
+        assert_that(extended.handle_reaction.call_count).is_equal_to(1)
+
     def test_handle_team_migration(self, slack):
         logging.info = MagicMock()
 
@@ -276,6 +640,46 @@ class TestMessage(object):
         assert_that(slack.connect_attempt_count).is_zero()
 
 
+class TestPing(object):
+    @pytest.fixture(scope='function')
+    def slack(self, request):
+        slack = Slack(token='spam_ham_egg',
+                      plugins=(),
+                      max_workers=1)
+        slack.ws = MagicMock()
+        return slack
+
+    def test_not_connected(self, slack):
+        slack.ping()
+        assert_that(slack.ws.send.call_count).is_zero()
+
+    def test_ping_pong(self, slack):
+        slack.handle_hello({'type': "hello"})
+        slack.ping()
+        ping = json.loads(slack.ws.send.call_args[0][0])
+        assert_that(ping).contains_entry({'type': "ping"}).contains_key('id')
+
+        with patch.object(time, 'time', return_value=ping['time'] + 0.2):
+            slack.message(slack.ws, json.dumps({'type': "pong",
+                                                'reply_to': ping['id'],
+                                                'time': ping['time']}))
+
+        assert_that(slack.ping_latency.count).is_equal_to(1)
+        assert_that(slack.ping_latency.max).is_close_to(0.2, 0.001)
+        assert_that(slack.last_pong_at).is_equal_to(ping['time'] + 0.2)
+        assert_that(slack.ack_tracker).is_length(0)
+
+    def test_reconnect_without_pong(self, slack):
+        logging.warning = MagicMock()
+        slack.handle_hello({'type': "hello"})
+        with patch.object(time, 'time', return_value=time.time() + 41):
+            slack.ping()
+
+        assert_that(slack.ws.send.call_count).is_zero()
+        assert_that(slack.ws.close.call_count).is_equal_to(1)
+        assert_that(slack.connected).is_false()
+
+
 class TestHandleMessage(object):
     @pytest.fixture(scope='function')
     def slack(self, request):
@@ -312,16 +716,92 @@ class TestHandleMessage(object):
         with patch.object(slack, "respond", return_value=SlackMessage()):
             with patch.object(slack.client,
                               "post",
-                              return_value=dict()):
-                slack.handle_message({'type': "message",
-                                      'channel': "C06TXXXX",
-                                      'user': "U06TXXXXX",
-                                      'text': ".bmw",
-                                      'ts': "1438477080.000004",
-                                      'team': "T06TXXXXX"})
+                              return_value={'ok': True}):
+                future = slack.handle_message({'type': "message",
+                                               'channel': "C06TXXXX",
+                                               'user': "U06TXXXXX",
+                                               'text': ".bmw",
+                                               'ts': "1438477080.000004",
+                                               'team': "T06TXXXXX"})
+                assert_that(future).is_instance_of(Future)
+                assert_that(future.result(timeout=5)) \
+                    .is_equal_to({'ok': True})
                 assert_that(slack.respond.call_count).is_equal_to(1)
                 assert_that(slack.client.post.call_count).is_equal_to(1)
 
+    def test_ignored_message(self, slack):
+        slack.user_id = "U0BOT"
+        slack.respond = MagicMock()
+        logging.error = MagicMock()
+        slack.handle_message({'type': "message",
+                              'channel': "C1",
+                              'user': "U0BOT",
+                              'text': ".echo spam",
+                              'ts': "1438477080.000004"})
+        slack.handle_message({'type': "message",
+                              'subtype': "bot_message",
+                              'text': "Build passed",
+                              'ts': "1438477080.000005"})
+
+        assert_that(slack.respond.call_count).is_zero()
+        assert_that(logging.error.call_count).is_zero()
+
+    def test_duplicate(self, slack):
+        logging.info = MagicMock()
+        content = {'type': "message",
+                   'channel': "C06TXXXX",
+                   'user': "U06TXXXXX",
+                   'text': ".bmw",
+                   'ts': "1438477080.000004",
+                   'team': "T06TXXXXX"}
+        with patch.object(slack, "respond", return_value="dummy"):
+            with patch.object(slack,
+                              "enqueue_sending_message",
+                              return_value=Future()):
+                slack.handle_message(content)
+                slack.handle_message(dict(content))
+                slack.handle_message(dict(content, ts="1438477081.000001"))
+                assert_that(slack.respond.call_count).is_equal_to(2)
+                assert_that(logging.info.call_args[0][0]) \
+                    .starts_with("Ignore duplicate")
+
+    def test_rich_message_error(self, slack):
+        logging.error = MagicMock()
+        slack.post_worker.executor = None
+        with patch.object(slack.client,
+                          "post",
+                          return_value={'ok': False,
+                                        'error': "channel_not_found"}):
+            future = slack.send_response("C06TXXXX", SlackMessage())
+
+        assert_that(future.exception()).is_instance_of(SarahSlackException)
+        assert_that(logging.error.call_count).is_equal_to(1)
+
+    def test_rich_message_per_channel(self, slack):
+        posted = []
+        blocker = threading.Event()
+
+        def post(_, data):
+            if data['channel'] == "C1":
+                blocker.wait(5)
+            posted.append(data['channel'])
+            return {'ok': True}
+
+        with patch.object(slack.client, "post", side_effect=post):
+            futures = [slack.send_response("C1", SlackMessage()),
+                       slack.send_response("C1", SlackMessage()),
+                       slack.send_response("C2", SlackMessage())]
+
+            # Reply to C2 is not blocked by the busy channel
+            futures[2].result(timeout=5)
+            assert_that(slack.post_worker.pending("C1")).is_equal_to(2)
+
+            blocker.set()
+            for future in futures:
+                future.result(timeout=5)
+
+        assert_that(posted).is_equal_to(["C2", "C1", "C1"])
+
 
 class TestGenerateScheduleJob(object):
     @pytest.fixture(scope='function')
@@ -351,10 +831,10 @@ class TestGenerateScheduleJob(object):
         assert_that(inspect.isfunction(ret)).is_true()
 
         with patch.object(slack,
-                          "enqueue_sending_message",
+                          "enqueue_scheduled_message",
                           return_value=Future()):
             ret()
-            assert_that(slack.enqueue_sending_message.call_count) \
+            assert_that(slack.enqueue_scheduled_message.call_count) \
                 .is_equal_to(1)
 
     def test_valid_settings_with_rich_message(self, slack):
@@ -372,6 +852,22 @@ class TestGenerateScheduleJob(object):
             assert_that(slack.client.post.call_count) \
                 .is_equal_to(1)
 
+    def test_channel_name(self, slack):
+        slack.directory.load({'channels': [{'id': "C1", 'name': "general"}]})
+        ret = slack.generate_schedule_job(
+                ScheduledCommand("name",
+                                 lambda _: "dummy",
+                                 "module_name",
+                                 {},
+                                 {'channels': ("#general",)}))
+
+        with patch.object(slack,
+                          "enqueue_scheduled_message",
+                          return_value=Future()):
+            ret()
+            assert_that(slack.enqueue_scheduled_message.call_args[0][1]) \
+                .is_equal_to("C1")
+
 
 class TestSendMessage(object):
     @pytest.fixture(scope='function')
@@ -382,6 +878,7 @@ class TestSendMessage(object):
 
     def test_without_message_type(self, slack):
         slack.ws = MagicMock()
+        slack.connected = True
         slack.send_message("spam", "sending text")
         assert_that(slack.ws.send.call_count).is_equal_to(1)
         arg = json.loads(slack.ws.send.call_args[0][0])
@@ -392,6 +889,90 @@ class TestSendMessage(object):
 
     def test_with_message_type(self, slack):
         slack.ws = MagicMock()
+        slack.connected = True
         slack.send_message("spam", "sending text", "dummy_type")
         arg = json.loads(slack.ws.send.call_args[0][0])
         assert_that(arg.get('type', None)).is_equal_to("dummy_type")
+
+    def test_ack(self, slack):
+        slack.ws = MagicMock()
+        slack.connected = True
+        slack.send_message("spam", "sending text")
+        message_id = json.loads(slack.ws.send.call_args[0][0])['id']
+        assert_that(slack.ack_tracker).is_length(1)
+
+        slack.handle_event = MagicMock()
+        slack.message(slack.ws, json.dumps({'ok': True,
+                                            'reply_to': message_id,
+                                            'ts': "1438477080.000004"}))
+        assert_that(slack.handle_event.call_count).is_zero()
+        assert_that(slack.ack_tracker).is_length(0)
+        assert_that(slack.ack_tracker.latency.count).is_equal_to(1)
+
+    def test_send_error(self, slack):
+        slack.ws = MagicMock()
+        slack.connected = True
+        slack.ws.send.side_effect = Exception
+        with pytest.raises(Exception):
+            slack.send_message("spam", "sending text")
+        assert_that(slack.ack_tracker).is_length(0)
+
+    def test_resend_on_timeout(self, slack):
+        slack.ws = MagicMock()
+        slack.connected = True
+        slack.send_message("spam", "sending text")
+        slack.send_message("spam", "typing", "typing")
+
+        with patch.object(slack.client,
+                          'post',
+                          return_value={'ok': True}) as mock_post, \
+                patch.object(time, 'time', return_value=time.time() + 60):
+            slack.ack_tracker.sweep()
+
+        assert_that(mock_post.call_count).is_equal_to(1)
+        assert_that(mock_post.call_args[1]['data']) \
+            .contains_entry({'channel': "spam"}) \
+            .contains_entry({'text': "sending text"})
+
+    def test_disconnected(self, slack):
+        slack.ws = MagicMock()
+        slack.send_message("spam", "first")
+        slack.send_message("spam", "second")
+        assert_that(slack.ws.send.call_count).is_zero()
+        assert_that(slack.outbox).is_length(2)
+
+        slack.handle_hello({'type': "hello"})
+        assert_that(slack.ws.send.call_count).is_equal_to(2)
+        assert_that(json.loads(slack.ws.send.call_args[0][0])) \
+            .contains_entry({'text': "second"})
+        assert_that(slack.outbox).is_empty()
+
+        slack.send_message("spam", "third")
+        assert_that(slack.ws.send.call_count).is_equal_to(3)
+
+        slack.on_close(slack.ws, 1006, "")
+        slack.send_message("spam", "fourth")
+        assert_that(slack.ws.send.call_count).is_equal_to(3)
+
+    def test_disconnected_overflow(self, slack):
+        slack.outbox = deque(maxlen=2)
+        for text in ("first", "second", "third"):
+            slack.send_message("spam", text)
+
+        assert_that([m[1] for m in slack.outbox]) \
+            .is_equal_to(["second", "third"])
+
+    def test_unique_message_id(self, slack):
+        ids = set()
+
+        def send():
+            for _ in range(100):
+                ids.add(slack.next_message_id())
+
+        threads = [threading.Thread(target=send) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert_that(ids).is_length(400)
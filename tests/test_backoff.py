@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from assertpy import assert_that
+
+from sarah.backoff import ExponentialBackoff
+
+
+class TestExponentialBackoff(object):
+    def test_without_jitter(self):
+        backoff = ExponentialBackoff(initial=1, maximum=10)
+        delays = [backoff.next_delay() for _ in range(6)]
+        assert_that(delays).is_equal_to([1, 2, 4, 8, 10, 10])
+        assert_that(backoff.attempts).is_equal_to(6)
+
+        backoff.reset()
+        assert_that(backoff.attempts).is_zero()
+        assert_that(backoff.next_delay()).is_equal_to(1)
+
+    def test_with_jitter(self):
+        backoff = ExponentialBackoff(initial=8, maximum=8, jitter=0.5)
+        for _ in range(100):
+            assert_that(backoff.next_delay()).is_between(4, 8)
+
+    def test_endless_retry(self):
+        backoff = ExponentialBackoff(initial=1, maximum=10)
+        for _ in range(2000):
+            backoff.next_delay()
+        assert_that(backoff.next_delay()).is_equal_to(10)
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+from assertpy import assert_that
+
+from sarah import json_codec
+from sarah.exceptions import SarahException
+
+
+class TestJSONCodec(object):
+    def teardown_method(self, method):
+        json_codec.use(json_codec.available_backends()[0])
+
+    @pytest.mark.parametrize('backend', json_codec.available_backends())
+    def test_round_trip(self, backend):
+        json_codec.use(backend)
+        obj = {'type': "message", 'text': "日本語", 'ts': 1.5, 'ok': True}
+
+        encoded = json_codec.dumps(obj)
+        assert_that(encoded).is_instance_of(str)
+        assert_that(json.loads(encoded)).is_equal_to(obj)
+        assert_that(json_codec.loads(encoded)).is_equal_to(obj)
+        assert_that(json_codec.loads(encoded.encode('utf-8'))) \
+            .is_equal_to(obj)
+
+    def test_stdlib_is_available(self):
+        assert_that(json_codec.available_backends()[-1]).is_equal_to('json')
+
+    def test_unknown_backend(self):
+        with pytest.raises(SarahException):
+            json_codec.use('spam')
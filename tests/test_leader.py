@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import pytest
+import time
+from unittest.mock import patch
+
+from assertpy import assert_that
+
+from sarah.exceptions import SarahException
+from sarah.leader import FileLockElection, SQLiteLeaseElection, \
+    create_election
+
+
+class TestFileLockElection(object):
+    def test_failover(self, tmpdir):
+        path = str(tmpdir.join('sarah.lock'))
+        first = FileLockElection(path)
+        second = FileLockElection(path)
+
+        assert_that(first.renew()).is_true()
+        assert_that(first.is_leader).is_true()
+        assert_that(second.renew()).is_false()
+        assert_that(second.is_leader).is_false()
+
+        first.stop()
+        assert_that(first.is_leader).is_false()
+        assert_that(second.renew()).is_true()
+        second.stop()
+
+    def test_unavailable(self, tmpdir):
+        with patch('sarah.leader.fcntl', None):
+            with pytest.raises(SarahException):
+                FileLockElection(str(tmpdir.join('sarah.lock')))
+
+
+class TestSQLiteLeaseElection(object):
+    def test_failover(self, tmpdir):
+        path = str(tmpdir.join('sarah.db'))
+        first = SQLiteLeaseElection(path)
+        second = SQLiteLeaseElection(path)
+
+        assert_that(first.renew()).is_true()
+        assert_that(first.renew()).is_true()
+        assert_that(second.renew()).is_false()
+
+        first.stop()
+        assert_that(second.renew()).is_true()
+        assert_that(first.renew()).is_false()
+
+    def test_expiration(self, tmpdir):
+        path = str(tmpdir.join('sarah.db'))
+        first = SQLiteLeaseElection(path, lease_interval=0.2)
+        second = SQLiteLeaseElection(path, lease_interval=0.2)
+
+        assert_that(first.renew()).is_true()
+        assert_that(second.renew()).is_false()
+
+        # First one stops renewing
+        with patch.object(time, 'time', return_value=time.time() + 0.3):
+            assert_that(first.is_leader).is_false()
+            assert_that(second.renew()).is_true()
+
+    def test_names(self, tmpdir):
+        path = str(tmpdir.join('sarah.db'))
+        assert_that(SQLiteLeaseElection(path, name='spam').renew()).is_true()
+        assert_that(SQLiteLeaseElection(path, name='ham').renew()).is_true()
+
+
+class TestCreateElection(object):
+    def test_builtin(self, tmpdir):
+        election = create_election(type='sqlite',
+                                   path=str(tmpdir.join('sarah.db')),
+                                   lease_interval=5)
+        assert_that(election).is_instance_of(SQLiteLeaseElection)
+        assert_that(election.lease_interval).is_equal_to(5)
+
+    def test_import_path(self, tmpdir):
+        election = create_election(type='sarah.leader.FileLockElection',
+                                   path=str(tmpdir.join('sarah.lock')))
+        assert_that(election).is_instance_of(FileLockElection)
+
+    def test_unknown(self):
+        with pytest.raises(SarahException):
+            create_election(type='spam')
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 import os
+import time
 import pytest
+from unittest.mock import patch, Mock
 from assertpy import assert_that
-from main import Sarah
+from main import Sarah, Supervisor
+from sarah.bot import Base
 from sarah.exceptions import SarahException
 
 
@@ -26,3 +29,87 @@ class TestInit(object):
         assert_that(str(e)) \
             .contains('Configuration file does not exist') \
             .contains(non_existing_paths[0])
+
+
+class TestCreateBots(object):
+    def test_load_adapter(self):
+        adapter = Sarah.load_adapter('sarah.bot.slack.Slack')
+        assert_that(adapter.__name__).is_equal_to('Slack')
+
+        with pytest.raises(SarahException) as e:
+            Sarah.load_adapter('sarah.bot.slack.NonExistingAdapter')
+        assert_that(str(e)).contains('sarah.bot.slack.NonExistingAdapter')
+
+    def test_adapters_are_lazily_loaded(self):
+        with patch.object(Sarah, 'load_config', return_value={
+                'slack': [{'token': "spam"}, {'token': "ham"}]}):
+            sarah = Sarah(config_paths=[])
+
+        with patch.object(Sarah,
+                          'load_adapter',
+                          wraps=Sarah.load_adapter) as load_adapter:
+            bots = sarah.create_bots()
+
+            load_adapter.assert_called_once_with('sarah.bot.slack.Slack')
+            assert_that([name for name, _ in bots]) \
+                .is_equal_to(['slack.0', 'slack.1'])
+            assert_that(bots[1][1].client.token).is_equal_to("ham")
+
+
+class TestPreloadPlugins(object):
+    def test_valid(self):
+        with patch.object(Sarah, 'load_config', return_value={
+                'slack': [{'plugins': [["spam"], ["ham", {}]]},
+                          {'plugins': [["ham"], ["egg"]]}]}):
+            sarah = Sarah(config_paths=[])
+        bots = sarah.create_bots()
+
+        with patch.object(Base, 'load_plugin', return_value=True) as m:
+            sarah.preload_plugins(bots)
+            # Each module is imported once
+            assert_that([c[0][0] for c in m.call_args_list]) \
+                .is_equal_to(["spam", "ham", "egg"])
+
+        # Registries are built before fork, so children don't reload them
+        assert_that([bot.plugins_loaded for _, bot in bots]) \
+            .is_equal_to([True, True])
+
+
+class TestSupervisor(object):
+    def test_exit_reason(self):
+        assert_that(Supervisor.exit_reason(0)).is_equal_to('exited normally')
+        assert_that(Supervisor.exit_reason(1)) \
+            .is_equal_to('exited with code 1')
+        assert_that(Supervisor.exit_reason(-9)) \
+            .is_equal_to('killed by SIGKILL')
+        assert_that(Supervisor.exit_reason(None)).is_equal_to('unknown')
+
+    def test_restart(self):
+        context = Mock()
+        supervisor = Supervisor(context,
+                                [('slack', Mock(spec=Base))],
+                                initial_delay=10,
+                                max_delay=10)
+        child = supervisor.children['slack']
+        supervisor.spawn(child)
+        assert_that(context.Process.call_count).is_equal_to(1)
+
+        # Process crashes
+        child.process.is_alive.return_value = False
+        child.process.exitcode = 1
+        with patch.object(time, 'time', return_value=child.started_at + 5):
+            supervisor.check()
+        assert_that(child.process).is_none()
+        assert_that(list(child.exit_reasons)) \
+            .is_equal_to(['exited with code 1'])
+        assert_that(child.restart_at).is_greater_than(child.started_at)
+
+        # Not restarted until delay passes
+        with patch.object(time, 'time', return_value=child.started_at + 6):
+            supervisor.check()
+        assert_that(context.Process.call_count).is_equal_to(1)
+
+        with patch.object(time, 'time', return_value=child.restart_at):
+            supervisor.check()
+        assert_that(context.Process.call_count).is_equal_to(2)
+        assert_that(supervisor.restart_counts).is_equal_to({'slack': 1})
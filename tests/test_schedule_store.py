@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+from apscheduler.schedulers.background import BackgroundScheduler
+from assertpy import assert_that
+
+from sarah.exceptions import SarahException
+from sarah.schedule_store import ScheduleStore
+
+ARGS = {'trigger': "interval", 'minutes': 5}
+
+
+class TestScheduleStore(object):
+    def test_invalid_misfire(self, tmpdir):
+        with pytest.raises(SarahException):
+            ScheduleStore(str(tmpdir.join('schedule.db')), misfire='spam')
+
+    def test_restore(self, tmpdir):
+        path = str(tmpdir.join('schedule.db'))
+        store = ScheduleStore(path)
+        assert_that(store.job_kwargs('spam', ARGS)).is_empty()
+
+        scheduler = BackgroundScheduler()
+        store.listen(scheduler)
+        scheduler.add_job(lambda: None, id='spam', **ARGS)
+        scheduler.start()
+        try:
+            next_run_time = scheduler.get_job('spam').next_run_time
+        finally:
+            scheduler.shutdown()
+            store.stop()
+
+        # Restarted
+        kwargs = ScheduleStore(path).job_kwargs('spam', ARGS)
+        assert_that(kwargs['next_run_time']).is_equal_to(next_run_time)
+
+        # Trigger setting is changed
+        kwargs = ScheduleStore(path).job_kwargs('spam', {'trigger': "interval",
+                                                         'minutes': 10})
+        assert_that(kwargs).is_empty()
+
+    def test_misfire(self, tmpdir):
+        path = str(tmpdir.join('schedule.db'))
+        store = ScheduleStore(path)
+        store.save('spam', store.signature(ARGS), time.time() - 100)
+
+        now = datetime.now(timezone.utc)
+        kwargs = ScheduleStore(path, misfire='run').job_kwargs('spam', ARGS)
+        assert_that(kwargs['next_run_time']).is_greater_than_or_equal_to(now)
+
+        kwargs = ScheduleStore(path, misfire='skip').job_kwargs('spam', ARGS)
+        assert_that(kwargs).is_empty()
+
+        kwargs = ScheduleStore(path,
+                               misfire='run',
+                               misfire_grace_time=10).job_kwargs('spam', ARGS)
+        assert_that(kwargs).is_equal_to({'misfire_grace_time': 10})
+
+    def test_prune(self, tmpdir):
+        path = str(tmpdir.join('schedule.db'))
+        store = ScheduleStore(path, owner='first')
+        for job_id in ('spam', 'ham'):
+            store.save(job_id, store.signature(ARGS), time.time() + 100)
+        other = ScheduleStore(path, owner='second')
+        other.save('egg', other.signature(ARGS), time.time() + 100)
+
+        store = ScheduleStore(path, owner='first')
+        store.job_kwargs('spam', ARGS)
+        assert_that(store.prune()).is_equal_to(['ham'])
+
+        with patch.object(time, 'time', return_value=0):
+            assert_that(ScheduleStore(path, owner='second')
+                        .job_kwargs('egg', ARGS)).contains_key('next_run_time')
+
+    def test_shared_database(self, tmpdir):
+        path = str(tmpdir.join('schedule.db'))
+        first = ScheduleStore(path, owner='slack.0')
+        second = ScheduleStore(path, owner='slack.1')
+
+        # Same job ID is used by both bots
+        first.save('spam', first.signature(ARGS), time.time() + 100)
+        second.save('spam', second.signature(ARGS), time.time() + 200)
+        second.save('ham', second.signature(ARGS), time.time() + 200)
+
+        # The first bot no longer has any job
+        assert_that(ScheduleStore(path, owner='slack.0').prune()) \
+            .is_equal_to(['spam'])
+
+        second = ScheduleStore(path, owner='slack.1')
+        with patch.object(time, 'time', return_value=0):
+            assert_that(second.job_kwargs('spam', ARGS)) \
+                .contains_key('next_run_time')
+            assert_that(second.job_kwargs('ham', ARGS)) \
+                .contains_key('next_run_time')
+        assert_that(second.prune()).is_empty()
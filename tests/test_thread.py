@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from assertpy import assert_that
+
+from sarah.thread import ThreadExecutor, KeyedExecutor, PRIORITY_LOW, \
+    PRIORITY_NORMAL
+
+
+class TestThreadExecutor(object):
+    def test_priority(self):
+        executor = ThreadExecutor()
+        blocker = threading.Event()
+        executed = []
+
+        # Hold the worker so following items are queued
+        executor.submit(blocker.wait)
+        futures = [executor.submit_with_priority(PRIORITY_LOW,
+                                                 executed.append,
+                                                 "scheduled1"),
+                   executor.submit_with_priority(PRIORITY_LOW,
+                                                 executed.append,
+                                                 "scheduled2"),
+                   executor.submit_with_priority(PRIORITY_NORMAL,
+                                                 executed.append,
+                                                 "reply1"),
+                   executor.submit(executed.append, "reply2")]
+        blocker.set()
+        for future in futures:
+            future.result(timeout=5)
+
+        assert_that(executed) \
+            .is_equal_to(["reply1", "reply2", "scheduled1", "scheduled2"])
+        executor.shutdown()
+
+    def test_shutdown_after_pending_items(self):
+        executor = ThreadExecutor()
+        executed = []
+        for i in range(10):
+            executor.submit_with_priority(PRIORITY_LOW, executed.append, i)
+        executor.shutdown(wait=True)
+
+        assert_that(executed).is_equal_to(list(range(10)))
+
+
+class TestKeyedExecutor(object):
+    def test_limit_per_key(self):
+        pool = ThreadPoolExecutor(max_workers=4)
+        executor = KeyedExecutor(pool, max_per_key=1)
+        blocker = threading.Event()
+        executed = []
+
+        def run(key, value):
+            if key == "spam":
+                blocker.wait(5)
+            executed.append(value)
+            return value
+
+        futures = [executor.submit("spam", run, "spam", 1),
+                   executor.submit("spam", run, "spam", 2),
+                   executor.submit("ham", run, "ham", 3)]
+        assert_that(futures[2].result(timeout=5)).is_equal_to(3)
+        assert_that(executor.pending("spam")).is_equal_to(2)
+        assert_that(futures[1].running()).is_false()
+
+        blocker.set()
+        assert_that([f.result(timeout=5) for f in futures]) \
+            .is_equal_to([1, 2, 3])
+        assert_that(executed).is_equal_to([3, 1, 2])
+        assert_that(executor.pending("spam")).is_zero()
+        pool.shutdown()
+
+    def test_inline(self):
+        executor = KeyedExecutor()
+        future = executor.submit("spam", lambda: 1 / 0)
+        assert_that(future.exception()).is_instance_of(ZeroDivisionError)
+        assert_that(executor.submit("spam", str, 1).result()) \
+            .is_equal_to("1")
+
+    def test_shutdown(self):
+        pool = ThreadPoolExecutor(max_workers=1)
+        pool.shutdown()
+        executor = KeyedExecutor(pool)
+        future = executor.submit("spam", str, 1)
+        assert_that(future.exception()).is_instance_of(RuntimeError)
+        assert_that(executor.pending("spam")).is_zero()
@@ -5,7 +5,7 @@ import pytest
 from assertpy import assert_that
 from typing import Union, AnyStr, Pattern, Callable, Optional, Any, Dict
 from sarah import ValueObject
-from sarah.value_object import ObjectMapper
+from sarah.value_object import ObjectMapper, memoize
 
 
 class TestInit(object):
@@ -132,3 +132,27 @@ class TestObjectMapper(object):
         obj = ObjectMapper(Obj).map(given_obj)
         assert_that(obj['spam']).is_equal_to("ham")
         assert_that(obj['egg']).is_equal_to("rotten")
+
+
+class TestMemoize(object):
+    def test_memoize(self):
+        calls = []
+
+        class Obj(ValueObject):
+            def __init__(self, spam: str) -> None:
+                pass
+
+            @memoize
+            def upper(self) -> str:
+                calls.append(self['spam'])
+                return self['spam'].upper()
+
+        obj = Obj("ham")
+        other = Obj("egg")
+        assert_that(obj.upper()).is_equal_to("HAM")
+        assert_that(obj.upper()).is_equal_to("HAM")
+        assert_that(other.upper()).is_equal_to("EGG")
+        assert_that(calls).is_equal_to(["ham", "egg"])
+
+        # Cached value does not affect equality
+        assert_that(obj).is_equal_to(Obj("ham"))
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+from assertpy import assert_that
+
+from sarah.watcher import ModuleWatcher
+
+
+class TestModuleWatcher(object):
+    def test_check(self, tmpdir):
+        path = tmpdir.join('watched_dummy_module.py')
+        path.write('VALUE = 1\n')
+        sys.path.insert(0, str(tmpdir))
+        try:
+            __import__('watched_dummy_module')
+            watcher = ModuleWatcher(['watched_dummy_module',
+                                     'non_loaded_dummy_module'],
+                                    MagicMock())
+            watcher.snapshot()
+            assert_that(watcher.check()).is_empty()
+
+            mtime = os.stat(str(path)).st_mtime + 10
+            os.utime(str(path), (mtime, mtime))
+            assert_that(watcher.check()).is_equal_to(['watched_dummy_module'])
+
+            # Already reported
+            assert_that(watcher.check()).is_empty()
+        finally:
+            sys.path.remove(str(tmpdir))
+            sys.modules.pop('watched_dummy_module', None)
+
+    def test_check_failed_module(self, tmpdir):
+        path = tmpdir.join('broken_dummy_module.py')
+        path.write('VALUE = \n')
+        sys.path.insert(0, str(tmpdir))
+        try:
+            with pytest.raises(SyntaxError):
+                __import__('broken_dummy_module')
+            ModuleWatcher.mark_loaded('broken_dummy_module')
+
+            watcher = ModuleWatcher(['broken_dummy_module'], MagicMock())
+            watcher.snapshot()
+            assert_that(watcher.check()).is_empty()
+
+            # Watched even though it is not loaded
+            path.write('VALUE = 1\n')
+            mtime = os.stat(str(path)).st_mtime + 10
+            os.utime(str(path), (mtime, mtime))
+            assert_that(watcher.check()).is_equal_to(['broken_dummy_module'])
+        finally:
+            sys.path.remove(str(tmpdir))
+            sys.modules.pop('broken_dummy_module', None)
+            ModuleWatcher.loaded_mtimes.pop('broken_dummy_module', None)
+
+    def test_modified_time_with_missing_file(self):
+        assert_that(ModuleWatcher.modified_time(None)).is_none()
+        assert_that(ModuleWatcher.modified_time('/non/existing/path.py')) \
+            .is_none()
+
+    def test_check_since_loaded(self, tmpdir):
+        path = tmpdir.join('preloaded_dummy_module.py')
+        path.write('VALUE = 1\n')
+        sys.path.insert(0, str(tmpdir))
+        try:
+            __import__('preloaded_dummy_module')
+            ModuleWatcher.mark_loaded('preloaded_dummy_module')
+
+            # Modified after load, but before watching starts
+            mtime = os.stat(str(path)).st_mtime + 10
+            os.utime(str(path), (mtime, mtime))
+
+            watcher = ModuleWatcher(['preloaded_dummy_module'], MagicMock())
+            watcher.snapshot()
+            assert_that(watcher.check()) \
+                .is_equal_to(['preloaded_dummy_module'])
+        finally:
+            sys.path.remove(str(tmpdir))
+            sys.modules.pop('preloaded_dummy_module', None)
+            ModuleWatcher.loaded_mtimes.pop('preloaded_dummy_module', None)